@@ -0,0 +1,6 @@
+"""
+Benchmarks of the JobRunner on synthetic flows
+
+Run them with `python -m benchmarks.run` and compare two saved baselines with
+`python -m benchmarks.compare`.
+"""
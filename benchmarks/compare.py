@@ -0,0 +1,62 @@
+"""
+Compare two baselines saved by benchmarks.run
+
+    python -m benchmarks.compare benchmarks/baselines/old.json new.json
+
+Prints the change of the run time and the peak memory of every benchmark
+present in both baselines. Exits with status 1 if any of them got slower or
+larger by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+METRICS = ("run_s", "peak_memory_bytes")
+
+
+def load(path: Path) -> Dict[Tuple[str, int, str], Dict[str, Any]]:
+    """The records of a baseline by shape, size and mode"""
+    baseline = json.loads(Path(path).read_text())
+    return {(x["shape"], x["size"], x["mode"]): x for x in baseline["results"]}
+
+
+def compare(old: Path, new: Path, threshold: float = 0.1) -> List[str]:
+    """Print the changes between two baselines. Returns the regressions."""
+    old_records, new_records = load(old), load(new)
+    regressions = []
+    for key in sorted(old_records.keys() & new_records.keys()):
+        changes = []
+        for metric in METRICS:
+            before, after = old_records[key][metric], new_records[key][metric]
+            change = (after - before) / before if before else 0.0
+            changes.append(f"{metric} {change:+7.1%}")
+            if change > threshold:
+                regressions.append(f"{'/'.join(map(str, key))} {metric} {change:+.1%}")
+        shape, size, mode = key
+        print(f"{shape:>8} {size:>6} {mode:>12}  " + "  ".join(changes))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("old", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative increase reported as a regression",
+    )
+    args = parser.parse_args(argv)
+    regressions = compare(args.old, args.new, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s):")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
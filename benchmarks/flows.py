@@ -0,0 +1,141 @@
+"""
+Synthetic flows
+---------------
+Generators of flows of any size in the format of the node editor output, made
+of the cheap node functions below so that the benchmarks measure the overhead
+of the JobRunner rather than the work of the nodes.
+
+Shapes:
+    chain: every node depends on the previous one
+    fanout: one source node with all the other nodes depending on it
+    diamond: a chain of diamonds, a node split into two branches joined again
+    random: a random DAG, every node depending on up to two earlier nodes
+"""
+
+import random
+from typing import Callable, Dict, List, Optional
+
+from flowfunc.config import Config
+
+SHAPES = ("chain", "fanout", "diamond", "random")
+
+
+def source(x: float = 1.0) -> float:
+    """Start of a flow"""
+    return x
+
+
+def combine(a: float = 0.0, b: float = 0.0) -> float:
+    """Mean of two values plus one"""
+    return (a + b) * 0.5 + 1
+
+
+FUNCTIONS = [source, combine]
+
+
+def build_config() -> Config:
+    """Config of the node functions used by the synthetic flows"""
+    return Config.from_function_list(FUNCTIONS)
+
+
+def new_node(nodeid: str, func: Callable, **controls) -> dict:
+    """A node as sent by the node editor, with no connections and the given
+    values of its controls"""
+    return {
+        "id": nodeid,
+        "x": 0,
+        "y": 0,
+        "type": f"{func.__module__}.{func.__name__}",
+        "width": 200,
+        "connections": {"inputs": {}, "outputs": {}},
+        "inputData": {key: {key: value} for key, value in controls.items()},
+    }
+
+
+def connect(
+    nodes: dict, source_id: str, target_id: str, key: str, port: str = "result"
+):
+    """Connect the output port of the source node to the input key of the
+    target node"""
+    nodes[source_id]["connections"]["outputs"].setdefault(port, []).append(
+        {"nodeId": target_id, "portName": key}
+    )
+    nodes[target_id]["connections"]["inputs"][key] = [
+        {"nodeId": source_id, "portName": port}
+    ]
+
+
+def chain(size: int) -> Dict[str, dict]:
+    nodes = {"node_0": new_node("node_0", source)}
+    for i in range(1, size):
+        nodes[f"node_{i}"] = new_node(f"node_{i}", combine)
+        connect(nodes, f"node_{i - 1}", f"node_{i}", "a")
+    return nodes
+
+
+def fanout(size: int) -> Dict[str, dict]:
+    nodes = {"node_0": new_node("node_0", source)}
+    for i in range(1, size):
+        nodes[f"node_{i}"] = new_node(f"node_{i}", combine)
+        connect(nodes, "node_0", f"node_{i}", "a")
+    return nodes
+
+
+def diamond(size: int) -> Dict[str, dict]:
+    nodes = {"node_0": new_node("node_0", source)}
+    top = "node_0"
+    i = 1
+    while i < size:
+        # Two branches and the node joining them, as far as the size allows
+        branches: List[str] = []
+        for _ in range(2):
+            if i >= size:
+                break
+            nodeid = f"node_{i}"
+            nodes[nodeid] = new_node(nodeid, combine)
+            connect(nodes, top, nodeid, "a")
+            branches.append(nodeid)
+            i += 1
+        if i >= size:
+            break
+        nodeid = f"node_{i}"
+        nodes[nodeid] = new_node(nodeid, combine)
+        for key, branch in zip(("a", "b"), branches):
+            connect(nodes, branch, nodeid, key)
+        top = nodeid
+        i += 1
+    return nodes
+
+
+def random_dag(size: int, seed: Optional[int] = 0) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    nodes = {"node_0": new_node("node_0", source)}
+    for i in range(1, size):
+        nodeid = f"node_{i}"
+        nodes[nodeid] = new_node(nodeid, combine)
+        # Mostly recent nodes, so that the flow is deep as well as wide
+        start = max(0, i - 50)
+        for key in rng.sample(("a", "b"), rng.randint(1, 2)):
+            connect(nodes, f"node_{rng.randrange(start, i)}", nodeid, key)
+    return nodes
+
+
+GENERATORS = {
+    "chain": chain,
+    "fanout": fanout,
+    "diamond": diamond,
+    "random": random_dag,
+}
+
+
+def generate(shape: str, size: int) -> Dict[str, dict]:
+    """Flow of the given shape and number of nodes
+
+    Raises
+    ------
+    ValueError
+        If the shape is unknown
+    """
+    if shape not in GENERATORS:
+        raise ValueError(f"Unknown shape {shape}. It should be one of {SHAPES}.")
+    return GENERATORS[shape](size)
@@ -0,0 +1,243 @@
+"""
+Run the benchmarks and save the results as a JSON baseline
+
+    python -m benchmarks.run
+    python -m benchmarks.run --shapes chain random --sizes 10 1000 --modes sync
+
+Every combination of shape, size and mode is measured:
+    compile_s: time to validate and compile the flow
+    run_s: best wall time of a run, compilation included
+    throughput: nodes per second of the best run
+    per_node_us: wall time of the best run per node, in microseconds. The node
+        functions are trivial, so this is the overhead of the JobRunner.
+    peak_memory_bytes: peak of the memory allocated by Python during a run
+
+The distributed mode runs against an in-memory fakeredis server and an rq
+SimpleWorker in this process. submit_s is the time the JobRunner takes to
+enqueue the jobs and execute_s the time the worker takes to run them.
+
+The time taken to build the Config of the node functions is saved once, as
+config_build_s.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from flowfunc.config import Config
+from flowfunc.jobrunner import JobRunner
+
+from .flows import SHAPES, build_config, generate
+
+MODES = ("sync", "async", "distributed")
+SIZES = (10, 100, 1000, 10000)
+BASELINES = Path(__file__).parent / "baselines"
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of repeat calls of func, after a first call to warm up
+    the caches"""
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func: Callable[[], Any]) -> int:
+    """Peak of the memory allocated by Python during a call of func"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def check_results(results: Dict[str, Any]):
+    failed = [nodeid for nodeid, node in results.items() if node.status != "finished"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} node(s) did not finish: {failed[:5]}")
+
+
+def measure_sync(config: Config, nodes: dict, repeat: int) -> Dict[str, float]:
+    runner = JobRunner(config)
+
+    def run():
+        check_results(runner.run(nodes))
+
+    return {"run_s": best_time(run, repeat), "peak_memory_bytes": peak_memory(run)}
+
+
+def measure_async(config: Config, nodes: dict, repeat: int) -> Dict[str, float]:
+    runner = JobRunner(config, method="async")
+
+    async def timed_runs() -> float:
+        # All the runs share the event loop, unlike the sync method which
+        # starts a new one for every run
+        check_results(await runner.run(nodes))
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            check_results(await runner.run(nodes))
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    async def run():
+        check_results(await runner.run(nodes))
+
+    return {
+        "run_s": asyncio.run(timed_runs()),
+        "peak_memory_bytes": peak_memory(lambda: asyncio.run(run())),
+    }
+
+
+def measure_distributed(config: Config, nodes: dict, repeat: int) -> Dict[str, float]:
+    import fakeredis
+    from rq import SimpleWorker
+
+    from flowfunc.distributed import NodeJob, NodeQueue
+
+    def run() -> Dict[str, float]:
+        # A new server every time, so that the runs do not slow down each other
+        connection = fakeredis.FakeStrictRedis(server=fakeredis.FakeServer())
+        queue = NodeQueue(connection=connection)
+        runner = JobRunner(config, method="distributed", default_queue=queue)
+        start = time.perf_counter()
+        runner.run(nodes)
+        submitted = time.perf_counter()
+        worker = SimpleWorker([queue], connection=connection, job_class=NodeJob)
+        worker.work(burst=True, logging_level="WARNING")
+        executed = time.perf_counter()
+        failed = queue.failed_job_registry.count
+        if failed:
+            raise RuntimeError(f"{failed} job(s) failed")
+        return {"submit_s": submitted - start, "execute_s": executed - submitted}
+
+    runs = [run() for _ in range(repeat)]
+    best = min(runs, key=lambda x: x["submit_s"] + x["execute_s"])
+    return {
+        "run_s": best["submit_s"] + best["execute_s"],
+        **best,
+        "peak_memory_bytes": peak_memory(run),
+    }
+
+
+MEASURES = {
+    "sync": measure_sync,
+    "async": measure_async,
+    "distributed": measure_distributed,
+}
+
+
+def benchmark(
+    config: Config, shape: str, size: int, mode: str, repeat: int = 3
+) -> Dict[str, Any]:
+    """Measure one combination of shape, size and mode"""
+    nodes = generate(shape, size)
+    runner = JobRunner(config)
+    record = {
+        "shape": shape,
+        "size": size,
+        "mode": mode,
+        "edges": sum(len(node["connections"]["inputs"]) for node in nodes.values()),
+        "compile_s": best_time(lambda: runner.compile(nodes), repeat),
+    }
+    record.update(MEASURES[mode](config, nodes, repeat))
+    record["throughput"] = size / record["run_s"]
+    record["per_node_us"] = record["run_s"] / size * 1e6
+    return record
+
+
+def git_commit() -> Optional[str]:
+    """The commit checked out, if the benchmarks run in a git repository"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    shapes: List[str],
+    sizes: List[int],
+    modes: List[str],
+    repeat: int = 3,
+    max_distributed_size: int = 100,
+) -> Dict[str, Any]:
+    """Run all the combinations and return the baseline"""
+    config_build_s = best_time(build_config, repeat)
+    config = build_config()
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            for mode in modes:
+                if mode == "distributed" and size > max_distributed_size:
+                    continue
+                record = benchmark(config, shape, size, mode, repeat)
+                print(
+                    f"{shape:>8} {size:>6} {mode:>12}"
+                    f" {record['run_s']:10.4f}s {record['per_node_us']:10.1f}us/node"
+                    f" {record['peak_memory_bytes'] / 1e6:8.1f}MB"
+                )
+                results.append(record)
+    return {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "config_build_s": config_build_s,
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-distributed-size",
+        type=int,
+        default=100,
+        help="Largest flow run with the distributed mode, which takes tens of"
+        " milliseconds per node",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON file of the baseline. benchmarks/baselines/<commit>.json by"
+        " default",
+    )
+    args = parser.parse_args(argv)
+    # The JobRunner logs every node it evaluates
+    logging.getLogger("flowfunc").setLevel(logging.WARNING)
+    baseline = run_benchmarks(
+        args.shapes, args.sizes, args.modes, args.repeat, args.max_distributed_size
+    )
+    output = args.output or BASELINES / f"{baseline['commit'] or 'latest'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(baseline, indent=2))
+    print(f"Saved the baseline to {output}")
+
+
+if __name__ == "__main__":
+    main()
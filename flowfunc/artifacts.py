@@ -0,0 +1,275 @@
+"""
+Artifacts
+---------
+This module defines the artifact stores which keep the large results of the
+jobs of a distributed run out of redis.
+
+A job whose result is larger than the threshold of the store writes it to the
+store and returns a small ArtifactRef instead. rq stores only the reference in
+redis, and the jobs connected to it load the value from the store. The store
+should be on a filesystem shared by all the workers.
+
+NumPy arrays are written in the .npy format and Arrow tables in the Arrow IPC
+format. Both are memory-mapped when loaded, so the data is read from disk only
+when it is used. Other values are pickled.
+"""
+
+from __future__ import annotations
+import pickle
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+
+from .utils import import_object, logger, object_path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Separates the job ID from the position of the port in the artifact names
+SEPARATOR = "--"
+
+
+@dataclass(frozen=True)
+class ArtifactRef:
+    """Reference to a value in an artifact store, returned by the jobs in place
+    of the value
+
+    Not a tuple, so that it is never mistaken for the results of a node with
+    several outputs.
+    """
+
+    path: str
+    format: str
+    size: int
+
+
+class ArtifactStore:
+    """Base class of the artifact stores
+
+    Subclasses implement `_save`, `_load`, `_delete` and `collect`, and add
+    the arguments of their constructor to `init_kwargs`.
+
+    Attributes
+    ----------
+    threshold: int
+        Values smaller than this number of bytes are returned as they are
+    """
+
+    def __init__(self, threshold: int = 1 << 20):
+        self.threshold = threshold
+
+    def init_kwargs(self) -> Dict[str, Any]:
+        """The arguments of the constructor of the store"""
+        return {"threshold": self.threshold}
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """The dotted path of the class of the store and the arguments of its
+        constructor, sent in the meta data of the jobs instead of the store.
+        See `load_artifact_store`.
+        """
+        return {"class": object_path(type(self)), "kwargs": self.init_kwargs()}
+
+    def offload(self, job_id: str, result: Any) -> Any:
+        """Replace the large items of the result of a job with references"""
+        if isinstance(result, tuple):
+            return tuple(
+                self.save(f"{job_id}{SEPARATOR}{index}", value)
+                for index, value in enumerate(result)
+            )
+        return self.save(f"{job_id}{SEPARATOR}0", result)
+
+    def save(self, key: str, value: Any) -> Any:
+        """Store the value if it is larger than the threshold. Returns the
+        reference, or the value itself if it is not stored.
+        """
+        size, fmt, data = encode(value)
+        if size < self.threshold:
+            return value
+        if fmt == "pickle" and data is None:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        ref = self._save(key, value, fmt, data)
+        logger.debug(f"Stored {size} bytes as artifact {ref.path}")
+        return ref
+
+    def resolve(self, value: Any) -> Any:
+        """Load the value if it is a reference"""
+        if isinstance(value, ArtifactRef):
+            return self._load(value)
+        return value
+
+    def delete(self, ref: ArtifactRef):
+        self._delete(ref)
+
+    def collect(self, connection) -> int:
+        """Delete the artifacts of the jobs which have expired. Returns the
+        number of artifacts deleted.
+        """
+        raise NotImplementedError
+
+    def collect_if_due(self, connection):
+        """Called by the JobRunner after submitting a distributed flow, so
+        that the workers never spend time on it. Stores which can tell when
+        they last collected the garbage override this.
+        """
+
+    def _save(self, key: str, value: Any, fmt: str, data: Optional[bytes]):
+        raise NotImplementedError
+
+    def _load(self, ref: ArtifactRef) -> Any:
+        raise NotImplementedError
+
+    def _delete(self, ref: ArtifactRef):
+        raise NotImplementedError
+
+
+def load_artifact_store(settings: Dict[str, Any]) -> ArtifactStore:
+    """The store of the settings in the meta data of a job, built once per
+    process"""
+    return _load_artifact_store(
+        settings["class"], tuple(sorted(settings["kwargs"].items()))
+    )
+
+
+@lru_cache(maxsize=None)
+def _load_artifact_store(class_path: str, kwargs: Tuple) -> ArtifactStore:
+    return import_object(class_path)(**dict(kwargs))
+
+
+def encode(value: Any) -> Tuple[int, str, Optional[bytes]]:
+    """Size and format of a value
+
+    The pickled bytes are returned as well for the values which had to be
+    pickled to find their size, so that they are not pickled twice. The size is
+    -1 if the value cannot be pickled.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex)):
+        return 0, "pickle", None
+    if isinstance(value, (str, bytes)):
+        # Pickled only if they are large enough to be stored
+        if len(value) < 1 << 16:
+            return len(value), "pickle", None
+    if np is not None and isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        return value.nbytes, "npy", None
+    if pa is not None and isinstance(value, pa.Table):
+        return value.nbytes, "arrow", None
+    try:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # Left to rq, which will fail with a proper error if it cannot
+        # store the value either
+        return -1, "pickle", None
+    return len(data), "pickle", data
+
+
+class FileArtifactStore(ArtifactStore):
+    """Artifact store in a directory, which should be shared by the workers
+
+    Attributes
+    ----------
+    directory: Path
+        Directory in which the artifacts are stored
+    threshold: int
+        Values smaller than this number of bytes are returned as they are
+    collect_interval: float
+        Optional. Minimum number of seconds between two garbage collections
+        triggered by the JobRunner when it submits a flow. None to only collect
+        when `collect` is called.
+    """
+
+    EXTENSIONS = {"npy": ".npy", "arrow": ".arrow", "pickle": ".pkl"}
+
+    def __init__(
+        self,
+        directory: str | Path,
+        threshold: int = 1 << 20,
+        collect_interval: Optional[float] = 600,
+    ):
+        super().__init__(threshold)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.collect_interval = collect_interval
+
+    def init_kwargs(self):
+        return {
+            **super().init_kwargs(),
+            "directory": str(self.directory),
+            "collect_interval": self.collect_interval,
+        }
+
+    def _save(self, key, value, fmt, data):
+        path = self.directory / f"{key}{self.EXTENSIONS[fmt]}"
+        # Writing to a temporary file first so that readers never see a
+        # partially written artifact
+        tmp_path = path.with_name(f".{uuid4().hex}.tmp")
+        with tmp_path.open("wb") as f:
+            if fmt == "npy":
+                np.save(f, value, allow_pickle=False)
+            elif fmt == "arrow":
+                with pa.ipc.new_file(f, value.schema) as writer:
+                    writer.write_table(value)
+            else:
+                f.write(data)
+        tmp_path.replace(path)
+        return ArtifactRef(str(path), fmt, path.stat().st_size)
+
+    def _load(self, ref):
+        if ref.format == "npy":
+            return np.load(ref.path, mmap_mode="r")
+        if ref.format == "arrow":
+            return pa.ipc.open_file(pa.memory_map(ref.path)).read_all()
+        return pickle.loads(Path(ref.path).read_bytes())
+
+    def _delete(self, ref):
+        Path(ref.path).unlink(missing_ok=True)
+
+    def collect(self, connection) -> int:
+        from rq.job import Job
+
+        paths = {}
+        for path in self.directory.iterdir():
+            if path.name.startswith("."):
+                continue
+            job_id = path.stem.rsplit(SEPARATOR, 1)[0]
+            paths.setdefault(job_id, []).append(path)
+        if not paths:
+            return 0
+        job_ids = list(paths)
+        with connection.pipeline() as pipeline:
+            for job_id in job_ids:
+                pipeline.exists(Job.key_for(job_id))
+            exists = pipeline.execute()
+        deleted = 0
+        for job_id, job_exists in zip(job_ids, exists):
+            if job_exists:
+                continue
+            for path in paths[job_id]:
+                path.unlink(missing_ok=True)
+                deleted += 1
+        logger.info(f"Deleted {deleted} expired artifact(s) from {self.directory}")
+        return deleted
+
+    def collect_if_due(self, connection):
+        """Collect the garbage if the last collection was more than
+        collect_interval seconds ago
+        """
+        if self.collect_interval is None:
+            return
+        marker = self.directory / ".collected"
+        try:
+            if time.time() - marker.stat().st_mtime < self.collect_interval:
+                return
+        except FileNotFoundError:
+            pass
+        marker.touch()
+        self.collect(connection)
@@ -0,0 +1,45 @@
+"""
+Batches
+-------
+This module defines the helpers of the batch mode of the JobRunner, in which a
+flow runs once for many sets of inputs.
+
+Every node depending on the inputs of the batch is called once with the columns
+of the batch, NumPy arrays with one item per set of inputs, in place of the
+scalars. Nodes whose inputs are all marked vectorizable, using Annotated
+metadata like `Annotated[float, {"vectorizable": True}]`, get the arrays as
+they are. The other nodes are called once per item.
+"""
+
+from __future__ import annotations
+from typing import Any, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def stack(values: List[Any]) -> Any:
+    """Stack the items of a column into a NumPy array. Items which NumPy cannot
+    stack, like dicts or strings of different types, are kept in a list.
+    """
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        # Items of different shapes
+        return list(values)
+    if array.dtype == object:
+        return list(values)
+    return array
+
+
+def stack_outputs(outputs: List[Any]) -> Any:
+    """Stack the results of the calls of a node for every item of a batch
+
+    The results of nodes with several outputs are stacked into a tuple of
+    columns, one per output.
+    """
+    if outputs and isinstance(outputs[0], tuple):
+        return tuple(stack(list(column)) for column in zip(*outputs))
+    return stack(outputs)
@@ -0,0 +1,312 @@
+"""
+Result cache
+------------
+This module defines the caches which let the JobRunner skip the nodes whose
+inputs have not changed since they were last run.
+
+A result is stored under the type of the node and a digest of its inputs. The
+digest covers the version of the node function, the values of the controls of
+the node and the digests of the nodes connected to its inputs, so a change
+anywhere upstream changes the digest of all the nodes downstream of it. The
+version is `Node.version` if it is set, or else a digest of the code of the
+function, so that the results of an older version of a function are not used.
+"""
+
+from __future__ import annotations
+import hashlib
+import pickle
+import shutil
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .utils import logger
+
+# Returned by the caches when there is no result for a key
+MISSING = object()
+
+
+def _hash_code(digest, code: CodeType):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            # Nested functions, whose repr holds their address
+            _hash_code(digest, const)
+        else:
+            digest.update(repr(const).encode())
+
+
+@lru_cache(maxsize=None)
+def _code_digest(func: Callable) -> str:
+    name = f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', '')}"
+    digest = hashlib.sha256(name.encode())
+    code = getattr(func, "__code__", None)
+    if code is None:
+        # Callable objects
+        code = getattr(getattr(type(func), "__call__", None), "__code__", None)
+    if code is not None:
+        _hash_code(digest, code)
+    return digest.hexdigest()
+
+
+def code_digest(func: Callable) -> str:
+    """Digest of the dotted name and the code of a node function, which
+    changes whenever the function is modified. Memoized by function.
+    """
+    try:
+        return _code_digest(func)
+    except TypeError:
+        # Unhashable callables
+        return _code_digest.__wrapped__(func)
+
+
+def input_digest(
+    node_type: str,
+    input_args: Dict[str, Any],
+    upstream: List[Tuple[str, str, str]],
+    version: Optional[str] = None,
+) -> Optional[str]:
+    """Digest of the inputs of a node
+
+    Parameters
+    ----------
+    node_type: str
+        The type of node
+    input_args: dict
+        The values of the controls of the node
+    upstream: List[Tuple[str, str, str]]
+        The input port name, the digest of the connected node and the name of its
+        output port, for every connected input.
+    version: str
+        Version of the node function, see `Node.version` and `code_digest`
+
+    Returns
+    -------
+    digest: str
+        Hex digest of the inputs. None if the inputs cannot be pickled.
+    """
+    try:
+        payload = pickle.dumps(
+            (node_type, version, sorted(input_args.items()), sorted(upstream)),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    except Exception:
+        return None
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ResultCache:
+    """Base class of the result caches
+
+    Subclasses implement `_get`, `_set` and `_invalidate`.
+
+    Attributes
+    ----------
+    hits: int
+        Number of lookups which found a result
+    misses: int
+        Number of lookups which did not find a result
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, node_type: str, digest: str) -> Any:
+        """Get a result. Returns MISSING if there is no result for the key.
+
+        A lookup which fails, for example because the storage of the cache
+        cannot be reached, is logged and counted as a miss.
+        """
+        try:
+            value = self._get(node_type, digest)
+        except Exception as e:
+            logger.warning(f"Cache lookup of node type {node_type} failed: {e}")
+            value = MISSING
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, node_type: str, digest: str, value: Any):
+        """Store a result
+
+        A result which cannot be stored, because it cannot be pickled or the
+        storage of the cache fails, is logged and skipped.
+        """
+        try:
+            self._set(node_type, digest, value)
+        except Exception as e:
+            logger.warning(f"Result of node type {node_type} cannot be cached: {e}")
+
+    def invalidate(self, node_type: Optional[str] = None):
+        """Remove the results of a node type, or all the results if node_type is
+        None. Call this when a node function or the data it reads has changed.
+        """
+        self._invalidate(node_type)
+
+    def clear(self):
+        """Remove all the results and reset the counters"""
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, node_type: str, digest: str) -> Any:
+        raise NotImplementedError
+
+    def _set(self, node_type: str, digest: str, value: Any):
+        raise NotImplementedError
+
+    def _invalidate(self, node_type: Optional[str]):
+        raise NotImplementedError
+
+
+class MemoryCache(ResultCache):
+    """Least recently used in-memory cache
+
+    The results are stored as they are, without copying. The node functions
+    should not modify their arguments in place.
+
+    Attributes
+    ----------
+    maxsize: int
+        Maximum number of results kept in the cache
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__()
+        self.maxsize = maxsize
+        self._results: OrderedDict[Tuple[str, str], Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def _get(self, node_type, digest):
+        key = (node_type, digest)
+        if key not in self._results:
+            return MISSING
+        self._results.move_to_end(key)
+        return self._results[key]
+
+    def _set(self, node_type, digest, value):
+        self._results[(node_type, digest)] = value
+        self._results.move_to_end((node_type, digest))
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def _invalidate(self, node_type):
+        if node_type is None:
+            self._results.clear()
+            return
+        for key in [key for key in self._results if key[0] == node_type]:
+            del self._results[key]
+
+
+class DiskCache(ResultCache):
+    """Cache which pickles the results into a directory
+
+    The results are kept in a `flowfunc_results` sub directory of the given
+    directory, with one sub directory for every node type, so that clearing the
+    cache only removes what the cache has stored.
+
+    Attributes
+    ----------
+    directory: Path
+        Directory in which the results are stored
+    """
+
+    def __init__(self, directory: str | Path):
+        super().__init__()
+        self.directory = Path(directory)
+        self.root = self.directory / "flowfunc_results"
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, node_type, digest) -> Path:
+        return self.root / node_type / f"{digest}.pkl"
+
+    def _get(self, node_type, digest):
+        path = self._path(node_type, digest)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return MISSING
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # Corrupt, or referring to classes which were renamed or removed
+            logger.warning(f"Ignoring the cached result {path} which cannot be loaded")
+            return MISSING
+
+    def _set(self, node_type, digest, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(node_type, digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Writing to a temporary file first so that readers never see a
+        # partially written result. Its name is unique so that processes
+        # writing the same result do not write to the same file.
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, suffix=".tmp", delete=False
+        ) as f:
+            f.write(data)
+        Path(f.name).replace(path)
+
+    def _invalidate(self, node_type):
+        if node_type is None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            return
+        shutil.rmtree(self.root / node_type, ignore_errors=True)
+
+
+class RedisCache(ResultCache):
+    """Cache which stores the pickled results in redis
+
+    The connection of the NodeQueue used for distributed runs can be reused,
+    for example `RedisCache(queue.connection)`.
+
+    Attributes
+    ----------
+    connection: Redis
+        The redis connection
+    prefix: str
+        Prefix of the redis keys
+    ttl: int
+        Optional. Number of seconds after which a result expires
+    """
+
+    def __init__(self, connection, prefix: str = "flowfunc:cache", ttl=None):
+        super().__init__()
+        self.connection = connection
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, node_type, digest) -> str:
+        return f"{self.prefix}:{node_type}:{digest}"
+
+    def _get(self, node_type, digest):
+        key = self._key(node_type, digest)
+        data = self.connection.get(key)
+        if data is None:
+            return MISSING
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # Corrupt, or referring to classes which were renamed or removed
+            logger.warning(f"Ignoring the cached result {key} which cannot be loaded")
+            return MISSING
+
+    def _set(self, node_type, digest, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.connection.set(self._key(node_type, digest), data, ex=self.ttl)
+
+    def _invalidate(self, node_type):
+        pattern = (
+            f"{self.prefix}:*" if node_type is None else f"{self.prefix}:{node_type}:*"
+        )
+        keys = list(self.connection.scan_iter(match=pattern))
+        if keys:
+            self.connection.delete(*keys)
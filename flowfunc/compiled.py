@@ -0,0 +1,247 @@
+"""
+Compiled flows
+--------------
+This module defines the CompiledFlow, which holds everything the JobRunner
+derives from a flow before running it: the validated nodes, the node functions
+they resolve to, the topological order, the values of their controls and the
+connections of their inputs.
+
+Compile a flow once with `JobRunner.compile` and pass it to `JobRunner.run` to
+skip all of that work on every run. A CompiledFlow can be pickled, so that it
+can be cached or sent to the workers.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import batch
+from .config import Config
+from .graph import FlowGraph
+from .models import Node, OutNode
+from .parsing import validate_nodes
+from .streams import is_generator_function
+
+
+def node_controls(out_node: OutNode) -> Dict[str, Any]:
+    """Values of the controls of the inputs of a node which are not connected
+    to another node
+    """
+    controls = {}
+    for key, values in out_node.inputData.items():
+        if not values or key in out_node.connections.inputs:
+            continue
+        # If there are more than one control in this port return the dict
+        if len(values) > 1:
+            variable_value = values
+        else:
+            # else return the value of the first item in the dict
+            # TODO: when flume implements option to have multiple inputs
+            # address it here.
+            variable_value = next(iter(values.values()))
+        if variable_value is None:
+            continue  # This is null coming from react for unset controls
+        controls[key] = variable_value
+    return controls
+
+
+def node_bindings(out_node: OutNode) -> List[Tuple[str, str, str]]:
+    """The input key, the ID of the connected node and its output port, for
+    every connected input of a node
+    """
+    # Now only one connection is supported by flume. Hence using the first one
+    return [
+        (key, connections[0].nodeId, connections[0].portName)
+        for key, connections in out_node.connections.inputs.items()
+    ]
+
+
+class CompiledFlow:
+    """A flow prepared once for repeated runs
+
+    Attributes
+    ----------
+    nodes: Dict[str, OutNode]
+        The validated nodes of the flow
+    graph: FlowGraph
+        The dependency graph of the flow
+    order: List[str]
+        The node IDs in topological order
+    config_nodes: Dict[str, Node]
+        The config Node, which holds the node function, of every node ID
+    controls: Dict[str, Dict[str, Any]]
+        The values of the inputs of every node which are set in the editor
+    bindings: Dict[str, List[Tuple[str, str, str]]]
+        The input key, the connected node ID and its output port name for every
+        connected input of every node
+    output_names: Dict[str, Tuple[str, ...]]
+        The output port names of every node
+    batch_size: int
+        Number of sets of inputs of a batch flow, None otherwise
+    columns: Dict[str, Set[str]]
+        The inputs of every node of a batch flow which get a column of the
+        batch, for the nodes depending on the inputs of the batch
+    selected: Set[str]
+        The IDs of the nodes selected with `select`, None for a whole flow
+    """
+
+    def __init__(
+        self,
+        nodes: Dict[str, OutNode],
+        graph: FlowGraph,
+        config_nodes: Dict[str, Node],
+        controls: Dict[str, Dict[str, Any]],
+        bindings: Dict[str, List[Tuple[str, str, str]]],
+        output_names: Dict[str, Tuple[str, ...]],
+    ):
+        self.nodes = nodes
+        self.graph = graph
+        # Also makes sure that the flow is acyclic
+        self.order = [nodeid for level in graph.levels() for nodeid in level]
+        self.config_nodes = config_nodes
+        self.controls = controls
+        self.bindings = bindings
+        self.output_names = output_names
+        self.batch_size: Optional[int] = None
+        self.columns: Dict[str, Set[str]] = {}
+        self.selected: Optional[Set[str]] = None
+
+    @classmethod
+    def compile(
+        cls, out_dict: Dict[str, OutNode | Dict[str, Any]], config: Config
+    ) -> CompiledFlow:
+        """Compile the output of the node editor
+
+        Raises
+        ------
+        ValueError
+            If a node type is not in the config
+        CyclicFlowError
+            If the connections of the flow form a cycle
+        """
+        return cls.from_nodes(validate_nodes(out_dict), config)
+
+    @classmethod
+    def from_nodes(cls, nodes: Dict[str, OutNode], config: Config) -> CompiledFlow:
+        """Compile nodes which are validated already, for example by a
+        `flowfunc.parsing.NodeParser`
+
+        Raises
+        ------
+        ValueError
+            If a node type is not in the config
+        CyclicFlowError
+            If the connections of the flow form a cycle
+        """
+        return cls(
+            nodes,
+            FlowGraph.from_nodes(nodes),
+            {nodeid: config.get_node(node.type) for nodeid, node in nodes.items()},
+            {nodeid: node_controls(node) for nodeid, node in nodes.items()},
+            {nodeid: node_bindings(node) for nodeid, node in nodes.items()},
+            {nodeid: config.output_names(node.type) for nodeid, node in nodes.items()},
+        )
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __repr__(self):
+        return f"<CompiledFlow of {len(self)} node(s)>"
+
+    def select(self, node_ids: Optional[Iterable[str]]) -> CompiledFlow:
+        """The part of the flow needed to run the given nodes: the nodes and
+        all the nodes they depend on. The whole flow if node_ids is empty.
+        """
+        if not node_ids:
+            return self
+        closure = self.graph.upstream_closure(node_ids)
+        selected = [nodeid for nodeid in self.nodes if nodeid in closure]
+        nodes = {nodeid: self.nodes[nodeid] for nodeid in selected}
+        flow = CompiledFlow(
+            nodes,
+            FlowGraph.from_nodes(nodes),
+            {nodeid: self.config_nodes[nodeid] for nodeid in selected},
+            {nodeid: self.controls[nodeid] for nodeid in selected},
+            {nodeid: self.bindings[nodeid] for nodeid in selected},
+            {nodeid: self.output_names[nodeid] for nodeid in selected},
+        )
+        flow.selected = closure & set(node_ids)
+        return flow
+
+    def is_output(self, nodeid: str) -> bool:
+        """Whether the result of a node is wanted by the caller, rather than
+        only by the nodes connected to it: the selected nodes, or the nodes
+        without any dependent node if the whole flow is run
+        """
+        if self.selected is not None:
+            return nodeid in self.selected
+        return not self.graph.downstream[nodeid]
+
+    def with_nodes(self, nodes: Dict[str, OutNode]) -> CompiledFlow:
+        """A copy of the flow with some of its nodes replaced by nodes with the
+        same connections but different values of their controls
+        """
+        flow = CompiledFlow.__new__(CompiledFlow)
+        flow.__dict__.update(self.__dict__)
+        flow.nodes = {**self.nodes, **nodes}
+        flow.controls = {
+            **self.controls,
+            **{nodeid: node_controls(node) for nodeid, node in nodes.items()},
+        }
+        return flow
+
+    def with_batch(self, rows: List[Dict[str, Dict[str, Any]]]) -> CompiledFlow:
+        """A copy of the flow which runs once for a batch of inputs
+
+        Parameters
+        ----------
+        rows: List[dict]
+            One dict per set of inputs, which maps node IDs to the values of
+            their inputs, for example `{"node_1": {"a": 2}}`. Inputs missing
+            from a row keep the value set in the editor.
+
+        Raises
+        ------
+        ValueError
+            If a node of the rows is not in the flow, an input of the rows is
+            connected to another node, or a generator node depends on the
+            inputs of the batch
+        """
+        if batch.np is None:
+            raise ImportError("numpy is required to run a batch.")
+        changed = {nodeid: set() for row in rows for nodeid in row}
+        for row in rows:
+            for nodeid, values in row.items():
+                changed[nodeid].update(values)
+        unknown = changed.keys() - self.nodes.keys()
+        if unknown:
+            raise ValueError(f"The nodes {sorted(unknown)} are not in the flow.")
+        batched = self.graph.downstream_closure(changed)
+        flow = CompiledFlow.__new__(CompiledFlow)
+        flow.__dict__.update(self.__dict__)
+        flow.batch_size = len(rows)
+        flow.controls = dict(self.controls)
+        flow.columns = {}
+        for nodeid in self.order:
+            if nodeid not in batched:
+                continue
+            if is_generator_function(self.config_nodes[nodeid].method):
+                raise ValueError(
+                    f"Generator node {nodeid} cannot depend on the inputs of a batch."
+                )
+            columns = flow.columns[nodeid] = set()
+            controls = flow.controls[nodeid] = dict(self.controls[nodeid])
+            connected = {key for key, _, _ in self.bindings[nodeid]}
+            for key in changed.get(nodeid, ()):
+                if key in connected:
+                    raise ValueError(
+                        f"Input {key} of node {nodeid} is connected to another node."
+                    )
+                default = controls.get(key)
+                controls[key] = batch.stack(
+                    [row.get(nodeid, {}).get(key, default) for row in rows]
+                )
+                columns.add(key)
+            for key, dependent_nodeid, _ in self.bindings[nodeid]:
+                if dependent_nodeid in batched:
+                    columns.add(key)
+        return flow
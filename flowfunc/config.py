@@ -2,9 +2,15 @@ from __future__ import annotations
 from copy import deepcopy
 from dataclasses import fields, is_dataclass
 from enum import Enum
+from functools import lru_cache, wraps
+import hashlib
 import inspect
-from typing import Any, Callable, List, Optional, Union
+from pathlib import Path
+import pickle
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from types import UnionType
+from uuid import uuid4
 try:
     from typing import get_args, get_origin, Annotated
 except ImportError:
@@ -13,7 +19,14 @@ from warnings import warn
 from pydantic import BaseModel
 
 from .models import Color, ConfigModel, ControlType, Node, Port, Control
-from .utils import issubclass_safe
+from .utils import issubclass_safe, logger
+
+# Number of ports, and of the controls of types, memoized for the life of the
+# process
+CACHE_SIZE = 1024
+
+# Bump when the format of the configs cached on disk changes
+CACHE_VERSION = 1
 
 
 def arg_or_kwarg(par: inspect.Parameter):
@@ -31,6 +44,9 @@ def process_port(pname, pobj) -> Port:
     """Convert input arg of a function and convert it to flume config data
     based on it's signature
 
+    The ports are memoized by parameter name and type annotation. A deep copy
+    is returned every time, so that callers can modify it and its controls.
+
     Parameters
     ----------
     pname: str
@@ -43,6 +59,22 @@ def process_port(pname, pobj) -> Port:
     output_dict: dict
         Flume config dict
     """
+    try:
+        hash((pname, pobj))
+    except TypeError:
+        # Annotations with unhashable metadata, like a dict in Annotated
+        return _process_port(pname, pobj)
+    return _cached_port(pname, pobj).model_copy(deep=True)
+
+
+# Building a port is much more expensive than copying it, and large node
+# libraries use the same few types over and over
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_port(pname, pobj) -> Port:
+    return _process_port(pname, pobj)
+
+
+def _process_port(pname, pobj) -> Port:
     if pobj == inspect.Signature.empty:
         return Port(
             type="object",
@@ -244,39 +276,50 @@ def control_from_field(
                 )
 
 
+@lru_cache(maxsize=CACHE_SIZE)
+def type_controls(py_type: type) -> Tuple[Control, ...]:
+    """Controls of the fields of a pydantic model or a dataclass
+
+    Memoized, so the controls are shared by all the callers and must be copied
+    before they are modified.
+    """
+    if issubclass_safe(py_type, BaseModel):
+        items = [
+            (arg_name, field.annotation)
+            for arg_name, field in py_type.model_fields.items()
+        ]
+    else:
+        items = [(field.name, field.type) for field in fields(py_type)]
+    controls = [control_from_field(arg_name, arg_type) for arg_name, arg_type in items]
+    return tuple(control for control in controls if control)
+
+
 def ports_from_nodes(nodes: List[Node]) -> List[Port]:
-    """Function to find unique port types that are used in all nodes"""
-    ports_: List[Port] = []
+    """Function to find unique port types that are used in all nodes
+
+    The first port of every type is kept, as in a set of ports.
+    """
+    ports_: Dict[str, Port] = {}
     for node in nodes:
-        if node.inputs:
-            ports_ += [p for p in node.inputs if isinstance(p, Port)]
-        if node.outputs:
-            ports_ += [p for p in node.outputs if isinstance(p, Port)]
+        for node_ports in (node.inputs, node.outputs):
+            if not isinstance(node_ports, list):
+                continue
+            for p in node_ports:
+                if isinstance(p, Port):
+                    ports_.setdefault(p.type, p)
     ports = []
-    for port_ in ports_:
+    for port_ in ports_.values():
         port = deepcopy(port_)
         ports.append(port)
         # Copy is made so that the port instance in Node object is unaffected
-        if inspect.isclass(port.py_type) and issubclass_safe(port.py_type, BaseModel):
-            # Use a pydantic model
-            port.controls = []
-            for arg_name, field in port.py_type.model_fields.items():
-                control_ = control_from_field(
-                    arg_name,
-                    field.annotation,
-                )
-                if control_:
-                    port.controls.append(control_)
-        elif inspect.isclass(port.py_type) and is_dataclass(port.py_type):
-            port.controls = []
-            for field in fields(port.py_type):
-                control_ = control_from_field(
-                    field.name,
-                    field.type,
-                )
-                if control_:
-                    port.controls.append(control_)
-
+        if inspect.isclass(port.py_type) and (
+            issubclass_safe(port.py_type, BaseModel) or is_dataclass(port.py_type)
+        ):
+            # Use a pydantic model or a dataclass
+            port.controls = [
+                control.model_copy(deep=True)
+                for control in type_controls(port.py_type)
+            ]
         else:
             control = control_from_field(port.name, port.py_type, port)
             # Dont set controls if there are no controls corresponding to type
@@ -286,6 +329,183 @@ def ports_from_nodes(nodes: List[Node]) -> List[Port]:
     return ports
 
 
+def module_hash(module_name: str) -> Optional[str]:
+    """Hash of the source file of a module. None if it has no file."""
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    if path is None:
+        return None
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def config_cache_path(cache_dir: Path, function_list: List[Callable]) -> Path:
+    """File of the cached config of a list of functions, named after the
+    functions, the python version and the version of the cache format"""
+    digest = hashlib.sha256(f"{CACHE_VERSION}|{sys.version}".encode())
+    for func in function_list:
+        digest.update(f"{func.__module__}.{func.__qualname__}\n".encode())
+    return cache_dir / f"config-{digest.hexdigest()[:32]}.pkl"
+
+
+def config_dependencies(nodes: List[Node], ports: List[Port]) -> List[str]:
+    """Modules whose source the generated config depends on: the modules of
+    the functions and of the types of the ports, and the modules generating
+    the config"""
+    modules = {__name__, Node.__module__}
+    modules.update(node.module for node in nodes if node.module)
+    all_ports = list(ports)
+    for node in nodes:
+        for node_ports in (node.inputs, node.outputs):
+            if isinstance(node_ports, list):
+                all_ports += node_ports
+    seen = set()
+    for port in all_ports:
+        modules.update(type_modules(port.py_type, seen))
+    return sorted(modules)
+
+
+def type_modules(py_type: Any, seen: Optional[set] = None) -> set:
+    """Modules of a type, of its arguments and of the types of its fields if it
+    is a pydantic model or a dataclass, recursively
+
+    seen holds the ids of the types visited already, which are skipped.
+    """
+    if seen is None:
+        seen = set()
+    if id(py_type) in seen:
+        return set()
+    seen.add(id(py_type))
+    modules = set()
+    nested = list(get_args(py_type))
+    if inspect.isclass(py_type):
+        module = getattr(py_type, "__module__", None)
+        if module and module != "builtins":
+            modules.add(module)
+        if issubclass_safe(py_type, BaseModel):
+            nested += [field.annotation for field in py_type.model_fields.values()]
+        elif is_dataclass(py_type):
+            nested += [field.type for field in fields(py_type)]
+    for arg in nested:
+        modules |= type_modules(arg, seen)
+    return modules
+
+
+def load_cached_config(
+    cache_dir: Path, function_list: List[Callable]
+) -> Optional[Tuple[List[Node], List[Port]]]:
+    """Load the nodes and ports of a list of functions from the on-disk cache.
+    None if they are not cached or if a source file has changed since."""
+    path = config_cache_path(cache_dir, function_list)
+    try:
+        cached = pickle.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring the cached config {path}: {e}")
+        return None
+    if any(module_hash(name) != hash_ for name, hash_ in cached["modules"].items()):
+        logger.info(f"Cached config {path} is out of date.")
+        return None
+    nodes = cached["nodes"]
+    # The functions may be wrapped differently from the pickled references
+    for node, func in zip(nodes, function_list):
+        node.method = func
+    return nodes, cached["ports"]
+
+
+def save_cached_config(
+    cache_dir: Path, function_list: List[Callable], nodes: List[Node], ports: List[Port]
+):
+    """Pickle the nodes and ports of a list of functions into the cache"""
+    modules = {name: module_hash(name) for name in config_dependencies(nodes, ports)}
+    if None in modules.values():
+        # Functions defined without a source file cannot be validated
+        return
+    try:
+        data = pickle.dumps(
+            {"modules": modules, "nodes": nodes, "ports": ports},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    except Exception as e:
+        logger.info(f"Config cannot be cached: {e}")
+        return
+    path = config_cache_path(cache_dir, function_list)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Writing to a temporary file first so that other processes never load a
+    # partially written config
+    tmp_path = path.with_name(f".{uuid4().hex}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+
+def config_delta(old: dict, new: dict) -> dict:
+    """Changes between two config dicts
+
+    Parameters
+    ----------
+    old: dict
+        The config dict the client has
+    new: dict
+        The config dict the client should have
+
+    Returns
+    -------
+    delta: dict
+        For portTypes and nodeTypes, the types which were added or changed
+        ("added", the whole dicts) and the types which were removed ("removed",
+        their type names)
+    """
+    delta = {}
+    for key in ("portTypes", "nodeTypes"):
+        old_types = {x["type"]: x for x in old.get(key, [])}
+        new_types = {x["type"]: x for x in new.get(key, [])}
+        delta[key] = {
+            "added": [x for type_, x in new_types.items() if old_types.get(type_) != x],
+            "removed": [type_ for type_ in old_types if type_ not in new_types],
+        }
+    return delta
+
+
+def _notifying(method: Callable) -> Callable:
+    """Wrap a method of list so that it calls the on_change function of the
+    NodeList after modifying it"""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self.on_change()
+        return result
+
+    return wrapper
+
+
+class NodeList(list):
+    """The list of nodes of a Config, which lets the Config know when it is
+    modified in place so that its node type index is rebuilt"""
+
+    def __init__(self, nodes, on_change: Callable[[], None]):
+        super().__init__(nodes)
+        self.on_change = on_change
+
+    append = _notifying(list.append)
+    extend = _notifying(list.extend)
+    insert = _notifying(list.insert)
+    remove = _notifying(list.remove)
+    pop = _notifying(list.pop)
+    clear = _notifying(list.clear)
+    sort = _notifying(list.sort)
+    reverse = _notifying(list.reverse)
+    __setitem__ = _notifying(list.__setitem__)
+    __delitem__ = _notifying(list.__delitem__)
+    __iadd__ = _notifying(list.__iadd__)
+    __imul__ = _notifying(list.__imul__)
+
+    def __reduce__(self):
+        return NodeList, (list(self), self.on_change)
+
+
 class Config:
     """This class is the python class corresponding to the flume config object.
 
@@ -303,9 +523,15 @@ class Config:
         function_list: List[Callable],
         extra_nodes: Optional[List[Node]] = None,
         extra_ports: Optional[List[Port]] = None,
+        cache_dir: Optional[str | Path] = None,
     ):
         """Create config from a list of functions
 
+        With a cache_dir, the nodes and ports generated from the functions are
+        pickled into it, and loaded instead of being generated again as long as
+        the source files of the modules of the functions and of the types they
+        use have not changed.
+
         Parameters
         ----------
         function_list: List[Callable]
@@ -314,32 +540,97 @@ class Config:
             List of extra nodes that should be added added to the config
         extra_ports: Optional[List[Node]]
             List of extra ports that should be added added to the config
+        cache_dir: Optional[str | Path]
+            Directory of the on-disk cache of the generated configs
 
         Returns
         -------
         config: Config
             An instance of Config object
         """
-        nodes = []
-        for func in function_list:
-            # Not using docstring based parsing
-            node = process_node(func)
-            nodes.append(node)
+        cached = None
+        if cache_dir is not None:
+            cached = load_cached_config(Path(cache_dir), function_list)
+        if cached is not None:
+            nodes, node_ports = cached
+        else:
+            nodes = []
+            for func in function_list:
+                # Not using docstring based parsing
+                node = process_node(func)
+                nodes.append(node)
+            node_ports = ports_from_nodes(nodes)
+            if cache_dir is not None:
+                save_cached_config(Path(cache_dir), function_list, nodes, node_ports)
 
         if extra_nodes is None:
             extra_nodes = []
         if extra_ports is None:
             extra_ports = []
-        ports = list(set(extra_ports + ports_from_nodes(nodes)))
+        ports = list(set(extra_ports + node_ports))
         nodes = nodes + extra_nodes
         return cls(nodes, ports)
 
     def __init__(self, nodes, ports=None) -> None:
+        self._payload = None
         self.nodes = nodes
         # if ports is None, during the conversion of the object to a dict, the
         # ports from nodes are automatically extracted and used.
         self.ports = ports
 
+    @property
+    def nodes(self) -> List[Node]:
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes: List[Node]):
+        self._nodes = NodeList(nodes, self.node_list_changed)
+        self.reindex()
+        self.invalidate()
+
+    def node_list_changed(self):
+        """Mark the node type index as out of date after the `nodes` list was
+        modified in place"""
+        self._index_stale = True
+
+    @property
+    def ports(self) -> Optional[List[Port]]:
+        return self._ports
+
+    @ports.setter
+    def ports(self, ports: Optional[List[Port]]):
+        self._ports = ports
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached output of `dict`, `json_bytes` and `etag`
+
+        The cache is dropped automatically when `nodes` or `ports` is assigned,
+        or when nodes or ports are added to, removed from or replaced in their
+        lists. Call this method after modifying a node or a port itself.
+        """
+        self._payload = None
+
+    def reindex(self):
+        """Rebuild the node type lookup index
+
+        The index is rebuilt automatically when `nodes` is assigned or when
+        nodes are added to, removed from or replaced in the list. Call this
+        method after changing the type of a node itself.
+        """
+        self._index_stale = False
+        self._node_index: Dict[str, Node] = {}
+        self._output_names: Dict[str, Tuple[str, ...]] = {}
+        for node in self._nodes:
+            if node.type in self._node_index:
+                # The first node of a type wins, as in a linear search
+                continue
+            self._node_index[node.type] = node
+            if isinstance(node.outputs, list):
+                self._output_names[node.type] = tuple(x.name for x in node.outputs)
+            else:
+                self._output_names[node.type] = ()
+
     def get_node(self, node_type: str) -> Node:
         """Get a node object
 
@@ -353,17 +644,74 @@ class Config:
         node: Node
             Node pydantic object
         """
-        for node in self.nodes:
-            if node.type == node_type:
-                return node
-        raise ValueError(f"Node type {node_type} not found in config.")
+        if self._index_stale:
+            self.reindex()
+        try:
+            return self._node_index[node_type]
+        except KeyError:
+            raise ValueError(f"Node type {node_type} not found in config.")
+
+    def output_names(self, node_type: str) -> Tuple[str, ...]:
+        """Names of the output ports of a node type, in the order of the outputs
+
+        Parameters
+        ----------
+        node_type: str
+            The type of node
+
+        Returns
+        -------
+        output_names: Tuple[str, ...]
+            Names of the output ports
+        """
+        if self._index_stale or node_type not in self._output_names:
+            self.get_node(node_type)
+        return self._output_names[node_type]
 
     def dict(self) -> dict:
         """Function to generate the config dict
 
-        This dictionary will be sent to the react backend
+        This dictionary will be sent to the react backend. It is generated
+        once and reused until the nodes or ports change, so it should not be
+        modified.
+        """
+        return self.payload()[0]
+
+    def json_bytes(self) -> bytes:
+        """The config dict encoded as JSON, to serve it without encoding it
+        on every request"""
+        return self.payload()[1]
+
+    def etag(self) -> str:
+        """Hash of the config, which changes whenever the config does. Clients
+        holding a config with the same hash can skip downloading it."""
+        return self.payload()[2]
+
+    def delta(self, old: Config) -> dict:
+        """Changes from an older version of the config, see `config_delta`
+
+        The delta also holds the etag of the older config ("base"), so that a
+        client can check that it holds that version before applying the delta,
+        and the etag of this config ("etag").
         """
-        self.ports = list(filter(lambda p: p.type != "object", self.ports or []))
+        return {
+            **config_delta(old.dict(), self.dict()),
+            "base": old.etag(),
+            "etag": self.etag(),
+        }
+
+    def payload(self) -> Tuple[dict, bytes, str]:
+        """The config dict, its JSON encoding and its hash, generated when the
+        nodes or ports have changed"""
+        # The nodes and ports themselves are kept, so that their ids are not
+        # reused by new objects while the payload is cached
+        key = (*self._nodes, None, *(self._ports or []))
+        if self._payload is not None and (
+            len(self._payload[0]) == len(key)
+            and all(x is y for x, y in zip(self._payload[0], key))
+        ):
+            return self._payload[1]
+        ports = [p for p in self._ports or [] if p.type != "object"]
         # To create an object port, all available types have to be determined so that it
         # can connect to all port types.
         port_object = Port(
@@ -371,10 +719,11 @@ class Config:
             name="object",
             label="object",
             color=Color.red,
-            acceptTypes=[p.type for p in self.ports] + ["object"],
+            acceptTypes=[p.type for p in ports] + ["object"],
         )
-        config_model = ConfigModel(
-            portTypes=self.ports + [port_object], nodeTypes=self.nodes
-        )
-
-        return config_model.model_dump(exclude_none=True)
+        config_model = ConfigModel(portTypes=ports + [port_object], nodeTypes=self.nodes)
+        config_dict = config_model.model_dump(exclude_none=True)
+        config_json = config_model.model_dump_json(exclude_none=True).encode()
+        etag = hashlib.sha256(config_json).hexdigest()
+        self._payload = (key, (config_dict, config_json, etag))
+        return self._payload[1]
@@ -3,12 +3,163 @@ RQ Utils
 --------
 This module defines redis-queue related classess and functions.
 """
+
 from __future__ import annotations
+import bz2
+import lzma
+import time
+import zlib
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from rq.defaults import DEFAULT_RESULT_TTL
 from rq.job import Job
 from rq.queue import Queue
-from .models import OutConnections
+from rq.results import Result
+from rq.serializers import resolve_serializer
+from .artifacts import ArtifactStore, load_artifact_store
+from .cache import MISSING
+from .metrics import NodeHook, call_hooks, finish, load_hooks, measure
+from .models import NodeMetrics, OutConnections
+from .utils import object_path
 from pydantic import validate_arguments
 
+COMPRESSIONS = {"zlib": zlib, "bz2": bz2, "lzma": lzma}
+
+
+def map_result(result: Any, result_keys: List[str]) -> Dict[str, Any]:
+    """Map the result of a node function onto its output ports"""
+    if not isinstance(result, tuple):
+        # If there is only one result item and has to be converted
+        # to a tuple to map it onto a dict and later to kwargs
+        result = (result,)
+    return {x: y for x, y in zip(result_keys, result)}
+
+
+class PortStorage:
+    """Storage of the results of the nodes in one redis key per output port
+
+    Pass an instance as the `port_storage` argument of the JobRunner. The jobs
+    then store every output port of their node separately, and the jobs
+    connected to them load only the ports they are connected to instead of
+    the whole result of the node.
+
+    The result of the job itself is still stored by rq as usual, since it is
+    what `NodeJob.result_mapped` and the callers of the JobRunner read. Every
+    result is therefore stored twice in redis, once whole and once split by
+    port, both for the result_ttl of the job. Combine the storage with a
+    `flowfunc.artifacts.ArtifactStore` to keep the large values out of redis.
+
+    Attributes
+    ----------
+    serializer: Any
+        Optional. A class or module with `dumps` and `loads` methods, or its
+        dotted path. Defaults to the pickle serializer of rq. Only its dotted
+        path is sent to the workers along with the jobs, so it should be
+        importable.
+    compression: str
+        Optional. One of zlib, bz2 or lzma
+    prefix: str
+        Prefix of the redis keys
+    """
+
+    def __init__(
+        self,
+        serializer: Any = None,
+        compression: Optional[str] = None,
+        prefix: str = "flowfunc:port",
+    ):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(
+                f"The provided compression {compression} is not identified."
+                f" It should be one of {', '.join(COMPRESSIONS)}"
+            )
+        self.serializer = resolve_serializer(serializer)
+        self.serializer_path = (
+            serializer
+            if serializer is None or isinstance(serializer, str)
+            else object_path(serializer)
+        )
+        self.compression = compression
+        self.prefix = prefix
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """The arguments from which the workers build the same storage, sent in
+        the meta data of the jobs instead of the storage itself"""
+        return {
+            "serializer": self.serializer_path,
+            "compression": self.compression,
+            "prefix": self.prefix,
+        }
+
+    def key(self, job_id: str, port_name: str) -> str:
+        return f"{self.prefix}:{job_id}:{port_name}"
+
+    def dumps(self, value: Any) -> bytes:
+        data = self.serializer.dumps(value)
+        if self.compression:
+            data = COMPRESSIONS[self.compression].compress(data)
+        return data
+
+    def loads(self, data: bytes) -> Any:
+        if self.compression:
+            data = COMPRESSIONS[self.compression].decompress(data)
+        return self.serializer.loads(data)
+
+    def save(
+        self,
+        connection,
+        job_id: str,
+        result_mapped: Dict[str, Any],
+        ttl: Optional[int] = None,
+    ):
+        """Store the ports of the result of a job
+
+        ttl follows the result_ttl of rq: None for the default of rq, -1 to
+        keep the ports forever and 0 to not store them at all.
+        """
+        if ttl is None:
+            ttl = DEFAULT_RESULT_TTL
+        if ttl == 0:
+            return
+        with connection.pipeline() as pipeline:
+            for port_name, value in result_mapped.items():
+                pipeline.set(
+                    self.key(job_id, port_name),
+                    self.dumps(value),
+                    ex=None if ttl == -1 else ttl,
+                )
+            pipeline.execute()
+
+    def load(self, connection, ports: List[Tuple[str, str]]) -> List[Any]:
+        """Load (job ID, port name) pairs in a single redis round trip
+
+        MISSING is returned for the ports which are not stored.
+        """
+        if not ports:
+            return []
+        values = connection.mget(
+            [self.key(job_id, port_name) for job_id, port_name in ports]
+        )
+        return [MISSING if value is None else self.loads(value) for value in values]
+
+
+@lru_cache(maxsize=None)
+def load_port_storage(
+    serializer: Optional[str], compression: Optional[str], prefix: str
+) -> PortStorage:
+    """The PortStorage of the settings in the meta data of a job, built once
+    per process"""
+    return PortStorage(serializer, compression, prefix)
+
+
+def utc_timestamp(value: Optional[datetime]) -> Optional[float]:
+    """Seconds since the epoch of the naive UTC datetimes of rq"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
 
 class NodeJob(Job):
     """Custom job class which will modify the kwargs based on the dependencies
@@ -16,33 +167,142 @@ class NodeJob(Job):
 
     There should be two meta variables, node_connections and result_keys which
     will define the connections to the current node and the variable names of
-    the output of the current node.
+    the output of the current node. If the optional meta variable port_storage
+    holds the settings of a PortStorage, the ports of the result are also
+    stored separately, and if artifact_store holds the settings of an
+    ArtifactStore, the large values of the result are kept in it. The metrics
+    of the job are saved in its meta data and reported to the hooks imported
+    from the dotted paths of the optional meta variable hooks.
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        node_connections = self.get_meta().get("node_connections")
+    @property
+    def node_connections(self):
+        """Connections of the node, read from the meta data of the job
+
+        The meta data is loaded along with the job when it is fetched, so no
+        extra redis round trip is required.
+        """
+        node_connections = self.meta.get("node_connections")
         if node_connections:
-            self.node_connections = OutConnections(**node_connections)
-        else:
-            self.node_connections = None
-        # keys for the result dict
-        self.result_keys = self.get_meta().get("result_keys", ["result"])
+            return OutConnections(**node_connections)
+        return None
+
+    @property
+    def result_keys(self):
+        """Keys for the result dict"""
+        return self.meta.get("result_keys", ["result"])
+
+    @property
+    def port_storage(self) -> Optional[PortStorage]:
+        """The PortStorage of the settings in the meta data"""
+        settings = self.meta.get("port_storage")
+        if settings is None:
+            return None
+        return load_port_storage(**settings)
+
+    @property
+    def artifact_store(self) -> Optional[ArtifactStore]:
+        """The ArtifactStore of the settings in the meta data"""
+        settings = self.meta.get("artifact_store")
+        if settings is None:
+            return None
+        return load_artifact_store(settings)
+
+    @property
+    def hooks(self) -> List[NodeHook]:
+        """The hooks imported from the dotted paths in the meta data"""
+        return load_hooks(tuple(self.meta.get("hooks", ())))
+
+    @property
+    def metrics(self) -> Optional[NodeMetrics]:
+        """Time and resources taken by the job, once it has been performed.
+        Refresh the job or fetch it again to read them."""
+        metrics = self.meta.get("metrics")
+        if metrics:
+            return NodeMetrics(**metrics)
+        return None
+
+    def resolve(self, value: Any) -> Any:
+        """Load the value from the artifact store if it is a reference"""
+        if self.artifact_store is not None:
+            return self.artifact_store.resolve(value)
+        return value
 
     def update_kwargs(self):
         if not self.node_connections or not self.node_connections.inputs:
             return
+        # Several ports may read from the same dependent job. Each job is
+        # loaded only once.
+        ports_by_job: Dict[str, List[Tuple[str, str]]] = {}
         for key, node_connection in self.node_connections.inputs.items():
             # Assuming dependent job shares the same connection.
             # Also, dependent job should be complete before this job starts peforming.
             # Also assuming that there is only one connection in one port
             # as flume allows only one at this time.
-            dependent_job = NodeJob.fetch(
-                node_connection[0].job_id, connection=self.connection
+            ports_by_job.setdefault(node_connection[0].job_id, []).append(
+                (key, node_connection[0].portName)
+            )
+        values: Dict[Tuple[str, str], Any] = {}
+        job_ids = list(ports_by_job)
+        if self.port_storage is not None:
+            ports = list(
+                dict.fromkeys(
+                    (job_id, port_name)
+                    for job_id in job_ids
+                    for _, port_name in ports_by_job[job_id]
+                )
             )
-            self.kwargs.update(
-                {key: dependent_job.result_mapped[node_connection[0].portName]}
+            values = dict(zip(ports, self.port_storage.load(self.connection, ports)))
+            # Jobs which did not store their ports, e.g. jobs from a run
+            # without port storage
+            job_ids = list(
+                dict.fromkeys(
+                    job_id for (job_id, _), value in values.items() if value is MISSING
+                )
             )
+        for job_id, result_mapped in zip(job_ids, self.fetch_results_mapped(job_ids)):
+            for _, port_name in ports_by_job[job_id]:
+                values[(job_id, port_name)] = result_mapped[port_name]
+        for job_id, job_ports in ports_by_job.items():
+            for key, port_name in job_ports:
+                self.kwargs[key] = self.resolve(values[(job_id, port_name)])
+
+    def fetch_results_mapped(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        """Mapped results of several jobs, loaded in a single redis round trip
+
+        Only the meta data and the latest result of every job is read, not the
+        whole job hash which also holds the pickled function and its arguments.
+        """
+        supports_redis_streams = self.supports_redis_streams
+        with self.connection.pipeline() as pipeline:
+            for job_id in job_ids:
+                pipeline.hget(self.key_for(job_id), "meta")
+                if supports_redis_streams:
+                    pipeline.xrevrange(Result.get_key(job_id), "+", "-", count=1)
+                else:
+                    pipeline.hget(self.key_for(job_id), "result")
+            responses = pipeline.execute()
+        results_mapped = []
+        for job_id, meta, response in zip(job_ids, responses[::2], responses[1::2]):
+            meta = self.serializer.loads(meta) if meta else {}
+            result = None
+            if supports_redis_streams and response:
+                result_id, payload = response[0]
+                latest = Result.restore(
+                    job_id,
+                    result_id.decode(),
+                    payload,
+                    connection=self.connection,
+                    serializer=self.serializer,
+                )
+                if latest.type == Result.Type.SUCCESSFUL:
+                    result = latest.return_value
+            elif not supports_redis_streams and response is not None:
+                result = self.serializer.loads(response)
+            results_mapped.append(
+                map_result(result, meta.get("result_keys", ["result"]))
+            )
+        return results_mapped
 
     @property
     def func(self):
@@ -53,22 +313,52 @@ class NodeJob(Job):
 
     def perform(self):
         """Overriding the perform method of the parent class"""
-        self.update_kwargs()
-        return super().perform()
+        node_id = self.meta.get("node_id", self.id)
+        node_type = self.meta.get("node_type", self.func_name)
+        metrics = NodeMetrics(
+            queued_at=utc_timestamp(self.enqueued_at), started_at=time.time()
+        )
+        # The jobs are queued by rq, so node_queued is only called now
+        call_hooks(self.hooks, "node_queued", node_id, node_type, metrics)
+        call_hooks(self.hooks, "node_started", node_id, node_type, metrics)
+        result = error = None
+        try:
+            with measure() as measurement:
+                self.update_kwargs()
+                result = super().perform()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            measurement.add_to(metrics)
+            finish(metrics, result)
+            self.meta["metrics"] = metrics.model_dump()
+            self.save_meta()
+            call_hooks(self.hooks, "node_finished", node_id, node_type, metrics, error)
+        if self.artifact_store is not None:
+            # rq stores the references in redis instead of the large values
+            result = self._result = self.artifact_store.offload(self.id, result)
+        if self.port_storage is not None:
+            self.port_storage.save(
+                self.connection,
+                self.id,
+                map_result(result, self.result_keys),
+                self.result_ttl,
+            )
+        return result
 
     @property
     def result_mapped(self):
         """Mapped result dictionary
 
         Creating an extra property which is a dictionary with keys equal to the
-        output ports of the node.
+        output ports of the node. Values kept in the artifact store are loaded
+        from it.
         """
-        res = self.result
-        if not isinstance(res, tuple):
-            # If there is only one result item and has to be converted
-            # to a tuple to map it onto a dict and later to kwargs
-            res = (res,)
-        return {x: y for x, y in zip(self.result_keys, res)}
+        return {
+            key: self.resolve(value)
+            for key, value in map_result(self.result, self.result_keys).items()
+        }
 
 
 class NodeQueue(Queue):
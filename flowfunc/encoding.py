@@ -0,0 +1,187 @@
+"""
+Encoding
+--------
+This module defines a compact encoding of the nodes of a flow, to send large
+flows between the Dash app, the JobRunner and the workers in a fraction of the
+size of the OutNode JSON.
+
+The encoding is a dict (or msgpack bytes) with:
+    v: version of the encoding
+    ids: the node IDs. Nodes refer to each other by index into this list.
+    types: the node types, interned the same way
+    names: the port names, interned the same way
+    nodes: one dict per node, in the order of ids, with
+        t: index of the node type
+        i: the connected inputs, as [port, source node, source port] indexes
+        d: the values of the inputs with a single control named after the input
+        D: the inputData of the other inputs, as it is
+        l: [x, y, width], omitted if the layout is not encoded
+        s: the settings of the node, if any
+
+Defaults are omitted, and the output connections are not encoded at all since
+they are the input connections of the other nodes.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Union
+
+from .models import OutNode
+from .parsing import validate_nodes
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+VERSION = 1
+
+# Layout of the nodes which are decoded without one
+DEFAULT_LAYOUT = (0.0, 0.0, 200.0)
+
+
+class _Interned:
+    """Index of the strings of an encoding"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def __call__(self, value: str) -> int:
+        index = self.index.get(value)
+        if index is None:
+            index = self.index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def encode_nodes(
+    nodes: Dict[str, Union[OutNode, Dict[str, Any]]],
+    layout: bool = True,
+    binary: bool = False,
+) -> Union[dict, bytes]:
+    """Encode the nodes of a flow compactly
+
+    Parameters
+    ----------
+    nodes: dict
+        The output from the UI, or a dict of OutNodes
+    layout: bool
+        Encode the position and width of the nodes. Not needed to run a flow.
+    binary: bool
+        Pack the encoding with msgpack. Requires msgpack.
+
+    Returns
+    -------
+    data: dict or bytes
+    """
+    ids = {nodeid: index for index, nodeid in enumerate(nodes)}
+    types = _Interned()
+    names = _Interned()
+    encoded = []
+    for node in nodes.values():
+        if isinstance(node, OutNode):
+            node = {
+                "type": node.type,
+                "x": node.x,
+                "y": node.y,
+                "width": node.width,
+                "connections": node.connections.model_dump(),
+                "inputData": node.inputData,
+                "settings": node.settings,
+            }
+        item: Dict[str, Any] = {"t": types(node["type"])}
+        inputs = [
+            [names(key), ids[connection["nodeId"]], names(connection["portName"])]
+            for key, connections in node["connections"]["inputs"].items()
+            for connection in connections
+        ]
+        if inputs:
+            item["i"] = inputs
+        simple, other = {}, {}
+        for key, values in node["inputData"].items():
+            if isinstance(values, dict) and len(values) == 1 and key in values:
+                simple[key] = values[key]
+            else:
+                other[key] = values
+        if simple:
+            item["d"] = simple
+        if other:
+            item["D"] = other
+        if layout:
+            item["l"] = [node["x"], node["y"], node["width"]]
+        if node.get("settings"):
+            item["s"] = node["settings"]
+        encoded.append(item)
+    data = {
+        "v": VERSION,
+        "ids": list(ids),
+        "types": types.values,
+        "names": names.values,
+        "nodes": encoded,
+    }
+    if binary:
+        if msgpack is None:
+            raise ImportError("msgpack is required for the binary encoding.")
+        return msgpack.packb(data)
+    return data
+
+
+def decode_node_dicts(data: Union[dict, bytes]) -> Dict[str, Dict[str, Any]]:
+    """Decode a flow encoded with `encode_nodes` into the node dicts sent by
+    the node editor
+
+    The dicts can be run like the output of the editor, so that a
+    `flowfunc.parsing.NodeParser` reuses the nodes which did not change.
+
+    Raises
+    ------
+    ValueError
+        If the data is not in a supported version of the encoding
+    """
+    if isinstance(data, (bytes, bytearray)):
+        if msgpack is None:
+            raise ImportError("msgpack is required for the binary encoding.")
+        data = msgpack.unpackb(data)
+    if data.get("v") != VERSION:
+        raise ValueError(f"Unsupported version {data.get('v')} of the node encoding.")
+    ids, types, names = data["ids"], data["types"], data["names"]
+    inputs: List[Dict[str, List[dict]]] = [{} for _ in ids]
+    outputs: List[Dict[str, List[dict]]] = [{} for _ in ids]
+    for index, item in enumerate(data["nodes"]):
+        for key, source, port in item.get("i", ()):
+            inputs[index].setdefault(names[key], []).append(
+                {"nodeId": ids[source], "portName": names[port]}
+            )
+            outputs[source].setdefault(names[port], []).append(
+                {"nodeId": ids[index], "portName": names[key]}
+            )
+    nodes = {}
+    for index, item in enumerate(data["nodes"]):
+        nodeid = ids[index]
+        x, y, width = item.get("l", DEFAULT_LAYOUT)
+        input_data = {key: {key: value} for key, value in item.get("d", {}).items()}
+        input_data.update(item.get("D", {}))
+        nodes[nodeid] = {
+            "id": nodeid,
+            "x": x,
+            "y": y,
+            "type": types[item["t"]],
+            "width": width,
+            "connections": {"inputs": inputs[index], "outputs": outputs[index]},
+            "inputData": input_data,
+            "settings": item.get("s"),
+        }
+    return nodes
+
+
+def decode_nodes(data: Union[dict, bytes]) -> Dict[str, OutNode]:
+    """Build the OutNodes of a flow encoded with `encode_nodes`
+
+    Raises
+    ------
+    ValueError
+        If the data is not in a supported version of the encoding
+    """
+    # Validating plain dicts is done by pydantic-core, which is much faster
+    # than model_construct
+    return validate_nodes(decode_node_dicts(data))
@@ -4,3 +4,7 @@ class ErrorInDependentNode(Exception):
 
 class QueueError(Exception):
     pass
+
+
+class CyclicFlowError(Exception):
+    pass
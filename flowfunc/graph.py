@@ -0,0 +1,145 @@
+"""
+Flow graph
+----------
+This module defines the dependency graph of a flow created in the node editor.
+"""
+
+from __future__ import annotations
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .exceptions import CyclicFlowError
+from .models import OutNode
+
+
+def input_node_ids(node: OutNode | dict) -> List[str]:
+    """IDs of the nodes connected to the inputs of a node
+
+    The node can be an OutNode or the raw node dict from the node editor.
+    """
+    if isinstance(node, OutNode):
+        return [
+            connection.nodeId
+            for connections in node.connections.inputs.values()
+            for connection in connections
+        ]
+    return [
+        connection["nodeId"]
+        for connections in node["connections"]["inputs"].values()
+        for connection in connections
+    ]
+
+
+class FlowGraph:
+    """Directed acyclic graph of the nodes in a flow
+
+    The graph is built once from the connections of the nodes so that the
+    scheduler does not have to walk the connections of every node again while
+    the flow is running.
+
+    Attributes
+    ----------
+    upstream: Dict[str, List[str]]
+        Node ID mapped to the IDs of the nodes it takes inputs from.
+    downstream: Dict[str, List[str]]
+        Node ID mapped to the IDs of the nodes which take inputs from it.
+    """
+
+    def __init__(self, upstream: Dict[str, List[str]]):
+        self.upstream = upstream
+        self.downstream: Dict[str, List[str]] = {nodeid: [] for nodeid in upstream}
+        for nodeid, parents in upstream.items():
+            for parent in parents:
+                self.downstream[parent].append(nodeid)
+        self._levels: Optional[List[List[str]]] = None
+
+    @classmethod
+    def from_nodes(cls, mapped_dict: Dict[str, OutNode | Dict[str, Any]]) -> FlowGraph:
+        """Create the graph from a dict of nodes
+
+        The nodes can be OutNode objects or the raw node dicts from the node
+        editor, so that the graph can be built in a callback without validating
+        the nodes. Connections to nodes which are not part of `mapped_dict` are
+        ignored.
+        """
+        upstream = {}
+        for nodeid, node in mapped_dict.items():
+            parents = []
+            for parent in input_node_ids(node):
+                if parent in mapped_dict and parent not in parents:
+                    parents.append(parent)
+            upstream[nodeid] = parents
+        return cls(upstream)
+
+    def __len__(self) -> int:
+        return len(self.upstream)
+
+    def in_degrees(self) -> Dict[str, int]:
+        """Number of upstream nodes of every node"""
+        return {nodeid: len(parents) for nodeid, parents in self.upstream.items()}
+
+    def levels(self) -> List[List[str]]:
+        """Group the nodes into topological levels using Kahn's algorithm
+
+        All the nodes in a level depend only on nodes from the previous levels
+        and hence can be run in parallel. The levels are computed only once per
+        graph.
+
+        Raises
+        ------
+        CyclicFlowError
+            If the connections of the flow form a cycle.
+        """
+        if self._levels is not None:
+            return self._levels
+        in_degrees = self.in_degrees()
+        level = [nodeid for nodeid, degree in in_degrees.items() if degree == 0]
+        levels = []
+        visited = 0
+        while level:
+            levels.append(level)
+            visited += len(level)
+            next_level = []
+            for nodeid in level:
+                for child in self.downstream[nodeid]:
+                    in_degrees[child] -= 1
+                    if in_degrees[child] == 0:
+                        next_level.append(child)
+            level = next_level
+        if visited < len(self.upstream):
+            cyclic = sorted(x for x, degree in in_degrees.items() if degree > 0)
+            raise CyclicFlowError(f"The flow has a cycle between nodes {cyclic}.")
+        self._levels = levels
+        return levels
+
+    def parallelism(self) -> List[int]:
+        """Number of nodes which can run in parallel at each level"""
+        return [len(level) for level in self.levels()]
+
+    def upstream_closure(self, node_ids: Iterable[str]) -> Set[str]:
+        """IDs of the given nodes and all the nodes they depend on
+
+        Unknown node IDs are ignored.
+        """
+        return self._closure(node_ids, self.upstream)
+
+    def downstream_closure(self, node_ids: Iterable[str]) -> Set[str]:
+        """IDs of the given nodes and all the nodes which depend on them
+
+        These are the nodes whose results are invalidated when the given nodes
+        change. Unknown node IDs are ignored.
+        """
+        return self._closure(node_ids, self.downstream)
+
+    def _closure(
+        self, node_ids: Iterable[str], adjacency: Dict[str, List[str]]
+    ) -> Set[str]:
+        """Breadth first search over the adjacency lists in O(V + E)"""
+        visited = {nodeid for nodeid in node_ids if nodeid in adjacency}
+        queue = deque(visited)
+        while queue:
+            for neighbour in adjacency[queue.popleft()]:
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    queue.append(neighbour)
+        return visited
@@ -1,17 +1,52 @@
 from __future__ import annotations
 import asyncio
 import inspect
-from copy import copy, deepcopy
-from typing import Any, Callable, Dict, List, Optional
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from copy import copy
+from dataclasses import replace
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from uuid import uuid4
 
 from pydantic import validate_call, ConfigDict
 
+from .artifacts import ArtifactStore
+from .cache import MISSING, ResultCache, code_digest, input_digest
+from .compiled import CompiledFlow
 from .config import Config
+from .encoding import decode_node_dicts
 from .exceptions import ErrorInDependentNode, QueueError
-from .models import OutNode
+from . import batch, sharedmem
+from .metrics import (
+    NodeHook,
+    call_hooks,
+    finish,
+    hook_path,
+    measured_call,
+    resolve_hook,
+)
+from .parsing import NodeParser
+from .graph import FlowGraph
+from .models import Node, NodeMetrics, NodeState, OutNode
+from .streams import NodeStream, StreamReader, is_generator_function, run_in_thread
 from .utils import logger
 
 try:
+    from rq.job import JobStatus
     from .distributed import NodeQueue
 except ImportError:
     # Not opted for distributed
@@ -54,19 +89,65 @@ def default_meta_method(
     return job_queue.enqueue(
         method,
         kwargs=input_args,  # this is later updated by the custom job class
-        meta={
-            "node_connections": node.connections.dict(),
-            "result_keys": [
-                x.name for x in job_runner.flume_config.get_node(node.type).outputs
-            ],
-            "node_id": node.id,
-            **job_runner.meta_data,
-        },
+        meta=job_meta(job_runner, node),
         depends_on=[dependent.job_id for dependent in dependents],
         **job_kwargs,
     )
 
 
+def job_meta(job_runner, node) -> dict:
+    """Meta data of the job of a node, which the NodeJob uses to collect the
+    results of the jobs it depends on
+    """
+    meta = {
+        "node_connections": node.connections.model_dump(),
+        "result_keys": list(job_runner.flume_config.output_names(node.type)),
+        "node_id": node.id,
+        "node_type": node.type,
+        **job_runner.meta_data,
+    }
+    if job_runner.port_storage is not None:
+        meta["port_storage"] = job_runner.port_storage.settings
+    if job_runner.artifact_store is not None:
+        meta["artifact_store"] = job_runner.artifact_store.settings
+    if job_runner.hooks:
+        meta["hooks"] = job_runner.hook_paths
+    return meta
+
+
+# Validated node functions in a process pool worker
+_validated_methods: Dict[Callable, Callable] = {}
+
+
+def call_in_process(
+    method: Callable, input_args: dict, validate_args: bool, shared_memory=False
+) -> Any:
+    """Call a node function in a process pool worker
+
+    The node functions are sent to the worker instead of the validated wrappers
+    since the wrappers cannot be pickled. The wrappers are cached in the worker
+    so that they are built only once per node function.
+
+    If shared_memory is True, the shared arrays in the arguments are mapped
+    and the large arrays of the result are moved into shared memory.
+    """
+    if validate_args:
+        if method not in _validated_methods:
+            _validated_methods[method] = validate_call(
+                config=ConfigDict(arbitrary_types_allowed=True)
+            )(method)
+        method = _validated_methods[method]
+    if not shared_memory:
+        return method(**input_args)
+    blocks = []
+    try:
+        result = method(**sharedmem.attach_args(input_args, blocks))
+        return sharedmem.share_result(result)
+    finally:
+        result = None
+        sharedmem.close_blocks(blocks)
+
+
 def run_in_same_worker(flume_config, out_dict):
     """Run the whole flow in the same worker"""
     runner = JobRunner(flume_config=flume_config)
@@ -83,6 +164,65 @@ def run_in_same_worker(flume_config, out_dict):
     return result
 
 
+def override_inputs(node: OutNode, values: Dict[str, Any]) -> OutNode:
+    """Copy of a node with the values of some of its inputs replaced
+
+    The value replaces the only control of an input. Inputs with several
+    controls take a dict of control names and values.
+    """
+    input_data = dict(node.inputData)
+    for key, value in values.items():
+        controls = input_data.get(key) or {}
+        if len(controls) > 1 and isinstance(value, dict):
+            input_data[key] = {**controls, **value}
+        else:
+            input_data[key] = {next(iter(controls), key): value}
+    return node.model_copy(update={"inputData": input_data})
+
+
+class JobSpec(NamedTuple):
+    """Everything required to submit the job of a node"""
+
+    method: Callable
+    job_queue: Any
+    input_args: dict
+    node: OutNode
+    dependents: list
+    job_kwargs: dict
+
+
+class NodeEvent(NamedTuple):
+    """Event yielded by JobRunner.astream and JobRunner.run_stream"""
+
+    node_id: str
+    status: str
+    result: Any
+
+
+# The keyword arguments of the rq enqueue functions which can be set in the
+# settings of a node submitted in batch, and the arguments of
+# Queue.prepare_data they correspond to. Flows with nodes having other settings
+# are submitted one node at a time.
+BATCH_JOB_KWARGS = {
+    "job_timeout": "timeout",
+    "result_ttl": "result_ttl",
+    "ttl": "ttl",
+    "failure_ttl": "failure_ttl",
+    "description": "description",
+    "job_id": "job_id",
+    "at_front": "at_front",
+    "retry": "retry",
+    "on_success": "on_success",
+    "on_failure": "on_failure",
+}
+
+EXECUTORS = {
+    "inline": None,
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
 class JobRunner:
     """Class which runs the flow
 
@@ -116,6 +256,56 @@ class JobRunner:
         job is enqueued by default.
     meta_data: Dict[Any, Any]
         Optional. Any extra meta data to supply to the job
+    executor: str
+        Where the synchronous node functions are run in the sync and async methods.
+        inline: Directly on the event loop, one node at a time.
+        thread: In a ThreadPoolExecutor, so that independent blocking nodes
+            run concurrently.
+        process: In a ProcessPoolExecutor, so that independent CPU bound nodes
+            run on different cores. The node functions, their arguments and
+            results should be picklable.
+        The executor of a single node can be overridden using `Node.executor`.
+    max_workers: int
+        Optional. Maximum number of workers of the thread or process pool.
+    validate_args: bool
+        Validate the arguments of the node functions using pydantic before calling
+        them. Can be overridden for a single node using `Node.validate_args`.
+    cache: ResultCache
+        Optional. A cache from `flowfunc.cache` in which the results of the nodes
+        are stored in the sync and async methods. Nodes whose inputs have not
+        changed since they were cached are not run again. Set `Node.cache` to
+        False for nodes which should always run.
+    batch_submit: bool
+        Submit all the jobs of a distributed run in a single redis transaction.
+        Flows with nodes using a meta method from meta_map, or depending on jobs
+        submitted before, are always submitted one node at a time.
+    port_storage: PortStorage
+        Optional. A `flowfunc.distributed.PortStorage` in which the jobs of a
+        distributed run store every output port separately, so that the jobs
+        connected to them only load the ports they use.
+    artifact_store: ArtifactStore
+        Optional. A store from `flowfunc.artifacts`, for example a
+        `FileArtifactStore` on a filesystem shared by the workers, in which the
+        jobs of a distributed run keep their results larger than the threshold
+        of the store. Only a reference to them is stored in redis.
+    shared_memory: bool
+        Hand over the large NumPy arrays between the nodes running in the
+        process pool through shared memory instead of pickling them. Requires
+        numpy. The blocks are freed once all the nodes connected to the node
+        which produced them have completed. Only the selected nodes, or the
+        nodes without dependent nodes, keep their arrays in their result.
+    hooks: List[NodeHook]
+        Optional. Hooks from `flowfunc.metrics` notified when every node is
+        queued, started and finished, with the metrics of the node. Instances,
+        classes or dotted paths. In a distributed run the workers import them
+        from their dotted paths, see `flowfunc.metrics.hook_path`.
+    strict: bool
+        Validate the nodes from the UI in strict mode, without coercing their
+        values to the types of the fields.
+    reuse_nodes: bool
+        Reuse the validated nodes which are unchanged since the previous flow,
+        so that only the nodes changed in the editor are validated again. If
+        False every node is validated on every run.
     """
 
     def __init__(
@@ -128,6 +318,21 @@ class JobRunner:
         default_queue: Optional[Any] = None,
         meta_map: Optional[Dict[Callable, Callable]] = None,
         meta_data: Optional[Dict[str, Any]] = None,
+        executor: str = "inline",
+        max_workers: Optional[int] = None,
+        validate_args: bool = True,
+        cache: Optional[ResultCache] = None,
+        incremental: bool = False,
+        stream_buffer: int = 16,
+        batch_submit: bool = True,
+        # port_storage should be a PortStorage instance, for the same reason
+        # as default_queue
+        port_storage: Optional[Any] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+        shared_memory: bool = False,
+        hooks: Optional[List[NodeHook | type | str]] = None,
+        strict: bool = False,
+        reuse_nodes: bool = True,
     ):
         self.flume_config = flume_config
         self.method = method
@@ -139,11 +344,71 @@ class JobRunner:
                 "If the method is distributed, the `default_queue` argument cannot be empty."
             )
         self.same_worker = same_worker
+        if executor not in EXECUTORS:
+            raise ValueError(
+                f"The provided executor {executor} is not identified."
+                f" It should be one of {', '.join(EXECUTORS)}"
+            )
+        self.executor = executor
+        self.max_workers = max_workers
+        self.validate_args = validate_args
+        self.cache = cache
+        self.incremental = incremental
+        self.stream_buffer = stream_buffer
+        self.batch_submit = batch_submit
+        self.port_storage = port_storage
+        self.artifact_store = artifact_store
+        if shared_memory and sharedmem.np is None:
+            raise ImportError("numpy is required to share arrays between processes.")
+        self.shared_memory = shared_memory
+        hooks = list(hooks) if hooks else []
+        self.hooks = [resolve_hook(hook) for hook in hooks]
+        # Sent to the workers in place of the hooks, which may not be picklable
+        self.hook_paths = (
+            [hook_path(hook) for hook in hooks] if "distributed" in method else []
+        )
+        self.parser = NodeParser(strict=strict, reuse=reuse_nodes)
+        # Nodes and their states from the previous runs, for incremental runs
+        self._previous: Dict[str, Tuple[OutNode, NodeState]] = {}
+        self._executors: Dict[str, Executor] = {}
+
+    def get_executor(self, executor: Optional[str] = None) -> Optional[Executor]:
+        """Get the pool in which synchronous node functions should run
+
+        Parameters
+        ----------
+        executor: str
+            One of inline, thread or process. Defaults to the executor of the
+            JobRunner.
+
+        Returns
+        -------
+        executor: Executor
+            The thread or process pool. None if the node should run inline.
+        """
+        executor = executor or self.executor
+        if executor == "inline":
+            return None
+        if executor not in self._executors:
+            if executor not in EXECUTORS:
+                raise ValueError(
+                    f"The provided executor {executor} is not identified."
+                    f" It should be one of {', '.join(EXECUTORS)}"
+                )
+            self._executors[executor] = EXECUTORS[executor](
+                max_workers=self.max_workers
+            )
+        return self._executors[executor]
+
+    def shutdown(self, wait: bool = True):
+        """Shutdown the thread and process pools created by this JobRunner"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+        self._executors = {}
 
-    @validate_call
     def run(
         self,
-        out_dict: Dict[str, OutNode],
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
         selected_node_ids: Optional[List[str]] = None,
     ):
         """Run the node map
@@ -151,7 +416,7 @@ class JobRunner:
         Parameters
         ----------
         out_dict: dict
-            The output from the UI
+            The output from the UI, or a CompiledFlow from `compile`
         selected_nodes: List[str]
             The selected node IDs which should be run. The dependent nodes will
             automatically be identified from the out_dict and add to the list
@@ -167,153 +432,865 @@ class JobRunner:
         """
         if not out_dict:
             return
-        mapped_dict = deepcopy(out_dict)
-        if selected_node_ids:
-            logger.info(
-                f"Running {len(selected_node_ids)} node(s) out of {len(mapped_dict)}"
-                f" in {self.method} mode."
-            )
-            dependent_node_ids = self.dependent_nodes(selected_node_ids, mapped_dict)
-            logger.info(
-                f"Found {len(dependent_node_ids)} nodes dependent on selected nodes."
-            )
-            mapped_dict = {nodeid: mapped_dict[nodeid] for nodeid in dependent_node_ids}
-        else:
-            logger.info(f"Running {len(mapped_dict)} nodes in {self.method} mode.")
+        out_dict = self.parse_nodes(out_dict)
+        flow = self.select_flow(out_dict, selected_node_ids)
+        if isinstance(out_dict, CompiledFlow):
+            out_dict = out_dict.nodes
         if self.method == "sync":
-            return asyncio.run(self.run_async(mapped_dict))
+            return asyncio.run(self.run_async(flow))
         elif self.method == "async":
-            return self.run_async(mapped_dict)
+            return self.run_async(flow)
         elif self.method == "distributed" and self.same_worker:
             return asyncio.run(self.run_distributed_same_worker(out_dict))
         elif self.method == "async_distributed" and self.same_worker:
             return self.run_distributed_same_worker(out_dict)
         elif self.method == "distributed":
-            return asyncio.run(self.run_distributed(mapped_dict))
+            return asyncio.run(self.run_distributed(flow.nodes))
         elif self.method == "async_distributed":
-            return self.run_distributed(mapped_dict)
+            return self.run_distributed(flow.nodes)
         else:
             raise ValueError(
                 "The provided method is not identified."
                 " It should be one of sync, async or distributed"
             )
 
+    def run_compact(
+        self,
+        data: Union[dict, bytes],
+        selected_node_ids: Optional[List[str]] = None,
+    ):
+        """Run a flow encoded with `flowfunc.encoding.encode_nodes`
+
+        The nodes are decoded into the dicts of the node editor and parsed as
+        in `run`, so that the nodes which did not change since the previous
+        flow are not validated again.
+        """
+        return self.run(decode_node_dicts(data), selected_node_ids)
+
+    def run_many(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        overrides: List[Dict[str, Dict[str, Any]]],
+        max_concurrency: int = 4,
+    ):
+        """Run the flow once for every set of overridden inputs
+
+        The flow is validated and analysed once. The nodes which do not depend
+        on any of the overridden inputs run only once and their results are
+        shared by all the runs.
+
+        Parameters
+        ----------
+        out_dict: dict
+            The output from the UI, or a CompiledFlow from `compile`
+        overrides: List[dict]
+            One dict per run, which maps node IDs to the values of their inputs
+            for this run, for example `{"node_1": {"a": 2}}`.
+        max_concurrency: int
+            Maximum number of runs in progress at the same time
+
+        Returns
+        -------
+        results: List[dict]
+            The mapped_dict of every run, in the order of overrides. An
+            awaitable if the method is 'async'.
+        """
+        out_dict = self.parse_nodes(out_dict)
+        if self.method == "sync":
+            return asyncio.run(
+                self.run_many_async(out_dict, overrides, max_concurrency)
+            )
+        elif self.method == "async":
+            return self.run_many_async(out_dict, overrides, max_concurrency)
+        raise ValueError("run_many supports only the sync and async methods.")
+
+    async def run_many_async(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        overrides: List[Dict[str, Dict[str, Any]]],
+        max_concurrency: int = 4,
+    ) -> List[Dict[str, OutNode]]:
+        """Run the flow for every set of overridden inputs asynchronously"""
+        flow = self.as_flow(out_dict)
+        overridden = self.overridden_nodes(flow, overrides)
+        shared_ids = [nodeid for nodeid in flow.nodes if nodeid not in overridden]
+        shared_states = {}
+        if shared_ids:
+            # The nodes which are not overridden do not depend on the overridden
+            # ones. Hence the selection has no other nodes.
+            shared = flow.select(shared_ids)
+            shared_states = self.initial_states(shared.nodes)
+            async for _ in self.iter_events(shared, shared_states, incremental=False):
+                pass
+        logger.info(
+            f"Running {len(overrides)} set(s) of inputs. {len(shared_ids)} node(s)"
+            " are shared by all the runs."
+        )
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_one(values: Dict[str, Dict[str, Any]]) -> Dict[str, OutNode]:
+            async with semaphore:
+                run_flow = flow.with_nodes(
+                    {
+                        nodeid: override_inputs(flow.nodes[nodeid], inputs)
+                        for nodeid, inputs in values.items()
+                    }
+                )
+                states = {
+                    nodeid: replace(state, reused=True)
+                    for nodeid, state in shared_states.items()
+                }
+                for nodeid in overridden:
+                    states[nodeid] = NodeState.from_node(run_flow.nodes[nodeid])
+                async for _ in self.iter_events(run_flow, states, incremental=False):
+                    pass
+                return self.merge_states(run_flow.nodes, states)
+
+        return list(await asyncio.gather(*(run_one(values) for values in overrides)))
+
+    def run_batch(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        rows: List[Dict[str, Dict[str, Any]]],
+    ):
+        """Run the flow once for a batch of inputs
+
+        Every node depending on the inputs of the batch is called once with
+        NumPy arrays of the values of all the rows in place of the scalars, if
+        all its inputs are vectorizable. Mark a port vectorizable with Annotated
+        metadata, `Annotated[float, {"vectorizable": True}]`. The other nodes
+        are called once for every row. The nodes which do not depend on the
+        inputs of the batch are called once, as usual. Requires numpy.
+
+        Parameters
+        ----------
+        out_dict: dict
+            The output from the UI, or a CompiledFlow from `compile`
+        rows: List[dict]
+            One dict per set of inputs, which maps node IDs to the values of
+            their inputs, for example `{"node_1": {"a": 2}}`.
+
+        Returns
+        -------
+        mapped_dict: dict
+            The nodes with their results. The result of a node depending on the
+            inputs of the batch has one item per row: a NumPy array, a list if
+            the items cannot be stacked, or a tuple of them for nodes with
+            several outputs. An awaitable if the method is 'async'.
+        """
+        out_dict = self.parse_nodes(out_dict)
+        if self.method == "sync":
+            return asyncio.run(self.run_batch_async(out_dict, rows))
+        elif self.method == "async":
+            return self.run_batch_async(out_dict, rows)
+        raise ValueError("run_batch supports only the sync and async methods.")
+
+    async def run_batch_async(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        rows: List[Dict[str, Dict[str, Any]]],
+    ) -> Dict[str, OutNode]:
+        """Run the flow for a batch of inputs asynchronously"""
+        flow = self.as_flow(out_dict).with_batch(rows)
+        logger.info(
+            f"Running a batch of {len(rows)} set(s) of inputs."
+            f" {len(flow.columns)} node(s) depend on them."
+        )
+        states = self.initial_states(flow.nodes)
+        async for _ in self.iter_events(flow, states, incremental=False):
+            pass
+        return self.merge_states(flow.nodes, states)
+
+    def overridden_nodes(
+        self, flow: CompiledFlow, overrides: List[Dict[str, Dict[str, Any]]]
+    ) -> Set[str]:
+        """IDs of the nodes which have to run for every set of inputs: the
+        overridden nodes and all the nodes depending on them
+        """
+        changed = {nodeid for values in overrides for nodeid in values}
+        unknown = changed - flow.nodes.keys()
+        if unknown:
+            raise ValueError(
+                f"The overridden nodes {sorted(unknown)} are not in the flow."
+            )
+        overridden = flow.graph.downstream_closure(changed)
+        while True:
+            # A stream can only be read once. Generator nodes connected to a
+            # node which runs for every set of inputs have to run every time too.
+            streams = [
+                nodeid
+                for nodeid in flow.nodes
+                if nodeid not in overridden
+                and is_generator_function(flow.config_nodes[nodeid].method)
+                and any(child in overridden for child in flow.graph.downstream[nodeid])
+            ]
+            if not streams:
+                return overridden
+            overridden |= flow.graph.downstream_closure(streams)
+
+    def compile(self, out_dict: Dict[str, OutNode | Dict[str, Any]]) -> CompiledFlow:
+        """Compile a flow once for repeated runs
+
+        The nodes are validated, resolved to their node functions and sorted
+        topologically. Pass the CompiledFlow to `run` instead of the dict to
+        skip this work on every run.
+        """
+        return CompiledFlow.from_nodes(self.parse_nodes(out_dict), self.flume_config)
+
+    def parse_nodes(
+        self, out_dict: Union[CompiledFlow, Dict[str, OutNode | Dict[str, Any]]]
+    ) -> Union[CompiledFlow, Dict[str, OutNode]]:
+        """Validate the output of the UI, see `flowfunc.parsing.NodeParser`
+
+        Only the nodes which changed since the previous flow are validated,
+        unless reuse_nodes is False. CompiledFlows are returned as they are.
+        """
+        if isinstance(out_dict, CompiledFlow):
+            return out_dict
+        return self.parser.parse(out_dict)
+
+    def as_flow(
+        self, out_dict: Union[CompiledFlow, Dict[str, OutNode]]
+    ) -> CompiledFlow:
+        """Compile the flow unless it is compiled already"""
+        if isinstance(out_dict, CompiledFlow):
+            return out_dict
+        return self.compile(out_dict)
+
+    def select_flow(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        selected_node_ids: Optional[List[str]] = None,
+    ) -> CompiledFlow:
+        """Compile the nodes to be run, along with the nodes they depend on
+
+        out_dict is parsed with `parse_nodes` already.
+        """
+        if not isinstance(out_dict, CompiledFlow):
+            nodes = self.select_nodes(out_dict, selected_node_ids)
+            flow = CompiledFlow.from_nodes(nodes, self.flume_config)
+            if selected_node_ids:
+                flow.selected = set(selected_node_ids) & nodes.keys()
+            return flow
+        flow = out_dict.select(selected_node_ids)
+        logger.info(
+            f"Running {len(flow)} node(s) out of {len(out_dict)} in {self.method} mode."
+        )
+        return flow
+
+    def select_nodes(
+        self,
+        out_dict: Dict[str, OutNode],
+        selected_node_ids: Optional[List[str]] = None,
+    ) -> Dict[str, OutNode]:
+        """Select the nodes to be run, along with the nodes they depend on"""
+        # The nodes are not modified during the run. Hence they need not be copied.
+        mapped_dict = out_dict
+        if selected_node_ids:
+            logger.info(
+                f"Running {len(selected_node_ids)} node(s) out of {len(mapped_dict)}"
+                f" in {self.method} mode."
+            )
+            dependent_node_ids = self.dependent_nodes(selected_node_ids, mapped_dict)
+            logger.info(
+                f"Found {len(dependent_node_ids)} nodes dependent on selected nodes."
+            )
+            mapped_dict = {nodeid: mapped_dict[nodeid] for nodeid in dependent_node_ids}
+        else:
+            logger.info(f"Running {len(mapped_dict)} nodes in {self.method} mode.")
+        return mapped_dict
+
+    async def astream(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        selected_node_ids: Optional[List[str]] = None,
+    ) -> AsyncIterator[NodeEvent]:
+        """Run the flow and yield an event whenever a node starts or completes
+
+        Parameters
+        ----------
+        out_dict: dict
+            The output from the UI
+        selected_node_ids: List[str]
+            The selected node IDs which should be run, as in `run`.
+
+        Yields
+        ------
+        event: NodeEvent
+            Tuple of the node ID, the status of the node and its result. The
+            result is None when the node starts and the exception when the node
+            fails.
+        """
+        if not out_dict:
+            return
+        flow = self.select_flow(self.parse_nodes(out_dict), selected_node_ids)
+        states = self.initial_states(flow.nodes)
+        events = self.iter_events(flow, states)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            # Closed here rather than when it is garbage collected, so that the
+            # nodes still running are cancelled while the event loop runs
+            await events.aclose()
+
+    def run_stream(
+        self,
+        out_dict: Union[CompiledFlow, Dict[str, OutNode]],
+        selected_node_ids: Optional[List[str]] = None,
+    ) -> Iterator[NodeEvent]:
+        """Blocking version of `astream`
+
+        The flow runs in a new event loop which advances only while the next
+        event is requested.
+        """
+        loop = asyncio.new_event_loop()
+        stream = self.astream(out_dict, selected_node_ids)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(stream.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(stream.aclose())
+            loop.close()
+
     def dependent_nodes(self, selected_node_ids, mapped_dict):
-        """Function to downselect only some nodes from the mapped_dict"""
-        new_node_ids = []
-        for nodeid, node in mapped_dict.items():
-            if nodeid in selected_node_ids:
-                new_node_ids.append(nodeid)
-                if not node.connections.inputs:
-                    continue
-                for param, mapping in node.connections.inputs.items():
-                    for connection in mapping:
-                        new_node_ids.append(connection.nodeId)
-        new_node_ids = list(set(new_node_ids))  # List of unique
-        if len(new_node_ids) > len(selected_node_ids):
-            return self.dependent_nodes(new_node_ids, mapped_dict)
-        return new_node_ids
-
-    async def run_async(self, mapped_dict) -> Dict[str, OutNode]:
+        """Function to downselect only some nodes from the mapped_dict
+
+        Returns the IDs of the selected nodes and all the nodes they depend on,
+        in the order of mapped_dict.
+        """
+        closure = FlowGraph.from_nodes(mapped_dict).upstream_closure(selected_node_ids)
+        return [nodeid for nodeid in mapped_dict if nodeid in closure]
+
+    async def run_async(
+        self, mapped_dict: Union[CompiledFlow, Dict[str, OutNode]]
+    ) -> Dict[str, OutNode]:
         """Run the flow asynchronously"""
-        nodes_evaluted = []
-        for nodeid, node in mapped_dict.items():
-            # Storing the lock in the node itself so that dependent nodes
-            # dont start a new job.
-            node.run_event = asyncio.Event()
-            nodes_evaluted.append(self.evaluate_node_async(nodeid, mapped_dict))
-        await asyncio.gather(*nodes_evaluted)
-        return mapped_dict
+        flow = self.as_flow(mapped_dict)
+        states = self.initial_states(flow.nodes)
+        async for _ in self.iter_events(flow, states):
+            pass
+        return self.merge_states(flow.nodes, states)
+
+    async def iter_events(
+        self,
+        flow: CompiledFlow,
+        states: Dict[str, NodeState],
+        incremental: Optional[bool] = None,
+    ) -> AsyncIterator[NodeEvent]:
+        """Run the flow and yield the events of the nodes
+
+        The nodes are dispatched from a ready queue (Kahn's algorithm). A node
+        is only scheduled once all the nodes it depends on have completed, so
+        there are never more coroutines alive than nodes that can actually run.
+
+        incremental overrides the incremental attribute of the JobRunner for
+        this run.
+        """
+        graph = flow.graph
+        if incremental is None:
+            incremental = self.incremental
+        # Computing the levels up front also makes sure that the flow is acyclic
+        parallelism = graph.parallelism()
+        logger.info(
+            f"Flow has {len(parallelism)} level(s) with parallelism {parallelism}."
+        )
+        if incremental:
+            self.reuse_previous_states(flow.nodes, states, graph)
+        in_degrees = graph.in_degrees()
+        ready = deque(nodeid for nodeid, degree in in_degrees.items() if degree == 0)
+        running = {}
+        # Tasks running the generators of the streaming nodes
+        producers = {}
+        # Number of consumers yet to complete, for the nodes with shared arrays
+        shared_consumers: Dict[str, int] = {}
+        try:
+            while ready or running or producers:
+                while ready:
+                    nodeid = ready.popleft()
+                    self.node_queued(nodeid, flow, states[nodeid])
+                    task = asyncio.create_task(
+                        self.evaluate_node_async(nodeid, flow, states)
+                    )
+                    running[task] = nodeid
+                    yield NodeEvent(nodeid, "started", None)
+                done, _ = await asyncio.wait(
+                    [*running, *producers], return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task in producers:
+                        nodeid = producers.pop(task)
+                        state = states[nodeid]
+                        try:
+                            task.result()
+                        except Exception as e:
+                            logger.error(f"Execution of Node {nodeid} has failed.")
+                            state.error = e
+                            state.status = "failed"
+                        else:
+                            state.status = "finished"
+                        self.node_finished(nodeid, flow, state)
+                        yield NodeEvent(
+                            nodeid,
+                            state.status,
+                            state.error if state.error else state.result,
+                        )
+                        continue
+                    nodeid = running.pop(task)
+                    task.result()
+                    if self.shared_memory:
+                        self.count_shared_consumers(
+                            nodeid, flow, states, shared_consumers
+                        )
+                    # The consumers of a streaming node start while it produces
+                    for child in graph.downstream[nodeid]:
+                        in_degrees[child] -= 1
+                        if in_degrees[child] == 0:
+                            ready.append(child)
+                    state = states[nodeid]
+                    if state.status == "streaming":
+                        producer = asyncio.create_task(state.result.produce())
+                        producers[producer] = nodeid
+                        yield NodeEvent(nodeid, "streaming", state.result)
+                        continue
+                    self.node_finished(nodeid, flow, state)
+                    yield NodeEvent(
+                        nodeid,
+                        state.status,
+                        state.error if state.error else state.result,
+                    )
+        finally:
+            # The consumer of the events may stop before the flow is complete
+            for task in [*running, *producers]:
+                task.cancel()
+            # Letting the cancelled tasks clean up, for example the threads of
+            # the streams close their generators, before the event loop stops
+            await asyncio.gather(*running, *producers, return_exceptions=True)
+            for nodeid in shared_consumers:
+                self.release_shared(nodeid, flow, states)
+        if incremental:
+            self._previous.update(
+                {nodeid: (node, states[nodeid]) for nodeid, node in flow.nodes.items()}
+            )
 
-    async def evaluate_node_async(self, nodeid: str, mapped_dict: dict):
-        """Evaluate the node and return the result"""
-        out_node = mapped_dict[nodeid]
-        out_node.status = "started"
-        if hasattr(out_node, "result") and out_node.result:
+    def node_queued(self, nodeid: str, flow: CompiledFlow, state: NodeState):
+        """Start the metrics of a node which is ready to run"""
+        if state.reused:
             return
-        config_node = self.flume_config.get_node(out_node.type)
-        # method = validate_arguments(config_node.method)
-        method = config_node.method
-        logger.info(f"Evaluating node with id {nodeid} and function {method}")
-        out_node.result = None
-        out_node.result_mapped = {}
-        input_args = {}
-        for key, values in out_node.inputData.items():
-            if not values:
+        state.metrics = NodeMetrics(queued_at=time.time())
+        call_hooks(
+            self.hooks, "node_queued", nodeid, flow.nodes[nodeid].type, state.metrics
+        )
+
+    def node_finished(self, nodeid: str, flow: CompiledFlow, state: NodeState):
+        """Complete the metrics of a node which has finished or failed"""
+        if state.reused or state.metrics is None:
+            return
+        streamed = isinstance(state.result, NodeStream)
+        finish(state.metrics, None if streamed else state.result)
+        call_hooks(
+            self.hooks,
+            "node_finished",
+            nodeid,
+            flow.nodes[nodeid].type,
+            state.metrics,
+            state.error,
+        )
+
+    def count_shared_consumers(
+        self,
+        nodeid: str,
+        flow: CompiledFlow,
+        states: Dict[str, NodeState],
+        shared_consumers: Dict[str, int],
+    ):
+        """Release the shared arrays of the nodes whose last consumer is the
+        node which has just completed, and start counting the consumers of its
+        own shared arrays
+        """
+        for upstream_id in set(flow.graph.upstream[nodeid]):
+            if upstream_id not in shared_consumers:
                 continue
-            # If there are more than one control in this port return the dict
-            if len(values) > 1:
-                variable_value = values
+            shared_consumers[upstream_id] -= 1
+            if not shared_consumers[upstream_id]:
+                del shared_consumers[upstream_id]
+                self.release_shared(upstream_id, flow, states)
+        if sharedmem.handles(states[nodeid].result):
+            consumers = len(set(flow.graph.downstream[nodeid]))
+            if consumers:
+                shared_consumers[nodeid] = consumers
             else:
-                # else return the value of the first item in the dict
-                # TODO: when flume implements option to have multiple inputs
-                # address it here.
-                variable_value = next(iter(values.values()))
-            if variable_value is None:
-                continue  # This is null coming from react for unset controls
-            input_args[key] = variable_value
-        for key, connections in out_node.connections.inputs.items():
-            # Now only one connection is supported by flume.
-            # Hence using the first one
-            dependent_nodeid = connections[0].nodeId
-            dependent_node = mapped_dict[dependent_nodeid]
-            out_node.status = "deferred"
-            logger.info(f"Node {nodeid} waiting for Node {dependent_nodeid} to finish.")
-            await dependent_node.run_event.wait()
-            if hasattr(dependent_node, "error") and dependent_node.error:
-                out_node.error = ErrorInDependentNode(
-                    f"Error in node {dependent_node.id}"
-                )
-                out_node.status = "failed"
-                out_node.run_event.set()
+                self.release_shared(nodeid, flow, states)
+
+    def release_shared(
+        self, nodeid: str, flow: CompiledFlow, states: Dict[str, NodeState]
+    ):
+        """Free the shared arrays of a node
+
+        The arrays are only copied into the result of the node if the result is
+        wanted by the caller, see `CompiledFlow.is_output`. The result of the
+        other nodes, which was only needed by the nodes connected to them, is
+        dropped. It is not cached either.
+        """
+        state = states[nodeid]
+        shared = sharedmem.handles(state.result)
+        if flow.is_output(nodeid):
+            state.result = sharedmem.materialize(state.result)
+            result = state.result
+            if not isinstance(result, tuple):
+                result = (result,)
+            state.result_mapped = dict(zip(flow.output_names[nodeid], result))
+            if state.digest is not None:
+                self.cache.set(flow.nodes[nodeid].type, state.digest, state.result)
+        else:
+            logger.debug(f"Dropping the shared result of node {nodeid}.")
+            state.result = None
+            state.result_mapped = None
+        for handle in shared:
+            handle.unlink()
+
+    def initial_states(self, mapped_dict: Dict[str, OutNode]) -> Dict[str, NodeState]:
+        """Create the runtime state of every node in the flow"""
+        return {
+            nodeid: NodeState.from_node(node) for nodeid, node in mapped_dict.items()
+        }
+
+    def reuse_previous_states(
+        self,
+        mapped_dict: Dict[str, OutNode],
+        states: Dict[str, NodeState],
+        graph: FlowGraph,
+    ):
+        """Take over the states of the nodes which are unchanged since the
+        previous run and are not downstream of a changed node
+        """
+        changed = []
+        for nodeid, node in mapped_dict.items():
+            previous = self._previous.get(nodeid)
+            if (
+                previous is None
+                or previous[1].status != "finished"
+                # A stream can only be read once
+                or isinstance(previous[1].result, NodeStream)
+                # The shared arrays of the node were freed after it ran
+                or previous[1].result_mapped is None
+                or previous[0].type != node.type
+                or previous[0].inputData != node.inputData
+                or previous[0].connections.inputs != node.connections.inputs
+            ):
+                changed.append(nodeid)
+        dirty = graph.downstream_closure(changed)
+        for nodeid in mapped_dict:
+            if nodeid not in dirty:
+                states[nodeid] = replace(self._previous[nodeid][1], reused=True)
+        logger.info(
+            f"Reusing the results of {len(mapped_dict) - len(dirty)} unchanged node(s)."
+        )
+
+    def reset(self):
+        """Forget the previous runs so that all the nodes run again"""
+        self._previous = {}
+        self.parser.clear()
+
+    def merge_states(
+        self, mapped_dict: Dict[str, OutNode], states: Dict[str, NodeState]
+    ) -> Dict[str, OutNode]:
+        """Copy the nodes (shallow) with their runtime state merged in"""
+        return {
+            nodeid: states[nodeid].merge(node) for nodeid, node in mapped_dict.items()
+        }
+
+    async def evaluate_node_async(
+        self, nodeid: str, flow: CompiledFlow, states: Dict[str, NodeState]
+    ):
+        """Evaluate the node and store the result in its state
+
+        All the nodes this node depends on should have completed (or started
+        streaming) before this coroutine is awaited.
+        """
+        try:
+            await self.evaluate_node(nodeid, flow, states)
+        finally:
+            # Streaming nodes keep reading their inputs until they are exhausted
+            if states[nodeid].status != "streaming":
+                self.release_input_streams(nodeid, flow, states)
+
+    def release_input_streams(
+        self, nodeid: str, flow: CompiledFlow, states: Dict[str, NodeState]
+    ):
+        """Stop the streams connected to a node from waiting for it"""
+        for _, dependent_nodeid, port_name in flow.bindings[nodeid]:
+            result_mapped = states[dependent_nodeid].result_mapped or {}
+            stream = result_mapped.get(port_name)
+            if isinstance(stream, NodeStream):
+                stream.release(nodeid)
+
+    async def evaluate_node(
+        self, nodeid: str, flow: CompiledFlow, states: Dict[str, NodeState]
+    ):
+        """Evaluate the node. Use evaluate_node_async instead of this method."""
+        out_node = flow.nodes[nodeid]
+        state = states[nodeid]
+        if state.reused:
+            return
+        state.status = "started"
+        if state.result:
+            return
+        config_node = flow.config_nodes[nodeid]
+        logger.info(
+            f"Evaluating node with id {nodeid} and function {config_node.method}"
+        )
+        if state.metrics is not None:
+            state.metrics.started_at = time.time()
+            call_hooks(self.hooks, "node_started", nodeid, out_node.type, state.metrics)
+        state.result = None
+        state.result_mapped = {}
+        # The values of the controls and the digests of the connected nodes
+        # make up the digest of this node
+        control_args = flow.controls[nodeid]
+        input_args = dict(control_args)
+        upstream_digests = []
+        for key, dependent_nodeid, port_name in flow.bindings[nodeid]:
+            dependent_state = states[dependent_nodeid]
+            if dependent_state.error:
+                state.error = ErrorInDependentNode(f"Error in node {dependent_nodeid}")
+                state.status = "failed"
                 return
-            input_args[key] = dependent_node.result_mapped[connections[0].portName]
-        if inspect.iscoroutinefunction(method):
+            upstream_digests.append((key, dependent_state.digest, port_name))
+            value = dependent_state.result_mapped[port_name]
+            if isinstance(value, NodeStream):
+                value = value.reader(nodeid, key, port_name)
+            input_args[key] = value
+        if is_generator_function(config_node.method):
             try:
-                method_output = await validate_call(
-                    config=ConfigDict(arbitrary_types_allowed=True)
-                )(method)(**input_args)
+                self.open_stream(nodeid, flow, input_args, state)
             except Exception as e:
-                out_node.error = e
-                out_node.status = "failed"
-        else:
+                logger.error(f"Execution of Node {nodeid} has failed.")
+                state.error = e
+                state.status = "failed"
+            return
+        if (
+            self.cache is not None
+            and config_node.cache
+            and all(digest for _, digest, _ in upstream_digests)
+        ):
+            state.digest = input_digest(
+                out_node.type,
+                control_args,
+                upstream_digests,
+                config_node.version or code_digest(config_node.method),
+            )
+        method_output = MISSING
+        if state.digest is not None:
+            method_output = self.cache.get(out_node.type, state.digest)
+        if method_output is MISSING:
             try:
-                method_output = validate_call(
-                    config=ConfigDict(arbitrary_types_allowed=True)
-                )(method)(**input_args)
+                if nodeid not in flow.columns:
+                    method_output = await self.call_node_method(
+                        config_node, input_args, metrics=state.metrics
+                    )
+                elif config_node.vectorizable:
+                    # The arguments are arrays, which the annotations of the
+                    # ports do not allow
+                    method_output = await self.call_node_method(
+                        config_node,
+                        input_args,
+                        validate_args=False,
+                        metrics=state.metrics,
+                    )
+                else:
+                    method_output = await self.call_node_per_item(
+                        config_node,
+                        input_args,
+                        flow.columns[nodeid],
+                        flow.batch_size,
+                        metrics=state.metrics,
+                    )
             except Exception as e:
                 logger.error(f"Execution of Node {nodeid} has failed.")
-                out_node.error = e
-                out_node.status = "failed"
-        out_node.run_event.set()
-
-        if hasattr(out_node, "error") and out_node.error:
-            return
-        out_node.result = method_output
+                state.error = e
+                state.status = "failed"
+                return
+            # Shared results are cached once they are copied out of shared memory
+            if state.digest is not None and not sharedmem.handles(method_output):
+                self.cache.set(out_node.type, state.digest, method_output)
+        else:
+            logger.info(f"Result of node {nodeid} found in the cache.")
+        state.result = method_output
 
         # Converting the method output to a tuple so that it can be mapped
         # to the outputs dict
         if not isinstance(method_output, tuple):
             method_output = (method_output,)
-        output_args = [
-            x.name for x in (self.flume_config.get_node(out_node.type).outputs or [])
+        output_args = flow.output_names[nodeid]
+        state.result_mapped = {x: y for x, y in zip(output_args, method_output)}
+        state.status = "finished"
+
+    def open_stream(
+        self,
+        nodeid: str,
+        flow: CompiledFlow,
+        input_args: dict,
+        state: NodeState,
+    ):
+        """Create the stream of a generator node
+
+        The generator is not advanced here. The stream is produced by the
+        scheduler once all the consumers of the node can be started.
+        """
+        out_node = flow.nodes[nodeid]
+        source = self.node_callable(flow.config_nodes[nodeid])(**input_args)
+        output_names = flow.output_names[nodeid]
+        stream = NodeStream(nodeid, source, output_names, maxsize=self.stream_buffer)
+        # Registering the consumers up front so that they do not miss any chunk.
+        # The consumers depending on another consumer of the stream cannot
+        # start before it has finished reading, so their chunks are buffered.
+        descendants = flow.graph.downstream_closure([nodeid]) - {nodeid}
+        for port_name, connections in out_node.connections.outputs.items():
+            for connection in connections:
+                consumer = connection.nodeId
+                if consumer in flow.nodes:
+                    ancestors = flow.graph.upstream_closure(
+                        flow.graph.upstream[consumer]
+                    )
+                    stream.add_reader(
+                        consumer,
+                        connection.portName,
+                        port_name,
+                        buffered=not ancestors.isdisjoint(descendants),
+                    )
+        stream.upstream_readers = [
+            x for x in input_args.values() if isinstance(x, StreamReader)
         ]
-        out_node.result_mapped = {x: y for x, y in zip(output_args, method_output)}
-        out_node.status = "finished"
+        state.result = stream
+        state.result_mapped = {x: stream for x in output_names}
+        state.status = "streaming"
+
+    def node_callable(
+        self, config_node: Node, validate_args: Optional[bool] = None
+    ) -> Callable:
+        """The node function, wrapped with validation if required"""
+        if validate_args is None:
+            validate_args = config_node.validate_args
+        if validate_args is None:
+            validate_args = self.validate_args
+        if validate_args:
+            return config_node.validated_method
+        return config_node.method
+
+    async def call_node_method(
+        self,
+        config_node: Node,
+        input_args: dict,
+        validate_args: Optional[bool] = None,
+        metrics: Optional[NodeMetrics] = None,
+    ) -> Any:
+        """Call the function of a node in the executor of the node
+
+        Coroutine functions are always awaited on the event loop. Synchronous
+        functions which read a stream run in their own thread since they block
+        while waiting for the chunks. The CPU time and peak RSS taken by
+        synchronous functions are added to metrics.
+        """
+        if validate_args is None:
+            validate_args = config_node.validate_args
+        if validate_args is None:
+            validate_args = self.validate_args
+        method = config_node.method
+        # The function which is actually called. Process pools get the bare node
+        # function since the validated wrapper cannot be pickled.
+        call_method = self.node_callable(config_node, validate_args)
+        executor = self.get_executor(config_node.executor)
+        if self.shared_memory and (
+            inspect.iscoroutinefunction(method)
+            or not isinstance(executor, ProcessPoolExecutor)
+        ):
+            # Only the process pool workers map the shared arrays
+            input_args = {
+                key: sharedmem.materialize(value) for key, value in input_args.items()
+            }
+        if inspect.iscoroutinefunction(method):
+            return await call_method(**input_args)
+        loop = asyncio.get_running_loop()
+        if any(isinstance(x, StreamReader) for x in input_args.values()):
+            if isinstance(executor, ProcessPoolExecutor):
+                raise TypeError(
+                    "Nodes reading the stream of a generator node cannot run in a"
+                    " process pool."
+                )
+            result, measurement = await run_in_thread(
+                partial(measured_call, call_method, **input_args)
+            )
+        elif executor is None:
+            result, measurement = measured_call(call_method, **input_args)
+        elif isinstance(executor, ProcessPoolExecutor):
+            result, measurement = await loop.run_in_executor(
+                executor,
+                measured_call,
+                call_in_process,
+                method,
+                input_args,
+                validate_args,
+                self.shared_memory,
+            )
+        else:
+            result, measurement = await loop.run_in_executor(
+                executor, partial(measured_call, call_method, **input_args)
+            )
+        if metrics is not None:
+            measurement.add_to(metrics)
+        return result
+
+    async def call_node_per_item(
+        self,
+        config_node: Node,
+        input_args: dict,
+        columns: Set[str],
+        batch_size: int,
+        metrics: Optional[NodeMetrics] = None,
+    ) -> Any:
+        """Call the function of a node which is not vectorizable once for every
+        item of a batch. The results are stacked into columns.
+        """
+        outputs = await asyncio.gather(
+            *(
+                self.call_node_method(
+                    config_node,
+                    {
+                        key: value[index] if key in columns else value
+                        for key, value in input_args.items()
+                    },
+                    metrics=metrics,
+                )
+                for index in range(batch_size)
+            )
+        )
+        return batch.stack_outputs(outputs)
 
     async def run_distributed(
         self, mapped_dict: Dict[str, OutNode]
     ) -> Dict[str, OutNode]:
-        """Run the flow using python rq"""
-        nodes_evaluted = []
-        for nodeid, node in mapped_dict.items():
-            # Storing the lock in the node itself so that dependent nodes
-            # dont start a new job.
-            if not hasattr(node, "run_event") or not node.run_event:
-                node.run_event = asyncio.Event()
-            nodes_evaluted.append(self.submit_node_job(nodeid, mapped_dict))
-        await asyncio.gather(*nodes_evaluted)
-        return mapped_dict
+        """Run the flow using python rq
+
+        The nodes are submitted in topological order so that the jobs of the
+        nodes a node depends on are always submitted before it.
+        """
+        states = self.initial_states(mapped_dict)
+        levels = FlowGraph.from_nodes(mapped_dict).levels()
+        if self.can_submit_in_batch(mapped_dict, states):
+            self.submit_jobs_in_batch(mapped_dict, states, levels)
+        else:
+            for level in levels:
+                for nodeid in level:
+                    await self.submit_node_job(nodeid, mapped_dict, states)
+        if self.artifact_store is not None:
+            # Here rather than in the workers, which would add the time of the
+            # collection to the nodes
+            self.artifact_store.collect_if_due(self.queue.connection)
+        return self.merge_states(mapped_dict, states)
 
     async def run_distributed_same_worker(self, out_dict: dict) -> Dict[str, OutNode]:
         """Run the whole flow in the same worker using python-rq"""
@@ -334,15 +1311,47 @@ class JobRunner:
             },
         )
 
-    async def submit_node_job(self, nodeid: str, mapped_dict: dict):
-        """Enqueue the node in the queue"""
+    def can_submit_in_batch(
+        self, mapped_dict: Dict[str, OutNode], states: Dict[str, NodeState]
+    ) -> bool:
+        """Check if all the jobs of the flow can be submitted in a single redis
+        transaction
+
+        Nodes with a meta method from meta_map submit their own jobs, and the
+        status of the jobs which were submitted before this run is not known
+        without fetching them. Nodes with settings other than the ones in
+        BATCH_JOB_KWARGS, or queues without `prepare_data` and `enqueue_many`,
+        are not supported either. Such flows are submitted one node at a time.
+        """
+        if not self.batch_submit:
+            return False
+        for nodeid, node in mapped_dict.items():
+            if states[nodeid].job_id:
+                return False
+            if self.flume_config.get_node(node.type).method in self.meta_map:
+                return False
+            settings = node.settings if isinstance(node.settings, dict) else {}
+            if settings.keys() - {"queue"} - BATCH_JOB_KWARGS.keys():
+                return False
+            job_queue = settings.get("queue", self.queue)
+            if not getattr(job_queue, "_is_async", True):
+                return False
+            if not hasattr(job_queue, "prepare_data") or not hasattr(
+                job_queue, "enqueue_many"
+            ):
+                return False
+        return True
+
+    def prepare_job(
+        self, nodeid: str, mapped_dict: dict, states: Dict[str, NodeState]
+    ) -> JobSpec:
+        """Collect the arguments of the job of a node
+
+        The jobs of all the nodes this node depends on should have their IDs in
+        `states` already.
+        """
         node = mapped_dict[nodeid]
-        if hasattr(node, "job_id") and node.job_id:
-            try:
-                node.run_event.set()
-            except Exception:
-                pass
-            return
+        state = states[nodeid]
         method = self.flume_config.get_node(node.type).method
         input_args = {}
         for key, values in node.inputData.items():
@@ -354,18 +1363,19 @@ class JobRunner:
             if variable_value is None:
                 continue  # This is null coming from react
             input_args[key] = variable_value
+        # Only the connections are copied to record the job IDs since they are
+        # small compared to the rest of the node.
+        connections = node.connections.model_copy(deep=True)
         dependents = []
-        for key, connections in node.connections.inputs.items():
+        for key, conns in connections.inputs.items():
             # Now only one connection is supported by flume.
             # Hence using the first one
-            dependent_nodeid = connections[0].nodeId
-            dependent_node = mapped_dict[dependent_nodeid]
-            logger.info(
-                f"Node {nodeid} waiting for Node {dependent_nodeid} to be submitted."
+            dependent_nodeid = conns[0].nodeId
+            conns[0].job_id = states[dependent_nodeid].job_id
+            dependents.append(
+                states[dependent_nodeid].merge(mapped_dict[dependent_nodeid])
             )
-            await dependent_node.run_event.wait()
-            connections[0].job_id = dependent_node.job_id
-            dependents.append(dependent_node)
+        state.connections = connections
 
         if hasattr(node, "settings") and isinstance(node.settings, dict):
             job_kwargs = copy(node.settings)
@@ -377,27 +1387,120 @@ class JobRunner:
             dependents += depends_on
         except TypeError:
             dependents.append(depends_on)
-
-        meta_method = self.meta_map.get(method, default_meta_method)
-
-        node.job = meta_method(
-            method,
-            job_queue,
-            job_runner=self,
+        return JobSpec(
+            method=method,
+            job_queue=job_queue,
             input_args=input_args,
-            node=node,
+            node=node.model_copy(update={"connections": connections}),
             dependents=dependents,
             job_kwargs=job_kwargs,
         )
+
+    def record_job(self, nodeid: str, job, states: Dict[str, NodeState]):
+        """Set the submitted job on the state of the node"""
+        state = states[nodeid]
+        state.job = job
+        state.job_id = job.id
         logger.info(f"Node {nodeid} has been submitted.")
-        node.job_id = node.job.id
         # Setting the current job's output connection job id
         # This may not be required
-        if node.connections.outputs:
-            for key, conns in node.connections.outputs.items():
+        if state.connections.outputs:
+            for key, conns in state.connections.outputs.items():
                 for conn in conns:
-                    conn.job_id = node.job.id
-        node.run_event.set()
+                    conn.job_id = job.id
+
+    async def submit_node_job(
+        self, nodeid: str, mapped_dict: dict, states: Dict[str, NodeState]
+    ):
+        """Enqueue the node in the queue
+
+        The jobs of all the nodes this node depends on should have been submitted
+        before this coroutine is awaited.
+        """
+        if states[nodeid].job_id:
+            return
+        spec = self.prepare_job(nodeid, mapped_dict, states)
+        meta_method = self.meta_map.get(spec.method, default_meta_method)
+        job = meta_method(
+            spec.method,
+            spec.job_queue,
+            job_runner=self,
+            input_args=spec.input_args,
+            node=spec.node,
+            dependents=spec.dependents,
+            job_kwargs=spec.job_kwargs,
+        )
+        self.record_job(nodeid, job, states)
+
+    def submit_jobs_in_batch(
+        self,
+        mapped_dict: Dict[str, OutNode],
+        states: Dict[str, NodeState],
+        levels: List[List[str]],
+    ):
+        """Submit the jobs of all the nodes in a single redis transaction
+
+        The job IDs are generated before the jobs are saved, so that the
+        dependencies of every job can be registered within the same
+        transaction. Jobs without dependencies are enqueued with
+        `Queue.enqueue_many` and the others are deferred until rq enqueues them
+        when their dependencies finish. No worker can pick a job before the
+        whole flow has been submitted.
+        """
+        pipe = self.queue.connection.pipeline()
+        # The jobs to enqueue, by queue, and the jobs of every node
+        ready: Dict[Any, List[Tuple[str, Any]]] = {}
+        jobs = {}
+        for level in levels:
+            for nodeid in level:
+                spec = self.prepare_job(nodeid, mapped_dict, states)
+                job_kwargs = {
+                    BATCH_JOB_KWARGS[key]: value
+                    for key, value in spec.job_kwargs.items()
+                }
+                job_kwargs["job_id"] = job_kwargs.get("job_id") or str(uuid4())
+                data = spec.job_queue.prepare_data(
+                    spec.method,
+                    kwargs=spec.input_args,
+                    meta=job_meta(self, spec.node),
+                    **job_kwargs,
+                )
+                # The nodes depending on this one need the ID of its job
+                states[nodeid].job_id = data.job_id
+                depends_on = [dependent.job_id for dependent in spec.dependents]
+                if not depends_on:
+                    ready.setdefault(spec.job_queue, []).append((nodeid, data))
+                    continue
+                job = spec.job_queue.create_job(
+                    data.func,
+                    kwargs=data.kwargs,
+                    timeout=data.timeout,
+                    description=data.description,
+                    result_ttl=data.result_ttl,
+                    ttl=data.ttl,
+                    failure_ttl=data.failure_ttl,
+                    depends_on=depends_on,
+                    job_id=data.job_id,
+                    meta=data.meta,
+                    status=JobStatus.DEFERRED,
+                    retry=data.retry,
+                    on_success=data.on_success,
+                    on_failure=data.on_failure,
+                )
+                # Same as what rq does for a job with unfinished dependencies
+                job.register_dependency(pipeline=pipe)
+                job.save(pipeline=pipe)
+                job.cleanup(ttl=job.ttl, pipeline=pipe)
+                jobs[nodeid] = job
+        for job_queue, items in ready.items():
+            enqueued = job_queue.enqueue_many(
+                [data for _, data in items], pipeline=pipe
+            )
+            for (nodeid, _), job in zip(items, enqueued):
+                jobs[nodeid] = job
+        for nodeid, job in jobs.items():
+            self.record_job(nodeid, job, states)
+        pipe.execute()
 
     def dict(self, mapped_dict: Dict[str, OutNode], *args, **kwargs) -> dict:
         ret_dict = {}
@@ -0,0 +1,198 @@
+"""
+Metrics
+-------
+This module measures the time and resources taken by the nodes, and defines the
+hooks through which the JobRunner and the NodeJob report them.
+
+Every node gets a NodeMetrics with the time it was queued, started and
+finished, its wall and CPU time, the increase of the peak resident set size of
+the process running it and the size of its result. The metrics of a local run
+are set on the `metrics` attribute of the OutNodes. The metrics of a job in a
+distributed run are saved in the meta data of the job, see `NodeJob.metrics`.
+"""
+
+from __future__ import annotations
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
+
+from .models import NodeMetrics
+from .utils import import_object, logger, object_path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class NodeHook:
+    """Base class of the hooks notified of the progress of the nodes
+
+    Subclass it and override the methods of the events of interest, for
+    example to send the metrics to a monitoring system. Pass the hooks to the
+    JobRunner with `JobRunner(config, hooks=[...])`, either as instances or as
+    the dotted paths of a subclass or of a module level instance. In a
+    distributed run only the dotted paths are sent with the jobs, see
+    `hook_path`, and the workers import the hooks from them.
+
+    Exceptions raised by the hooks are logged and otherwise ignored.
+    """
+
+    def node_queued(self, node_id: str, node_type: str, metrics: NodeMetrics):
+        """The node is ready to run since all the nodes it depends on have
+        completed"""
+
+    def node_started(self, node_id: str, node_type: str, metrics: NodeMetrics):
+        """The node has started"""
+
+    def node_finished(
+        self,
+        node_id: str,
+        node_type: str,
+        metrics: NodeMetrics,
+        error: Optional[BaseException],
+    ):
+        """The node has completed. error is None if it has succeeded."""
+
+
+def resolve_hook(hook: Union[NodeHook, type, str]) -> NodeHook:
+    """The hook of a dotted path or of a class, which is instantiated without
+    arguments. Instances are returned as they are.
+    """
+    if isinstance(hook, str):
+        hook = import_object(hook)
+    if isinstance(hook, type):
+        hook = hook()
+    return hook
+
+
+def hook_path(hook: Union[NodeHook, type, str]) -> str:
+    """Dotted path from which the workers of a distributed run import a hook
+
+    The path of the class of an instance, so that every worker has its own
+    instance created without arguments. Pass the dotted path of a module level
+    instance to the JobRunner to send a configured hook instead.
+
+    Raises
+    ------
+    ValueError
+        If the hook is not importable, e.g. defined in a function
+    """
+    if isinstance(hook, str):
+        return hook
+    return object_path(hook if isinstance(hook, type) else type(hook))
+
+
+@lru_cache(maxsize=None)
+def load_hooks(paths: Tuple[str, ...]) -> List[NodeHook]:
+    """The hooks of the dotted paths in the meta data of a job, imported once
+    per process. Hooks which cannot be imported are logged and left out.
+    """
+    hooks = []
+    for path in paths:
+        try:
+            hooks.append(resolve_hook(path))
+        except Exception:
+            logger.exception(f"Cannot load the hook {path}")
+    return hooks
+
+
+def call_hooks(hooks: List[NodeHook], event: str, *args):
+    """Call the method of an event on every hook"""
+    for hook in hooks:
+        try:
+            getattr(hook, event)(*args)
+        except Exception:
+            logger.exception(f"Hook {hook} failed on {event}")
+
+
+@dataclass(slots=True)
+class Measurement:
+    """Resources taken by one call of a node function"""
+
+    cpu_time: float = 0.0
+    peak_rss_delta: Optional[int] = None
+
+    def add_to(self, metrics: NodeMetrics):
+        """Add the resources of this call to the metrics of a node, which may
+        be called more than once (in batch runs)"""
+        metrics.cpu_time = (metrics.cpu_time or 0.0) + self.cpu_time
+        if self.peak_rss_delta is not None:
+            metrics.peak_rss_delta = max(
+                metrics.peak_rss_delta or 0, self.peak_rss_delta
+            )
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+@contextmanager
+def measure() -> Iterator[Measurement]:
+    """Measure the CPU time of the current thread and the increase of the peak
+    RSS of the process during the block"""
+    measurement = Measurement()
+    rss = peak_rss()
+    cpu = time.thread_time()
+    try:
+        yield measurement
+    finally:
+        measurement.cpu_time = time.thread_time() - cpu
+        if rss is not None:
+            measurement.peak_rss_delta = peak_rss() - rss
+
+
+def measured_call(func: Callable, /, *args, **kwargs) -> Tuple[Any, Measurement]:
+    """Call func in the current thread or process and measure it. Can be sent
+    to an executor."""
+    with measure() as measurement:
+        result = func(*args, **kwargs)
+    return result, measurement
+
+
+def result_size(result: Any) -> int:
+    """Approximate size of the result of a node in bytes
+
+    The size of the data of arrays, tables, strings and bytes, and the shallow
+    size of other objects, so that the results never have to be serialized to
+    be measured.
+    """
+    if isinstance(result, tuple):
+        return sum(result_size(value) for value in result)
+    if isinstance(result, (bytes, bytearray, str)):
+        return len(result)
+    if np is not None and isinstance(result, np.ndarray):
+        return result.nbytes
+    if pa is not None and isinstance(result, pa.Table):
+        return result.nbytes
+    return sys.getsizeof(result)
+
+
+def finish(metrics: NodeMetrics, result: Any = None):
+    """Set the time the node finished, its wall time and the size of its
+    result"""
+    metrics.finished_at = time.time()
+    if metrics.started_at is not None:
+        metrics.wall_time = metrics.finished_at - metrics.started_at
+    if result is not None:
+        metrics.result_size = result_size(result)
@@ -1,8 +1,9 @@
 # Pydantic models corresponding to flume's object structure
 
+from dataclasses import dataclass
 from typing import Any, Callable
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, validate_call
 
 
 class ControlType(str, Enum):
@@ -70,6 +71,9 @@ class Port(BaseModel):
     acceptTypes: list[str] | None = None
     hidePort: bool | None = None
     controls: list[Control] | None = None
+    # Whether the node function accepts a NumPy array of values for this port
+    # in batch runs. Set with Annotated metadata.
+    vectorizable: bool | None = Field(default=None, exclude=True)
 
     def __eq__(self, other):
         return self.type == other.type
@@ -102,9 +106,60 @@ class Node(BaseModel):
     inputs: list[Port] | PortFunction | None = None
     outputs: list[Port] | PortFunction | None = None
 
+    # Overrides the executor of the JobRunner for this node.
+    # One of inline, thread or process.
+    executor: str | None = Field(default=None, exclude=True)
+
+    # Overrides the argument validation setting of the JobRunner for this node.
+    # Skipping validation is faster for trusted nodes in hot paths.
+    validate_args: bool | None = Field(default=None, exclude=True)
+
+    # Whether the results of this node can be taken from the cache of the
+    # JobRunner. Should be False for nodes with side effects.
+    cache: bool = Field(default=True, exclude=True)
+
+    # Version of the node function in the keys of the cached results. A digest
+    # of the code of the function if not set.
+    version: str | None = Field(default=None, exclude=True)
+
+    _validated_method: Callable | None = PrivateAttr(default=None)
+
     def __hash__(self):
         return hash(self.type)
 
+    @property
+    def validated_method(self) -> Callable:
+        """The node function wrapped with pydantic's validate_call
+
+        Building the validation schema is expensive compared to calling most
+        node functions. Hence the wrapper is created on first use and reused.
+        """
+        validated_method = self._validated_method
+        if validated_method is None or validated_method.__wrapped__ is not self.method:
+            validated_method = validate_call(
+                config=ConfigDict(arbitrary_types_allowed=True)
+            )(self.method)
+            self._validated_method = validated_method
+        return validated_method
+
+    @property
+    def vectorizable(self) -> bool:
+        """Whether the node function can be called with NumPy arrays in place
+        of scalars in batch runs. True if all its inputs are vectorizable.
+        """
+        if not isinstance(self.inputs, list) or not self.inputs:
+            return False
+        return all(port.vectorizable for port in self.inputs)
+
+    def __getstate__(self):
+        # The validated wrapper cannot be pickled. It is rebuilt on first use.
+        state = super().__getstate__()
+        state["__pydantic_private__"] = {
+            **(state["__pydantic_private__"] or {}),
+            "_validated_method": None,
+        }
+        return state
+
 
 class ConfigModel(BaseModel):
     """Python based FlumeConfig which gets converted to
@@ -132,6 +187,26 @@ class OutConnections(BaseModel):
     outputs: dict[str, list[OutConnection]]
 
 
+class NodeMetrics(BaseModel):
+    """Time and resources taken by a node in a run
+
+    The timestamps are seconds since the epoch, the durations are in seconds
+    and the sizes in bytes. Fields which could not be measured are None.
+    """
+
+    queued_at: float | None = None
+    started_at: float | None = None
+    finished_at: float | None = None
+    wall_time: float | None = None
+    # CPU time of the thread or process running the node function. Not
+    # measured for coroutine functions, which share the event loop.
+    cpu_time: float | None = None
+    # Increase of the peak resident set size of the process running the node.
+    # Zero if the node did not exceed the previous peak.
+    peak_rss_delta: int | None = None
+    result_size: int | None = None
+
+
 class OutNode(BaseModel):
     """Node output from the flume UI.
     This could as well be a saved json file parsed
@@ -167,6 +242,60 @@ class OutNode(BaseModel):
     # rq related settings which will be passed to enqueue function
     settings: dict[str, Any] | None = None
 
+    # Time and resources taken by the node in the last run
+    metrics: NodeMetrics | None = None
+
     def model_dump_json(self, *args, **kwargs) -> str:
         kwargs["exclude"] = {"run_event", "job"}
         return super().model_dump_json(*args, **kwargs)
+
+
+@dataclass(slots=True)
+class NodeState:
+    """Runtime state of an OutNode while the flow is running
+
+    The state is kept apart from the OutNode so that the node and its (possibly
+    large) inputData do not have to be copied for every run. The state is merged
+    into a shallow copy of the node once the run is complete.
+    """
+
+    status: str = "idle"
+    result: Any | None = None
+    result_mapped: dict[str, Any] | None = None
+    error: Any | None = None
+    job: Any | None = None
+    job_id: str | None = None
+    # Digest of the inputs of the node, if its result can be cached
+    digest: str | None = None
+    # Connections updated with the job IDs in a distributed run
+    connections: OutConnections | None = None
+    # True if the result is reused from a previous run
+    reused: bool = False
+    metrics: NodeMetrics | None = None
+
+    @classmethod
+    def from_node(cls, node: OutNode) -> "NodeState":
+        """Create the state of a node, carrying over an existing result or job"""
+        return cls(
+            status=node.status,
+            result=node.result,
+            result_mapped=node.result_mapped,
+            job=node.job,
+            job_id=node.job_id,
+            metrics=node.metrics,
+        )
+
+    def merge(self, node: OutNode) -> OutNode:
+        """Shallow copy of the node updated with this state"""
+        update = {
+            "status": self.status,
+            "result": self.result,
+            "result_mapped": self.result_mapped,
+            "error": self.error,
+            "job": self.job,
+            "job_id": self.job_id,
+            "metrics": self.metrics,
+        }
+        if self.connections is not None:
+            update["connections"] = self.connections
+        return node.model_copy(update=update)
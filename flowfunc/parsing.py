@@ -0,0 +1,126 @@
+"""
+Parsing
+-------
+This module turns the output of the node editor into OutNodes.
+
+The validator of a whole flow is built once per process, with a `TypeAdapter`,
+instead of on every call of the JobRunner methods. A NodeParser also remembers
+the nodes it validated, so that a node which is sent again unchanged is reused
+without validating it again. The cost of parsing a flow which is run again and
+again from the editor is then proportional to the nodes which were changed,
+not to the size of the flow.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Tuple, Union
+
+from pydantic import TypeAdapter, ValidationError
+
+from .models import OutNode
+from .utils import logger
+
+# Validator of a whole flow, built once per process
+_nodes_adapter = TypeAdapter(Dict[str, OutNode])
+
+NodeDict = Dict[str, Union[OutNode, Dict[str, Any]]]
+
+
+def validate_nodes(out_dict: NodeDict, strict: bool = False) -> Dict[str, OutNode]:
+    """Validate the output of the node editor
+
+    Parameters
+    ----------
+    out_dict: dict
+        The output from the UI. OutNodes in it are taken as they are.
+    strict: bool
+        Do not coerce the values to the types of the fields, for example a
+        string to the position of a node.
+
+    Returns
+    -------
+    nodes: Dict[str, OutNode]
+
+    Raises
+    ------
+    pydantic.ValidationError
+        If a node is not valid
+    """
+    return _nodes_adapter.validate_python(out_dict, strict=strict)
+
+
+# Keys of the nodes sent by the node editor. Dicts with other keys, such as
+# the dumps of nodes which have run, are always validated.
+_EDITOR_KEYS = {"id", "x", "y", "type", "width", "connections", "inputData", "settings"}
+
+
+def same_node(raw: Dict[str, Any], node: OutNode, connections: dict) -> bool:
+    """Whether a node dict is unchanged since node was validated from it
+
+    connections is the dump of the connections of the node.
+    """
+    return (
+        raw.keys() <= _EDITOR_KEYS
+        and raw.get("id") == node.id
+        and raw.get("type") == node.type
+        and raw.get("inputData") == node.inputData
+        and raw.get("connections") == connections
+        and raw.get("x") == node.x
+        and raw.get("y") == node.y
+        and raw.get("width") == node.width
+        and raw.get("settings") == node.settings
+    )
+
+
+class NodeParser:
+    """Validate the nodes of the flows run by a JobRunner, reusing the nodes
+    which are unchanged since the previous flow
+
+    Parameters
+    ----------
+    strict: bool
+        Validate in strict mode, see `validate_nodes`.
+    reuse: bool
+        Reuse the OutNodes of the nodes which are unchanged since the previous
+        call. If False every node is validated on every call.
+    """
+
+    def __init__(self, strict: bool = False, reuse: bool = True):
+        self.strict = strict
+        self.reuse = reuse
+        # The OutNode of every node ID of the previous call, with the dump of
+        # its connections to compare the next dicts with
+        self._previous: Dict[str, Tuple[OutNode, dict]] = {}
+
+    def parse(self, out_dict: NodeDict) -> Dict[str, OutNode]:
+        """Validate the nodes which changed since the previous call
+
+        OutNodes are taken as they are, and the other nodes are validated one
+        by one with `OutNode.model_validate`.
+        """
+        if not self.reuse:
+            return validate_nodes(out_dict, self.strict)
+        nodes: Dict[str, OutNode] = {}
+        for nodeid, raw in out_dict.items():
+            previous = self._previous.get(nodeid)
+            if isinstance(raw, OutNode):
+                nodes[nodeid] = raw
+            elif isinstance(raw, dict) and previous and same_node(raw, *previous):
+                nodes[nodeid] = previous[0]
+            else:
+                try:
+                    nodes[nodeid] = OutNode.model_validate(raw, strict=self.strict)
+                except ValidationError:
+                    logger.error(f"Node {nodeid} is not valid.")
+                    raise
+        previous, self._previous = self._previous, {}
+        for nodeid, node in nodes.items():
+            if nodeid in previous and previous[nodeid][0] is node:
+                self._previous[nodeid] = previous[nodeid]
+            else:
+                connections = node.connections.model_dump(exclude_none=True)
+                self._previous[nodeid] = (node, connections)
+        return nodes
+
+    def clear(self):
+        """Forget the nodes of the previous call"""
+        self._previous = {}
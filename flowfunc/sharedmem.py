@@ -0,0 +1,143 @@
+"""
+Shared memory
+-------------
+This module hands over the NumPy arrays produced and consumed by the nodes
+running in a process pool through shared memory, so that they are not pickled
+and sent through a pipe between the processes.
+
+The worker process which produces an array copies it into a shared memory block
+and returns a small SharedArray handle in its place. The workers running the
+nodes connected to it map the same block, without copying. The JobRunner keeps
+count of the consumers of every block and unlinks it once the last of them has
+completed, after copying the array out for the result of the node.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, List, Tuple
+
+from .utils import logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Arrays smaller than this number of bytes are pickled as usual
+THRESHOLD = 1 << 16
+
+# Blocks which could not be closed yet since the arrays of a worker still use
+# them. They are closed after the next call.
+_pending_close: List[SharedMemory] = []
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Handle of an array in a shared memory block"""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    def attach(self) -> Tuple[SharedMemory, Any]:
+        """Map the block. Returns the block and the array using it."""
+        block = SharedMemory(name=self.name)
+        # Mapping a block registers it with the resource tracker, which would
+        # otherwise unlink it when the process exits
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block, np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+
+    def copy(self) -> Any:
+        """A copy of the array in private memory"""
+        block, array = self.attach()
+        try:
+            return array.copy()
+        finally:
+            del array
+            block.close()
+
+    def unlink(self):
+        """Free the block"""
+        # Not using attach, since unlink also unregisters the block from the
+        # resource tracker
+        try:
+            block = SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        block.close()
+        block.unlink()
+
+
+def share(value: Any, threshold: int = THRESHOLD) -> Any:
+    """Copy a large array into a new shared memory block. Other values are
+    returned as they are.
+    """
+    if (
+        np is None
+        or not isinstance(value, np.ndarray)
+        or value.dtype.hasobject
+        or value.nbytes < threshold
+    ):
+        return value
+    block = SharedMemory(create=True, size=value.nbytes)
+    # The block outlives this process. It is unlinked by the JobRunner.
+    resource_tracker.unregister(block._name, "shared_memory")
+    array = np.ndarray(value.shape, dtype=value.dtype, buffer=block.buf)
+    array[...] = value
+    handle = SharedArray(block.name, value.shape, value.dtype.str)
+    del array
+    block.close()
+    return handle
+
+
+def share_result(result: Any, threshold: int = THRESHOLD) -> Any:
+    """Move the large arrays of the result of a node into shared memory"""
+    if isinstance(result, tuple):
+        return tuple(share(value, threshold) for value in result)
+    return share(result, threshold)
+
+
+def handles(result: Any) -> List[SharedArray]:
+    """The shared arrays in the result of a node"""
+    values = result if isinstance(result, tuple) else (result,)
+    return [value for value in values if isinstance(value, SharedArray)]
+
+
+def materialize(value: Any) -> Any:
+    """Copy a shared array (or the shared arrays in a result tuple) into
+    private memory"""
+    if isinstance(value, tuple):
+        return tuple(materialize(x) for x in value)
+    if isinstance(value, SharedArray):
+        return value.copy()
+    return value
+
+
+def attach_args(input_args: dict, blocks: List[SharedMemory]) -> dict:
+    """Replace the shared arrays in the arguments of a node function with
+    arrays mapping their blocks. The blocks are appended to `blocks`.
+    """
+    args = {}
+    for key, value in input_args.items():
+        if isinstance(value, SharedArray):
+            block, value = value.attach()
+            blocks.append(block)
+        args[key] = value
+    return args
+
+
+def close_blocks(blocks: List[SharedMemory]):
+    """Unmap blocks in a worker process. The blocks which are still in use are
+    retried later.
+    """
+    blocks = _pending_close + blocks
+    _pending_close.clear()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            _pending_close.append(block)
+    if _pending_close:
+        logger.debug(f"{len(_pending_close)} shared memory block(s) still in use")
@@ -0,0 +1,312 @@
+"""
+Streams
+-------
+This module defines the streams which connect generator nodes to the nodes
+consuming their chunks.
+
+A node whose function is a generator (or an async generator) does not produce a
+single result. Its chunks are handed over to the connected nodes while they are
+produced, so a large dataset never has to be held in memory as a whole and the
+downstream nodes can work while the upstream node is still producing.
+"""
+
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .exceptions import ErrorInDependentNode
+
+# Put on the queue of a reader when the stream is exhausted
+_END = object()
+
+
+class _Failure:
+    """Put on the queue of a reader when the generator has failed"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def is_generator_function(method: Callable) -> bool:
+    """Check if the node function produces a stream"""
+    return inspect.isgeneratorfunction(method) or inspect.isasyncgenfunction(method)
+
+
+async def run_in_thread(func: Callable, *args) -> Any:
+    """Run a blocking function in a new thread and await its result
+
+    A dedicated thread is used instead of a pool so that the nodes blocking on
+    the chunks of a stream can never starve the nodes producing them.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def set_exception(error):
+        if not future.done():
+            future.set_exception(error)
+
+    def target():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            callback, value = set_exception, e
+        else:
+            callback, value = set_result, result
+        try:
+            loop.call_soon_threadsafe(callback, value)
+        except RuntimeError:
+            pass  # The event loop is already closed
+
+    threading.Thread(target=target, daemon=True).start()
+    return await future
+
+
+class StreamReader:
+    """The chunks of one output port of a generator node, read by one input
+    of a consumer node
+
+    The reader can be iterated with `async for` in coroutine functions, or with
+    a plain `for` loop in synchronous functions. The JobRunner runs synchronous
+    functions which read a stream in their own thread for this reason.
+
+    Parameters
+    ----------
+    stream: NodeStream
+        The stream the chunks are read from
+    index: int, optional
+        Index of the port in the chunk tuples if the node has several outputs
+    buffered: bool
+        Keep all the chunks which were not read yet instead of holding back the
+        producer, see `NodeStream`.
+    """
+
+    def __init__(
+        self, stream: NodeStream, index: Optional[int], buffered: bool = False
+    ):
+        self.stream = stream
+        self.index = index
+        self.buffered = buffered
+        # One slot more than the chunks the producer waits for, for the end of
+        # the stream
+        maxsize = 0 if buffered else stream.maxsize + 1
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.closed = False
+        self.exhausted = False
+
+    def __repr__(self):
+        return f"<StreamReader of node {self.stream.node_id}>"
+
+    @property
+    def full(self) -> bool:
+        """Whether the producer has to wait for this reader"""
+        return (
+            not self.buffered
+            and not self.closed
+            and self.queue.qsize() >= self.stream.maxsize
+        )
+
+    def close(self):
+        """Stop reading. The chunks for this reader are dropped from now on."""
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.stream.space.set()
+
+    async def get(self) -> Any:
+        """Get the next chunk, or _END if the stream is exhausted"""
+        if self.exhausted or self.closed:
+            return _END
+        item = await self.queue.get()
+        # Letting the producer know that there is space in the queue
+        self.stream.space.set()
+        if item is _END:
+            self.exhausted = True
+            return _END
+        if isinstance(item, _Failure):
+            self.exhausted = True
+            raise ErrorInDependentNode(
+                f"Error in node {self.stream.node_id}"
+            ) from item.error
+        if self.index is None:
+            return item
+        return item[self.index]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.get()
+        if chunk is _END:
+            raise StopAsyncIteration
+        return chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError(
+                "A stream cannot be read with a for loop on the event loop."
+                " Use `async for` instead."
+            )
+        chunk = asyncio.run_coroutine_threadsafe(self.get(), self.stream.loop).result()
+        if chunk is _END:
+            raise StopIteration
+        return chunk
+
+
+class NodeStream:
+    """Chunks produced by a generator node, broadcast to all its consumers
+
+    The producer waits whenever one of the readers has `maxsize` chunks waiting
+    in its queue (backpressure), whether its consumer started reading or not.
+    Closed readers, of consumers which failed or returned, are skipped.
+
+    The only exception are buffered readers. Their consumers can only start
+    once another consumer of the same stream has finished, so waiting for them
+    would deadlock the flow. A buffered reader keeps every chunk produced
+    before its consumer starts reading: the whole stream in the worst case.
+
+    Attributes
+    ----------
+    node_id: str
+        ID of the generator node
+    count: int
+        Number of chunks produced so far
+    """
+
+    def __init__(
+        self,
+        node_id: str,
+        source: Any,
+        output_names: Tuple[str, ...],
+        maxsize: int = 16,
+    ):
+        self.node_id = node_id
+        self.source = source
+        self.output_names = output_names
+        self.maxsize = maxsize
+        self.count = 0
+        self.loop = asyncio.get_running_loop()
+        self.space = asyncio.Event()
+        self.readers: Dict[Tuple[str, str], StreamReader] = {}
+        # Readers of the streams consumed by this generator node
+        self.upstream_readers: List[StreamReader] = []
+        # Set when the stream is cancelled, to stop the thread of a synchronous
+        # generator
+        self.stopped = threading.Event()
+        self._pending_put: Optional[concurrent.futures.Future] = None
+
+    def __repr__(self):
+        return f"<NodeStream of node {self.node_id}: {self.count} chunk(s)>"
+
+    def add_reader(
+        self, consumer_id: str, key: str, port_name: str, buffered: bool = False
+    ) -> StreamReader:
+        """Register the input `key` of node `consumer_id` as a consumer of the
+        output port `port_name`
+        """
+        index = None
+        if len(self.output_names) > 1:
+            index = self.output_names.index(port_name)
+        reader = StreamReader(self, index, buffered)
+        self.readers[(consumer_id, key)] = reader
+        return reader
+
+    def reader(self, consumer_id: str, key: str, port_name: str) -> StreamReader:
+        """Get the reader of an input of a consumer node"""
+        reader = self.readers.get((consumer_id, key))
+        if reader is None:
+            # Not registered before the stream started. Reads from the
+            # current chunk onwards.
+            reader = self.add_reader(consumer_id, key, port_name)
+        return reader
+
+    def release(self, consumer_id: str):
+        """Close all the readers of a consumer node"""
+        for (nodeid, _), reader in self.readers.items():
+            if nodeid == consumer_id:
+                reader.close()
+
+    async def put(self, chunk: Any):
+        """Hand over a chunk to all the readers"""
+        while any(reader.full for reader in self.readers.values()):
+            self.space.clear()
+            await self.space.wait()
+        for reader in self.readers.values():
+            if not reader.closed:
+                reader.queue.put_nowait(chunk)
+        self.count += 1
+
+    def _produce_in_thread(self):
+        try:
+            for chunk in self.source:
+                if not self._put_from_thread(chunk):
+                    break
+        finally:
+            # The generator is closed in the thread it runs in, so that its
+            # cleanup runs even if the stream is cancelled
+            self.source.close()
+
+    def _put_from_thread(self, chunk: Any) -> bool:
+        """Hand over a chunk from the thread of a synchronous generator. False if
+        the stream is stopped."""
+        if self.stopped.is_set():
+            return False
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.put(chunk), self.loop)
+        except RuntimeError:
+            return False  # The event loop is already closed
+        self._pending_put = future
+        if self.stopped.is_set():
+            # Stopped before the future could be cancelled by stop
+            future.cancel()
+        try:
+            future.result()
+        except concurrent.futures.CancelledError:
+            return False
+        return True
+
+    def stop(self):
+        """Stop the thread of a synchronous generator, which is waiting for the
+        readers. The generator is closed by the thread."""
+        self.stopped.set()
+        if self._pending_put is not None:
+            self._pending_put.cancel()
+
+    async def produce(self):
+        """Run the generator to the end
+
+        Synchronous generators run in their own thread so that the event loop is
+        not blocked while they produce.
+        """
+        try:
+            if inspect.isasyncgen(self.source):
+                async for chunk in self.source:
+                    await self.put(chunk)
+            else:
+                await run_in_thread(self._produce_in_thread)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # The consumer of the events of the flow has stopped
+                self.stop()
+            for reader in self.readers.values():
+                reader.queue.put_nowait(_Failure(e))
+            raise
+        else:
+            for reader in self.readers.values():
+                reader.queue.put_nowait(_END)
+        finally:
+            for reader in self.upstream_readers:
+                reader.close()
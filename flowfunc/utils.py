@@ -1,3 +1,5 @@
+import importlib
+import inspect
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,4 +13,35 @@ def issubclass_safe(cls, classinfo):
     try:
         return issubclass(cls, classinfo)
     except TypeError:
-        return False
\ No newline at end of file
+        return False
+
+
+def object_path(obj) -> str:
+    """Dotted path from which a module, or a module level class or function,
+    can be imported again, for example by the workers of a distributed run
+    """
+    if inspect.ismodule(obj):
+        return obj.__name__
+    qualname = getattr(obj, "__qualname__", None)
+    if not isinstance(qualname, str) or "<locals>" in qualname:
+        raise ValueError(
+            f"{obj!r} cannot be imported from a dotted path."
+            " Pass the dotted path of a module level object instead."
+        )
+    return f"{obj.__module__}.{qualname}"
+
+
+def import_object(path: str):
+    """Import an object from its dotted path, for example
+    `package.module.Class` or `package.module.Class.attribute`
+    """
+    parts = path.split(".")
+    for index in range(len(parts), 0, -1):
+        try:
+            obj = importlib.import_module(".".join(parts[:index]))
+        except ImportError:
+            continue
+        for name in parts[index:]:
+            obj = getattr(obj, name)
+        return obj
+    raise ImportError(f"Cannot import {path}")
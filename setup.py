@@ -25,7 +25,7 @@ setup(
     install_requires=[
         "pydantic>=2,<3",
     ],
-    extras_require={"distributed": ["rq>=1.11"], "full": ["dash>=2.6", "rq>=1.11"]},
+    extras_require={"distributed": ["rq>=1.12,<2"], "full": ["dash>=2.6", "rq>=1.12,<2"]},
     classifiers=[
         "Framework :: Dash",
     ],
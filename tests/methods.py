@@ -1,6 +1,9 @@
 from enum import Enum
-from typing import List, Optional, Tuple, Union
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple, Union
 import asyncio
+import json
+import threading
 from pydantic import BaseModel
 from dataclasses import dataclass
 
@@ -112,4 +115,68 @@ async def add_async_with_sleep(a: int, b: int) -> int:
     
 def divide_numbers(a: int, b: int) -> float:
     """Divide one number by another"""
-    return a/b
\ No newline at end of file
+    return a/b
+
+# Barrier the calls of add_at_barrier wait at. Tests replace it with a barrier
+# for the number of calls which should run at the same time.
+node_barrier = threading.Barrier(1)
+
+
+def add_at_barrier(a: int, b: int) -> int:
+    """adding numbers once all the calls running alongside have started"""
+    node_barrier.wait(timeout=5)
+    return a + b
+
+
+# Arguments of every call of add_and_record
+add_calls = []
+
+
+def add_and_record(a: int, b: int) -> int:
+    """adding numbers and recording the call"""
+    add_calls.append((a, b))
+    return a + b
+
+
+def count_up(n: int) -> Iterator[int]:
+    """Generate the numbers from 0 to n - 1"""
+    for i in range(n):
+        yield i
+
+
+def square_chunks(numbers: Iterable[int]) -> Iterator[int]:
+    """Square every number of a stream"""
+    for number in numbers:
+        yield number * number
+
+
+def sum_chunks(numbers: Iterable[int]) -> int:
+    """Sum of a stream of numbers"""
+    return sum(numbers)
+
+
+async def async_sum_chunks(numbers: AsyncIterator[int]) -> int:
+    """Sum of a stream of numbers, read asynchronously"""
+    total = 0
+    async for number in numbers:
+        total += number
+    return total
+
+
+def make_range(n: int) -> List[int]:
+    """Numbers from 0 to n - 1"""
+    return list(range(n))
+
+
+def count_items(items: List[int]) -> int:
+    """Number of items in a list"""
+    return len(items)
+
+
+# The flows built node by node use benchmarks.flows.new_node and connect
+
+
+def load_nodes(path: str = "tests/nodes_add.node") -> dict:
+    """The output of the node editor saved in a node file"""
+    return json.loads(Path(path).read_text())
+
@@ -0,0 +1,63 @@
+from pathlib import Path
+import pytest
+from flowfunc.artifacts import ArtifactRef, FileArtifactStore, load_artifact_store
+
+
+def test_small_values_are_not_stored(tmp_path):
+    store = FileArtifactStore(tmp_path, threshold=1024)
+    assert store.offload("job", (1, "a", [1, 2])) == (1, "a", [1, 2])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pickled_artifact(tmp_path):
+    store = FileArtifactStore(tmp_path, threshold=1024)
+    value = list(range(1000))
+    small, ref = store.offload("job", ("small", value))
+    assert small == "small"
+    assert isinstance(ref, ArtifactRef)
+    assert ref.format == "pickle"
+    assert store.resolve(ref) == value
+    store.delete(ref)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_numpy_artifact_is_memory_mapped(tmp_path):
+    np = pytest.importorskip("numpy")
+    store = FileArtifactStore(tmp_path, threshold=1024)
+    array = np.arange(10000, dtype=np.float64)
+    ref = store.offload("job", array)
+    assert ref.format == "npy"
+    loaded = store.resolve(ref)
+    assert isinstance(loaded, np.memmap)
+    assert (loaded == array).all()
+
+
+def test_arrow_artifact(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    store = FileArtifactStore(tmp_path, threshold=1024)
+    table = pa.table({"a": list(range(10000))})
+    ref = store.offload("job", table)
+    assert ref.format == "arrow"
+    assert store.resolve(ref).equals(table)
+
+
+def test_collect_expired_artifacts(tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    connection = fakeredis.FakeStrictRedis()
+    connection.hset("rq:job:alive", "status", "finished")
+    store = FileArtifactStore(tmp_path, threshold=0)
+    alive = store.offload("alive", ("x",))
+    expired = store.offload("expired", ("x", "y"))
+    assert store.collect(connection) == 2
+    assert store.resolve(alive[0]) == "x"
+    assert not any(Path(ref.path).exists() for ref in expired)
+
+
+def test_store_settings(tmp_path):
+    store = FileArtifactStore(tmp_path, threshold=1024, collect_interval=None)
+    loaded = load_artifact_store(store.settings)
+    assert isinstance(loaded, FileArtifactStore)
+    assert (loaded.directory, loaded.threshold) == (tmp_path, 1024)
+    assert loaded.collect_interval is None
+    # Built once per process
+    assert load_artifact_store(store.settings) is loaded
@@ -0,0 +1,78 @@
+import json
+import pytest
+from typing import Annotated
+from flowfunc.config import Config
+from flowfunc.jobrunner import JobRunner
+from tests.methods import add_and_record, add_calls, count_up, load_nodes
+
+np = pytest.importorskip("numpy")
+
+vectorized_calls = []
+
+
+def add_vectorized(
+    a: Annotated[int, {"vectorizable": True}],
+    b: Annotated[int, {"vectorizable": True}],
+) -> int:
+    """Add two numbers, or two arrays of numbers"""
+    vectorized_calls.append((a, b))
+    return a + b
+
+
+def batch_nodes(vectorized=("node_3", "node_5")):
+    nodes = load_nodes()
+    for nodeid, node in nodes.items():
+        if nodeid in vectorized:
+            node["type"] = "tests.test_batch.add_vectorized"
+        else:
+            node["type"] = "tests.methods.add_and_record"
+    return nodes
+
+
+@pytest.fixture
+def runner():
+    add_calls.clear()
+    vectorized_calls.clear()
+    config = Config.from_function_list([add_and_record, add_vectorized, count_up])
+    return JobRunner(config)
+
+
+def test_vectorizable_ports(runner):
+    assert runner.flume_config.get_node("tests.test_batch.add_vectorized").vectorizable
+    assert not runner.flume_config.get_node("tests.methods.add_and_record").vectorizable
+    # Not sent to the UI
+    assert "vectorizable" not in json.dumps(runner.flume_config.dict())
+
+
+def test_run_batch(runner):
+    results = runner.run_batch(batch_nodes(), [{"node_3": {"a": a}} for a in (4, 5, 6)])
+    np.testing.assert_array_equal(results["node_3"].result, [7, 8, 9])
+    np.testing.assert_array_equal(results["node_4"].result, [16, 17, 18])
+    # The nodes which do not depend on the batch keep their scalar results
+    assert results["node_2"].result == 6
+    # node_3 and node_5 are called once with arrays
+    assert len(vectorized_calls) == 2
+    # node_1 and node_2 once, node_4 once per row
+    assert len(add_calls) == 2 + 3
+
+
+def test_run_batch_missing_inputs(runner):
+    """Inputs missing from a row keep the values set in the editor"""
+    results = runner.run_batch(
+        batch_nodes(vectorized=()), [{"node_1": {"a": 5}}, {"node_1": {"b": 1}}]
+    )
+    assert isinstance(results["node_1"].result, np.ndarray)
+    assert list(results["node_1"].result) == [7, 2]
+
+
+def test_run_batch_errors(runner):
+    with pytest.raises(ValueError):
+        runner.run_batch(batch_nodes(), [{"node_x": {"a": 1}}])
+    # Connected input
+    with pytest.raises(ValueError):
+        runner.run_batch(batch_nodes(), [{"node_3": {"b": 1}}])
+    nodes = batch_nodes()
+    nodes["node_3"]["type"] = "tests.methods.count_up"
+    nodes["node_3"]["inputData"] = {"n": {"n": 3}}
+    with pytest.raises(ValueError):
+        runner.run_batch(nodes, [{"node_3": {"n": 2}}])
@@ -0,0 +1,25 @@
+import json
+import pytest
+from benchmarks.compare import compare
+from benchmarks.flows import SHAPES, build_config, generate
+from benchmarks.run import benchmark
+from flowfunc.jobrunner import JobRunner
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_synthetic_flows(shape):
+    nodes = generate(shape, 25)
+    assert len(nodes) == 25
+    results = JobRunner(build_config()).run(nodes)
+    assert all(node.status == "finished" for node in results.values())
+
+
+def test_benchmark_and_compare(tmp_path):
+    record = benchmark(build_config(), "diamond", 10, "sync", repeat=1)
+    assert record["run_s"] > 0
+    assert record["peak_memory_bytes"] > 0
+    old, new = tmp_path / "old.json", tmp_path / "new.json"
+    old.write_text(json.dumps({"results": [record]}))
+    new.write_text(json.dumps({"results": [{**record, "run_s": record["run_s"] * 2}]}))
+    assert len(compare(old, new)) == 1
+    assert compare(old, old) == []
@@ -0,0 +1,145 @@
+import json
+import pickle
+from pathlib import Path
+import pytest
+from flowfunc.cache import MISSING, DiskCache, MemoryCache, RedisCache, code_digest
+from flowfunc.config import Config
+from flowfunc.jobrunner import JobRunner
+from tests.methods import add_normal, add_with_type_anno
+
+
+def test_memory_cache_lru():
+    cache = MemoryCache(maxsize=2)
+    cache.set("add", "a", 1)
+    cache.set("add", "b", 2)
+    assert cache.get("add", "a") == 1
+    cache.set("add", "c", 3)
+    # b was the least recently used
+    assert cache.get("add", "b") is MISSING
+    assert len(cache) == 2
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_disk_cache(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set("tests.methods.add_normal", "a", (1, 2))
+    cache.set("tests.methods.divide_numbers", "a", 0.5)
+    assert DiskCache(tmp_path).get("tests.methods.add_normal", "a") == (1, 2)
+    cache.invalidate("tests.methods.add_normal")
+    assert cache.get("tests.methods.add_normal", "a") is MISSING
+    assert cache.get("tests.methods.divide_numbers", "a") == 0.5
+    # Clearing the cache leaves the other files of the directory alone
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "keep.txt").write_text("keep")
+    cache.clear()
+    assert cache.get("tests.methods.divide_numbers", "a") is MISSING
+    assert (tmp_path / "data" / "keep.txt").read_text() == "keep"
+    cache.set("tests.methods.add_normal", "a", 1)
+    assert cache.get("tests.methods.add_normal", "a") == 1
+
+
+def test_redis_cache():
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = RedisCache(fakeredis.FakeStrictRedis())
+    cache.set("tests.methods.add_normal", "a", {"x": 1})
+    assert cache.get("tests.methods.add_normal", "a") == {"x": 1}
+    cache.clear()
+    assert cache.get("tests.methods.add_normal", "a") is MISSING
+    assert cache.hits == 0
+    # Corrupt results are ignored
+    cache.connection.set(cache._key("tests.methods.add_normal", "b"), b"corrupt")
+    assert cache.get("tests.methods.add_normal", "b") is MISSING
+
+
+def test_runner_uses_cache():
+    """Only the nodes downstream of a change are run again"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    cache = MemoryCache()
+    runner = JobRunner(config, cache=cache)
+    runner.run(nodes)
+    assert (cache.hits, cache.misses) == (0, 5)
+    results = runner.run(nodes)
+    assert (cache.hits, cache.misses) == (5, 5)
+    assert results["node_4"].result == 16
+    assert all([n.status == "finished" for n in results.values()])
+    # node_3 feeds node_5 which feeds node_4
+    nodes["node_3"]["inputData"]["a"]["a"] = 5
+    results = runner.run(nodes)
+    assert (cache.hits, cache.misses) == (7, 8)
+    assert results["node_4"].result == 17
+
+
+def test_node_cache_opt_out():
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    config.get_node("tests.methods.add_normal").cache = False
+    cache = MemoryCache()
+    runner = JobRunner(config, cache=cache)
+    runner.run(nodes)
+    runner.run(nodes)
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_code_digest():
+    namespace = {}
+    exec("def f(a):\n    return a + 1", namespace)
+    first = namespace["f"]
+    exec("def f(a):\n    return a + 2", namespace)
+    assert code_digest(first) != code_digest(namespace["f"])
+    assert code_digest(first) == code_digest(first)
+    exec("def f(a):\n    g = lambda: 1\n    return a", namespace)
+    second = namespace["f"]
+    exec("def f(a):\n    g = lambda: 1\n    return a", namespace)
+    # Nested code objects are compared by code, not by address
+    assert code_digest(second) == code_digest(namespace["f"])
+
+
+def test_cache_keyed_by_function_version():
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    cache = MemoryCache()
+    runner = JobRunner(config, cache=cache)
+    runner.run(nodes)
+    node = config.get_node("tests.methods.add_normal")
+    node.version = "2"
+    runner.run(nodes)
+    assert (cache.hits, cache.misses) == (0, 10)
+    node.version = None
+    # The code of the function changed
+    node.method = add_with_type_anno
+    runner.run(nodes)
+    assert (cache.hits, cache.misses) == (0, 15)
+
+
+def test_disk_cache_stale_results(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.set("tests.methods.add_normal", "a", 1)
+    # A class which does not exist any more
+    path = cache._path("tests.methods.add_normal", "b")
+    path.write_bytes(pickle.dumps(int).replace(b"builtins", b"gone_mod"))
+    assert cache.get("tests.methods.add_normal", "b") is MISSING
+    assert cache.get("tests.methods.add_normal", "a") == 1
+    assert [x.name for x in path.parent.iterdir() if x.suffix == ".tmp"] == []
+
+
+class BrokenCache(MemoryCache):
+    """Cache whose storage cannot be reached"""
+
+    def _get(self, node_type, digest):
+        raise ConnectionError("unreachable")
+
+    def _set(self, node_type, digest, value):
+        raise OSError("disk full")
+
+
+def test_failing_cache():
+    """A failing cache does not fail the run, the nodes are run instead"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    cache = BrokenCache()
+    runner = JobRunner(Config.from_function_list([add_normal]), cache=cache)
+    results = runner.run(nodes)
+    assert results["node_4"].result == 16
+    assert all(node.status == "finished" for node in results.values())
+    assert (cache.hits, cache.misses) == (0, 5)
@@ -0,0 +1,51 @@
+import pickle
+import pytest
+from flowfunc.compiled import CompiledFlow
+from flowfunc.config import Config
+from flowfunc.exceptions import CyclicFlowError
+from flowfunc.jobrunner import JobRunner
+from tests.methods import add_normal, load_nodes
+
+
+def test_compile():
+    runner = JobRunner(Config.from_function_list([add_normal]))
+    flow = runner.compile(load_nodes())
+    assert isinstance(flow, CompiledFlow)
+    assert len(flow) == 5
+    assert flow.order[0] == "node_1"
+    assert flow.order.index("node_5") < flow.order.index("node_4")
+    assert flow.controls["node_1"] == {"a": 1, "b": 2}
+    # Connected inputs are bound to the connected node instead
+    assert "a" not in flow.controls["node_2"]
+    assert flow.bindings["node_2"] == [("a", "node_1", "result")]
+    assert flow.output_names["node_1"] == ("result",)
+    assert flow.config_nodes["node_1"].method is add_normal
+
+
+def test_run_compiled_flow():
+    runner = JobRunner(Config.from_function_list([add_normal]))
+    flow = runner.compile(load_nodes())
+    for _ in range(2):
+        results = runner.run(flow)
+        assert results["node_4"].result == 16
+    results = runner.run(flow, ["node_2"])
+    assert set(results) == {"node_1", "node_2"}
+    assert results["node_2"].result == 6
+
+
+def test_compiled_flow_can_be_pickled():
+    runner = JobRunner(Config.from_function_list([add_normal]))
+    flow = runner.compile(load_nodes())
+    runner.run(flow)  # builds the validated wrappers of the node functions
+    flow = pickle.loads(pickle.dumps(flow))
+    assert runner.run(flow)["node_4"].result == 16
+
+
+def test_compile_cyclic_flow():
+    nodes = load_nodes()
+    nodes["node_1"]["connections"]["inputs"]["a"] = [
+        {"nodeId": "node_4", "portName": "result"}
+    ]
+    runner = JobRunner(Config.from_function_list([add_normal]))
+    with pytest.raises(CyclicFlowError):
+        runner.compile(nodes)
@@ -1,7 +1,13 @@
+import json
+from typing import List, Optional
 import pytest
-from flowfunc.config import Config
+from pydantic import BaseModel
+from flowfunc import config as config_module
+from flowfunc.config import Config, process_node, process_port
 from flowfunc.models import Node
 from .methods import (
+    DataclassUser,
+    PydanticUser,
     add_str_inspect,
     add_str_type,
     all_methods,
@@ -98,3 +104,130 @@ def test_optional():
     assert config.ports[0].type == "str"
     assert len(config.ports[0].controls) == 1
     assert config.ports[0].controls[0].type == "str"
+
+
+def test_get_node_after_append():
+    config = Config.from_function_list([add_with_type_anno])
+    with pytest.raises(ValueError):
+        config.get_node("tests.methods.add_str_type")
+    config.nodes.append(process_node(add_str_type))
+    assert config.get_node("tests.methods.add_str_type").type == (
+        "tests.methods.add_str_type"
+    )
+    config.nodes = config.nodes[:1]
+    with pytest.raises(ValueError):
+        config.get_node("tests.methods.add_str_type")
+
+
+def test_get_node_after_remove():
+    config = Config.from_function_list([add_with_type_anno, add_str_type])
+    node = config.get_node("tests.methods.add_str_type")
+    config.nodes.remove(node)
+    with pytest.raises(ValueError):
+        config.get_node("tests.methods.add_str_type")
+    with pytest.raises(ValueError):
+        config.output_names("tests.methods.add_str_type")
+    # Replacing a node in place
+    config.nodes[0] = node
+    assert config.get_node("tests.methods.add_str_type") is node
+    with pytest.raises(ValueError):
+        config.get_node("tests.methods.add_with_type_anno")
+    del config.nodes[0]
+    with pytest.raises(ValueError):
+        config.get_node("tests.methods.add_str_type")
+
+
+def test_output_names():
+    config = Config.from_function_list(all_methods)
+    assert config.output_names("tests.methods.add_normal") == ("result",)
+    assert config.output_names("tests.methods.add_diff_int_and_float_inspect") == (
+        "result_0",
+        "result_1",
+    )
+    with pytest.raises(ValueError):
+        config.output_names("randomnode")
+
+
+def test_process_port_returns_copies():
+    port = process_port("a", int)
+    port.name = "changed"
+    port.acceptTypes.append("str")
+    assert process_port("a", int).name == "a"
+    assert process_port("a", int).acceptTypes == ["int"]
+    # Nor do the controls of the fields of a model leak into later configs
+    config = Config.from_function_list([get_pydantic_user])
+    config.ports[0].controls[3].options[0]["value"] = 42
+    config.ports[0].controls[0].defaultValue = "changed"
+    config = Config.from_function_list([get_pydantic_user])
+    assert config.ports[0].controls[3].options[0]["value"] == 0
+    assert config.ports[0].controls[0].defaultValue != "changed"
+
+
+def test_config_cache(tmp_path, monkeypatch):
+    config = Config.from_function_list(all_methods, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("config-*.pkl"))) == 1
+    cached = Config.from_function_list(all_methods, cache_dir=tmp_path)
+    assert [node.method for node in cached.nodes] == all_methods
+    assert sorted(port.type for port in cached.ports) == sorted(
+        port.type for port in config.ports
+    )
+    assert cached.get_node("tests.methods.add_normal").outputs[0].name == "result"
+    # The cache is ignored once a source file changes
+    monkeypatch.setattr(config_module, "module_hash", lambda name: "changed")
+    assert config_module.load_cached_config(tmp_path, all_methods) is None
+
+
+def test_dict_is_cached():
+    config = Config.from_function_list(all_methods)
+    ports = list(config.ports)
+    config_dict = config.dict()
+    assert config.dict() is config_dict
+    assert config.ports == ports
+    assert json.loads(config.json_bytes()) == json.loads(json.dumps(config_dict))
+    etag = config.etag()
+    config.nodes.append(process_node(add_str_type))
+    assert config.etag() != etag
+    assert len(config.dict()["nodeTypes"]) == len(all_methods) + 1
+    config.nodes = config.nodes[:-1]
+    assert config.etag() == etag
+
+
+def test_config_delta():
+    old = Config.from_function_list(all_methods[:-1])
+    new = Config.from_function_list(all_methods[1:])
+    delta = new.delta(old)
+    assert delta["base"] == old.etag()
+    assert delta["etag"] == new.etag()
+    assert [x["type"] for x in delta["nodeTypes"]["added"]] == [
+        new.nodes[-1].type
+    ]
+    assert delta["nodeTypes"]["removed"] == [old.nodes[0].type]
+    # Applying the delta to the old config gives the new one
+    for key in ("portTypes", "nodeTypes"):
+        types = {x["type"]: x for x in old.dict()[key]}
+        for type_ in delta[key]["removed"]:
+            del types[type_]
+        types.update({x["type"]: x for x in delta[key]["added"]})
+        assert sorted(types) == sorted(x["type"] for x in new.dict()[key])
+    assert new.delta(new)["nodeTypes"] == {"added": [], "removed": []}
+
+
+class Order(BaseModel):
+    user: Optional[PydanticUser]
+    things: List[DataclassUser]
+
+
+def get_order(order: Order) -> Order:
+    return order
+
+
+def test_config_dependencies_nested_types():
+    """The modules of the types of the fields of models are tracked"""
+    config = Config.from_function_list([get_order])
+    modules = config_module.config_dependencies(config.nodes, config.ports)
+    assert "tests.test_config" in modules
+    # PydanticUser and DataclassUser, and the enums of their fields
+    assert "tests.methods" in modules
+    assert config_module.type_modules(Optional[List[PydanticUser]]) == {
+        "tests.methods"
+    }
@@ -3,10 +3,18 @@ import json
 from pathlib import Path
 import time
 from flowfunc.config import Config
-from flowfunc.distributed import NodeJob, NodeQueue
+from flowfunc.distributed import NodeJob, NodeQueue, PortStorage
 from flowfunc.jobrunner import JobRunner
 from flowfunc.models import Node, OutNode
-from tests.methods import add_async_with_sleep, add_normal
+from flowfunc.artifacts import ArtifactRef, FileArtifactStore
+from flowfunc.metrics import NodeHook
+from tests.methods import (
+    add_async_with_sleep,
+    add_normal,
+    count_items,
+    make_range,
+    sumnprod_with_inspect,
+)
 from redis import Redis
 from uuid import uuid4
 import os
@@ -85,4 +93,190 @@ def test_node_with_settings():
     job = NodeJob.fetch(custom_job_id, connection=connection)
     assert job
     assert job.get_status() == "finished"
-    assert job.result == 3
\ No newline at end of file
+    assert job.result == 3
+
+
+def test_batch_submit():
+    """Testing that the jobs submitted in a single transaction run in order"""
+    config = Config.from_function_list([add_normal])
+    connection = Redis()
+    queue = NodeQueue(connection=connection)
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    for batch_submit in (True, False):
+        runner = JobRunner(
+            config,
+            method="distributed",
+            default_queue=queue,
+            batch_submit=batch_submit,
+        )
+        results = runner.run(nodes)
+        time.sleep(2)
+        job = NodeJob.fetch(results["node_4"].job_id, connection=connection)
+        assert job.get_status() == "finished"
+        assert job.result == 16
+
+
+def test_batch_submit_settings():
+    """Testing that the settings of the nodes are kept by a batch submission"""
+    config = Config.from_function_list([add_normal])
+    connection = Redis()
+    queue = NodeQueue(connection=connection)
+    runner = JobRunner(config, method="distributed", default_queue=queue)
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    nodes["node_1"]["settings"] = {"job_timeout": 60, "description": "first"}
+    parsed = runner.parse_nodes(nodes)
+    assert runner.can_submit_in_batch(parsed, runner.initial_states(parsed))
+    results = runner.run(nodes)
+    time.sleep(2)
+    job = NodeJob.fetch(results["node_1"].job_id, connection=connection)
+    assert (job.timeout, job.description) == (60, "first")
+    assert NodeJob.fetch(results["node_4"].job_id, connection=connection).result == 16
+    # Settings which Queue.prepare_data does not accept are submitted per node
+    nodes["node_1"]["settings"] = {"depends_on": []}
+    parsed = runner.parse_nodes(nodes)
+    assert not runner.can_submit_in_batch(parsed, runner.initial_states(parsed))
+
+
+def test_inputs_from_same_job():
+    """Testing a node with several inputs connected to the same job"""
+    config = Config.from_function_list([add_normal])
+    connection = Redis()
+    queue = NodeQueue(connection=connection)
+    runner = JobRunner(config, method="distributed", default_queue=queue)
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    node_2 = nodes["node_2"]
+    node_2["connections"]["inputs"]["b"] = [
+        {"nodeId": "node_1", "portName": "result"}
+    ]
+    nodes["node_1"]["connections"]["outputs"]["result"].append(
+        {"nodeId": "node_2", "portName": "b"}
+    )
+    results = runner.run(nodes)
+    time.sleep(2)
+    job = NodeJob.fetch(results["node_2"].job_id, connection=connection)
+    assert job.get_status() == "finished"
+    assert job.result == 6
+
+
+def test_port_storage():
+    """Testing that the output ports are stored and loaded separately"""
+    config = Config.from_function_list([add_normal, sumnprod_with_inspect])
+    connection = Redis()
+    queue = NodeQueue(connection=connection)
+    storage = PortStorage(compression="zlib")
+    runner = JobRunner(
+        config, method="distributed", default_queue=queue, port_storage=storage
+    )
+    nodes = {
+        "node_1": {
+            "id": "node_1",
+            "x": 0,
+            "y": 0,
+            "width": 200,
+            "type": "tests.methods.sumnprod_with_inspect",
+            "connections": {
+                "inputs": {},
+                "outputs": {
+                    "result_0": [{"nodeId": "node_2", "portName": "a"}],
+                    "result_1": [{"nodeId": "node_2", "portName": "b"}],
+                },
+            },
+            "inputData": {"a": {"a": 2}, "b": {"b": 3}},
+        },
+        "node_2": {
+            "id": "node_2",
+            "x": 0,
+            "y": 0,
+            "width": 200,
+            "type": "tests.methods.add_normal",
+            "connections": {
+                "inputs": {
+                    "a": [{"nodeId": "node_1", "portName": "result_0"}],
+                    "b": [{"nodeId": "node_1", "portName": "result_1"}],
+                },
+                "outputs": {},
+            },
+            "inputData": {},
+        },
+    }
+    results = runner.run(nodes)
+    time.sleep(2)
+    first_job_id = results["node_1"].job_id
+    assert storage.load(
+        connection, [(first_job_id, "result_0"), (first_job_id, "result_1")]
+    ) == [5, 6]
+    job = NodeJob.fetch(results["node_2"].job_id, connection=connection)
+    assert job.get_status() == "finished"
+    assert job.result == 11
+    # Only the settings of the storage are sent with the jobs
+    assert job.meta["port_storage"] == {
+        "serializer": None,
+        "compression": "zlib",
+        "prefix": "flowfunc:port",
+    }
+
+
+def test_artifact_store(tmp_path):
+    """Testing that large results are kept out of redis"""
+    config = Config.from_function_list([make_range, count_items])
+    connection = Redis()
+    queue = NodeQueue(connection=connection)
+    store = FileArtifactStore(tmp_path, threshold=1024)
+    runner = JobRunner(
+        config, method="distributed", default_queue=queue, artifact_store=store
+    )
+    nodes = {
+        "node_1": {
+            "id": "node_1",
+            "x": 0,
+            "y": 0,
+            "width": 200,
+            "type": "tests.methods.make_range",
+            "connections": {
+                "inputs": {},
+                "outputs": {"result": [{"nodeId": "node_2", "portName": "items"}]},
+            },
+            "inputData": {"n": {"n": 10000}},
+        },
+        "node_2": {
+            "id": "node_2",
+            "x": 0,
+            "y": 0,
+            "width": 200,
+            "type": "tests.methods.count_items",
+            "connections": {
+                "inputs": {"items": [{"nodeId": "node_1", "portName": "result"}]},
+                "outputs": {},
+            },
+            "inputData": {},
+        },
+    }
+    results = runner.run(nodes)
+    time.sleep(2)
+    first_job = NodeJob.fetch(results["node_1"].job_id, connection=connection)
+    assert isinstance(first_job.result, ArtifactRef)
+    assert first_job.result_mapped["result"] == list(range(10000))
+    job = NodeJob.fetch(results["node_2"].job_id, connection=connection)
+    assert job.result == 10000
+
+
+def test_job_metrics():
+    """The jobs save their metrics in their meta data"""
+    config = Config.from_function_list([add_normal])
+    connection = Redis()
+    queue = NodeQueue(connection=connection)
+    runner = JobRunner(
+        config, method="distributed", default_queue=queue, hooks=[NodeHook()]
+    )
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    results = runner.run(nodes)
+    time.sleep(2)
+    for node in results.values():
+        job = NodeJob.fetch(node.job_id, connection=connection)
+        # The hooks are sent as dotted paths and get the type of the node
+        assert job.meta["hooks"] == ["flowfunc.metrics.NodeHook"]
+        assert job.meta["node_type"] == node.type
+        metrics = job.metrics
+        assert metrics.queued_at <= metrics.started_at <= metrics.finished_at
+        assert metrics.cpu_time >= 0
+        assert metrics.result_size > 0
@@ -0,0 +1,71 @@
+import json
+import pytest
+from flowfunc.config import Config
+from flowfunc.encoding import decode_nodes, encode_nodes
+from flowfunc.jobrunner import JobRunner
+from flowfunc.models import OutNode
+from tests.methods import add_normal, load_nodes
+
+
+def test_round_trip():
+    nodes = load_nodes()
+    data = encode_nodes(nodes)
+    decoded = decode_nodes(json.loads(json.dumps(data)))
+    for nodeid, node in nodes.items():
+        expected = OutNode.model_validate(node)
+        assert decoded[nodeid].type == expected.type
+        assert decoded[nodeid].inputData == expected.inputData
+        assert (decoded[nodeid].x, decoded[nodeid].width) == (
+            expected.x,
+            expected.width,
+        )
+        assert decoded[nodeid].connections.inputs == expected.connections.inputs
+    # The output connections are rebuilt from the input connections
+    assert sorted(
+        (x.nodeId, x.portName) for x in decoded["node_1"].connections.outputs["result"]
+    ) == [("node_2", "a"), ("node_3", "b"), ("node_5", "a")]
+
+
+def test_encode_out_nodes_without_layout():
+    nodes = {
+        nodeid: OutNode.model_validate(node) for nodeid, node in load_nodes().items()
+    }
+    data = encode_nodes(nodes, layout=False)
+    assert all("l" not in item for item in data["nodes"])
+    assert decode_nodes(data)["node_1"].width == 200
+
+
+def test_run_compact(monkeypatch):
+    config = Config.from_function_list([add_normal])
+    runner = JobRunner(config)
+    results = runner.run_compact(encode_nodes(load_nodes(), layout=False))
+    assert results["node_4"].result == 16
+    # Only the changed node is validated again
+    validated = []
+    model_validate = OutNode.model_validate
+
+    def counting_validate(obj, *args, **kwargs):
+        validated.append(obj["id"])
+        return model_validate(obj, *args, **kwargs)
+
+    monkeypatch.setattr(OutNode, "model_validate", counting_validate)
+    nodes = load_nodes()
+    nodes["node_1"]["inputData"]["a"]["a"] = 2
+    results = runner.run_compact(encode_nodes(nodes, layout=False))
+    assert results["node_4"].result == 19
+    assert validated == ["node_1"]
+
+
+def test_unsupported_version():
+    data = encode_nodes(load_nodes())
+    data["v"] = 0
+    with pytest.raises(ValueError):
+        decode_nodes(data)
+
+
+def test_msgpack():
+    pytest.importorskip("msgpack")
+    nodes = load_nodes()
+    data = encode_nodes(nodes, binary=True)
+    assert isinstance(data, bytes)
+    assert decode_nodes(data)["node_4"].connections.inputs["b"][0].nodeId == "node_5"
@@ -0,0 +1,54 @@
+import pytest
+from flowfunc.exceptions import CyclicFlowError
+from flowfunc.graph import FlowGraph
+from flowfunc.models import OutConnection, OutNode
+from tests.methods import load_nodes
+
+
+def out_nodes():
+    return {nodeid: OutNode(**node) for nodeid, node in load_nodes().items()}
+
+
+def test_levels():
+    """Nodes are grouped into topological levels"""
+    graph = FlowGraph.from_nodes(out_nodes())
+    assert len(graph) == 5
+    assert graph.levels() == [["node_1"], ["node_2", "node_3"], ["node_5"], ["node_4"]]
+    assert graph.parallelism() == [1, 2, 1, 1]
+    assert graph.in_degrees()["node_4"] == 2
+    assert sorted(graph.downstream["node_1"]) == ["node_2", "node_3", "node_5"]
+
+
+def test_cycle():
+    """A flow with a cycle cannot be levelled"""
+    nodes = out_nodes()
+    nodes["node_1"].connections.inputs["a"] = [
+        OutConnection(nodeId="node_4", portName="result")
+    ]
+    with pytest.raises(CyclicFlowError):
+        FlowGraph.from_nodes(nodes).levels()
+
+
+def test_closures():
+    """Upstream and downstream closures of nodes"""
+    graph = FlowGraph.from_nodes(out_nodes())
+    assert graph.upstream_closure(["node_5"]) == {"node_1", "node_3", "node_5"}
+    assert graph.upstream_closure(["node_1"]) == {"node_1"}
+    assert graph.downstream_closure(["node_3"]) == {"node_3", "node_4", "node_5"}
+    assert graph.downstream_closure(["unknown"]) == set()
+
+
+def test_from_raw_nodes():
+    """Graph can be built from the node dicts without validating them"""
+    nodes = load_nodes()
+    graph = FlowGraph.from_nodes(nodes)
+    assert graph.upstream == FlowGraph.from_nodes(out_nodes()).upstream
+
+
+def test_long_chain():
+    """Closures of a deep chain do not hit the recursion limit"""
+    upstream = {f"node_{i}": [f"node_{i - 1}"] if i else [] for i in range(5000)}
+    graph = FlowGraph(upstream)
+    assert len(graph.upstream_closure(["node_4999"])) == 5000
+    assert len(graph.downstream_closure(["node_0"])) == 5000
+    assert len(graph.levels()) == 5000
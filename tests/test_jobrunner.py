@@ -1,10 +1,21 @@
 import asyncio
+import pytest
 from flowfunc.config import Config
 from flowfunc.jobrunner import JobRunner
-from flowfunc.exceptions import ErrorInDependentNode
+from flowfunc.exceptions import CyclicFlowError, ErrorInDependentNode
+from flowfunc.models import OutNode
 from pathlib import Path
 import json
-from tests.methods import add_normal, add_async_with_sleep, divide_numbers
+import threading
+from tests import methods
+from tests.methods import (
+    add_and_record,
+    add_at_barrier,
+    add_async_with_sleep,
+    add_calls,
+    add_normal,
+    divide_numbers,
+)
 
 def test_blank():
     """Testing if running empty dict will return empty output"""
@@ -101,3 +112,202 @@ def test_run_add_async_dependent():
     assert results["node_3"].result_mapped == {"result": results["node_3"].result}
     assert results["node_5"].result == results["node_1"].result + results["node_3"].result
     assert all([n.status == "finished" for n in results.values()])
+
+
+def test_cyclic_flow():
+    """A flow with a cycle raises an error instead of waiting forever"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    nodes["node_1"]["connections"]["inputs"]["a"] = [
+        {"nodeId": "node_4", "portName": "result"}
+    ]
+    config = Config.from_function_list([add_normal])
+    runner = JobRunner(config)
+    with pytest.raises(CyclicFlowError):
+        runner.run(nodes)
+
+
+def independent_nodes(node_type, count):
+    """Flow with nodes that do not depend on each other"""
+    return {
+        f"node_{i}": {
+            "id": f"node_{i}",
+            "x": 0,
+            "y": 0,
+            "type": node_type,
+            "width": 200,
+            "connections": {"inputs": {}, "outputs": {}},
+            "inputData": {"a": {"a": i}, "b": {"b": i}},
+        }
+        for i in range(count)
+    }
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_run_add_executor(executor):
+    """Running the sync node functions in a pool"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    runner = JobRunner(config, executor=executor, max_workers=2)
+    results = runner.run(nodes)
+    runner.shutdown()
+    assert results["node_4"].result == 16
+    assert all([n.status == "finished" for n in results.values()])
+
+
+def test_thread_executor_runs_concurrently(monkeypatch):
+    """Independent blocking nodes should not run one after the other"""
+    # The nodes only complete if all four run at the same time
+    monkeypatch.setattr(methods, "node_barrier", threading.Barrier(4))
+    nodes = independent_nodes("tests.methods.add_at_barrier", 4)
+    config = Config.from_function_list([add_at_barrier])
+    runner = JobRunner(config, executor="thread", max_workers=4)
+    results = runner.run(nodes)
+    runner.shutdown()
+    assert [n.result for n in results.values()] == [0, 2, 4, 6]
+    assert all([n.status == "finished" for n in results.values()])
+
+
+def test_node_executor_override(monkeypatch):
+    """Node.executor takes precedence over the executor of the runner"""
+    monkeypatch.setattr(methods, "node_barrier", threading.Barrier(4))
+    nodes = independent_nodes("tests.methods.add_at_barrier", 4)
+    config = Config.from_function_list([add_at_barrier])
+    config.get_node("tests.methods.add_at_barrier").executor = "thread"
+    runner = JobRunner(config)
+    results = runner.run(nodes)
+    runner.shutdown()
+    assert all([n.status == "finished" for n in results.values()])
+
+
+def test_unknown_executor():
+    config = Config.from_function_list([add_normal])
+    with pytest.raises(ValueError):
+        JobRunner(config, executor="gpu")
+
+
+def test_validated_method_is_cached():
+    """The validated node function is built only once"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    runner = JobRunner(config)
+    runner.run(nodes)
+    config_node = config.get_node("tests.methods.add_normal")
+    validated_method = config_node.validated_method
+    runner.run(nodes)
+    assert config_node.validated_method is validated_method
+
+
+def test_skip_validation():
+    """Arguments are passed as they are when validation is skipped"""
+    nodes = independent_nodes("tests.methods.add_normal", 1)
+    nodes["node_0"]["inputData"] = {"a": {"a": "1"}, "b": {"b": "2"}}
+    config = Config.from_function_list([add_normal])
+    results = JobRunner(config).run(nodes)
+    assert results["node_0"].result == 3
+    results = JobRunner(config, validate_args=False).run(nodes)
+    assert results["node_0"].result == "12"
+    config.get_node("tests.methods.add_normal").validate_args = True
+    results = JobRunner(config, validate_args=False).run(nodes)
+    assert results["node_0"].result == 3
+
+
+def test_input_nodes_are_not_modified():
+    """The run state is kept apart from the nodes that are passed in"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    nodes = {nodeid: OutNode(**node) for nodeid, node in nodes.items()}
+    config = Config.from_function_list([add_normal])
+    results = JobRunner(config).run(nodes)
+    assert results["node_4"].result == 16
+    assert nodes["node_4"].result is None
+    assert nodes["node_4"].status == "idle"
+    # The input data is shared and not copied
+    assert results["node_1"].inputData is nodes["node_1"].inputData
+
+
+def test_incremental_run():
+    """Only the changed nodes and the nodes downstream of them run again"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    for node in nodes.values():
+        node["type"] = "tests.methods.add_and_record"
+    config = Config.from_function_list([add_and_record])
+    runner = JobRunner(config, incremental=True)
+    add_calls.clear()
+    runner.run(nodes)
+    assert len(add_calls) == 5
+    add_calls.clear()
+    results = runner.run(nodes)
+    assert len(add_calls) == 0
+    assert results["node_4"].result == 16
+    assert all([n.status == "finished" for n in results.values()])
+    # node_3 feeds node_5 which feeds node_4
+    nodes["node_3"]["inputData"]["a"]["a"] = 5
+    results = runner.run(nodes)
+    assert len(add_calls) == 3
+    assert results["node_4"].result == 17
+    assert results["node_2"].result == 6
+    runner.reset()
+    add_calls.clear()
+    runner.run(nodes)
+    assert len(add_calls) == 5
+
+
+def test_run_stream():
+    """Events are yielded as the nodes start and complete"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    events = list(JobRunner(config).run_stream(nodes))
+    assert len(events) == 10
+    assert events[0] == ("node_1", "started", None)
+    assert events[1] == ("node_1", "finished", 3)
+    assert events[-1] == ("node_4", "finished", 16)
+    finished = [e.node_id for e in events if e.status == "finished"]
+    assert finished.index("node_5") < finished.index("node_4")
+
+
+def test_astream_failed_node():
+    nodes = json.loads(Path("tests/nodes_error.node").read_text())
+    config = Config.from_function_list([divide_numbers])
+
+    async def collect():
+        return [e async for e in JobRunner(config).astream(nodes)]
+
+    events = asyncio.run(collect())
+    failed = {e.node_id: e.result for e in events if e.status == "failed"}
+    assert isinstance(failed["node_1"], ZeroDivisionError)
+    assert isinstance(failed["node_2"], ErrorInDependentNode)
+
+
+def test_run_stream_stop_early():
+    """Remaining nodes are cancelled when the consumer stops"""
+    nodes = json.loads(Path("tests/nodes_async.node").read_text())
+    config = Config.from_function_list([add_async_with_sleep])
+    for event in JobRunner(config).run_stream(nodes):
+        if event.status == "finished":
+            break
+    assert event == ("node_1", "finished", 3)
+
+
+def test_run_many():
+    """The nodes which do not depend on the overrides run only once"""
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    for node in nodes.values():
+        node["type"] = "tests.methods.add_and_record"
+    config = Config.from_function_list([add_and_record])
+    runner = JobRunner(config)
+    add_calls.clear()
+    results = runner.run_many(
+        nodes, [{"node_3": {"a": a}} for a in (4, 5, 6)], max_concurrency=2
+    )
+    assert [r["node_4"].result for r in results] == [16, 17, 18]
+    assert all(r["node_2"].result == 6 for r in results)
+    # node_1 and node_2 are shared, node_3, node_5 and node_4 run three times
+    assert len(add_calls) == 2 + 3 * 3
+    # The input dict is not modified
+    assert nodes["node_3"]["inputData"]["a"]["a"] == 4
+
+
+def test_run_many_unknown_node():
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    config = Config.from_function_list([add_normal])
+    with pytest.raises(ValueError):
+        JobRunner(config).run_many(nodes, [{"node_x": {"a": 1}}])
@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+from flowfunc.config import Config
+from flowfunc.jobrunner import JobRunner
+import pytest
+from flowfunc.metrics import NodeHook, hook_path, load_hooks, result_size
+from tests.methods import add_normal, add_async_with_sleep
+
+
+class RecordingHook(NodeHook):
+    def __init__(self):
+        self.events = []
+
+    def node_queued(self, node_id, node_type, metrics):
+        self.events.append((node_id, "queued"))
+
+    def node_started(self, node_id, node_type, metrics):
+        self.events.append((node_id, "started"))
+
+    def node_finished(self, node_id, node_type, metrics, error):
+        self.events.append((node_id, "finished" if error is None else "failed"))
+
+
+class FailingHook(NodeHook):
+    def node_finished(self, node_id, node_type, metrics, error):
+        raise RuntimeError("Monitoring is down")
+
+
+def test_node_metrics():
+    config = Config.from_function_list([add_normal])
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    results = JobRunner(config).run(nodes)
+    for node in results.values():
+        metrics = node.metrics
+        assert metrics.queued_at <= metrics.started_at <= metrics.finished_at
+        assert metrics.wall_time >= 0
+        assert metrics.cpu_time >= 0
+        assert metrics.peak_rss_delta >= 0
+        assert metrics.result_size > 0
+    # A node is queued once the nodes it depends on have finished
+    assert results["node_4"].metrics.queued_at >= results["node_2"].metrics.finished_at
+
+
+def test_hooks():
+    config = Config.from_function_list([add_normal])
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    hook = RecordingHook()
+    JobRunner(config, hooks=[FailingHook(), hook]).run(nodes)
+    assert len(hook.events) == 3 * len(nodes)
+    for nodeid in nodes:
+        events = [event for x, event in hook.events if x == nodeid]
+        assert events == ["queued", "started", "finished"]
+
+
+def test_hook_paths():
+    """Only the dotted paths of the hooks are sent to the workers"""
+    assert hook_path(RecordingHook()) == "tests.test_metrics.RecordingHook"
+    assert hook_path("tests.test_metrics.RecordingHook") == (
+        "tests.test_metrics.RecordingHook"
+    )
+
+    class LocalHook(NodeHook):
+        pass
+
+    with pytest.raises(ValueError):
+        hook_path(LocalHook())
+    paths = ("tests.test_metrics.RecordingHook", "tests.missing.Hook")
+    hooks = load_hooks(paths)
+    assert len(hooks) == 1 and isinstance(hooks[0], RecordingHook)
+    # Imported once per process
+    assert load_hooks(paths)[0] is hooks[0]
+    config = Config.from_function_list([add_normal])
+    nodes = json.loads(Path("tests/nodes_add.node").read_text())
+    runner = JobRunner(config, hooks=["tests.test_metrics.RecordingHook"])
+    runner.run(nodes)
+    assert len(runner.hooks[0].events) == 3 * len(nodes)
+
+
+def test_coroutine_metrics():
+    """The CPU time of coroutine functions is not measured"""
+    config = Config.from_function_list([add_async_with_sleep])
+    nodes = json.loads(Path("tests/nodes_async.node").read_text())
+    results = JobRunner(config).run(nodes)
+    node = next(iter(results.values()))
+    assert node.metrics.cpu_time is None
+    assert node.metrics.wall_time > 0
+
+
+def test_result_size():
+    assert result_size(b"abc") == 3
+    assert result_size(("ab", b"c")) == 3
+    assert result_size(1) > 0
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from pydantic import ValidationError
+from flowfunc.config import Config
+from flowfunc.jobrunner import JobRunner
+from flowfunc.models import OutNode
+from flowfunc.parsing import NodeParser, validate_nodes
+from tests.methods import add_normal, load_nodes
+
+
+def test_unchanged_nodes_are_reused():
+    parser = NodeParser()
+    first = parser.parse(load_nodes())
+    changed = load_nodes()
+    changed["node_1"]["inputData"]["a"]["a"] = 5
+    second = parser.parse(changed)
+    assert list(second) == list(first)
+    assert second["node_1"] is not first["node_1"]
+    assert second["node_1"].inputData["a"] == {"a": 5}
+    assert all(
+        second[nodeid] is first[nodeid] for nodeid in first if nodeid != "node_1"
+    )
+    # Modifying the dicts in place is noticed as well
+    changed["node_2"]["connections"]["inputs"] = {}
+    assert parser.parse(changed)["node_2"].connections.inputs == {}
+    parser = NodeParser(reuse=False)
+    assert (
+        parser.parse(load_nodes())["node_3"] is not parser.parse(load_nodes())["node_3"]
+    )
+
+
+def test_strict():
+    nodes = load_nodes()
+    nodes["node_1"]["x"] = "10"
+    assert validate_nodes(nodes)["node_1"].x == 10
+    with pytest.raises(ValidationError):
+        validate_nodes(nodes, strict=True)
+
+
+def test_run_reusing_nodes():
+    runner = JobRunner(Config.from_function_list([add_normal]))
+    assert runner.run(load_nodes())["node_4"].result == 16
+    nodes = load_nodes()
+    nodes["node_1"]["inputData"]["a"]["a"] = 2
+    assert runner.run(nodes)["node_4"].result == 19
+    nodes["node_1"]["x"] = "left"
+    with pytest.raises(ValidationError):
+        runner.run(nodes)
+
+
+def test_nodes_validated_once(monkeypatch):
+    """A rerun with one changed node validates only that node, once"""
+    validated = []
+    model_validate = OutNode.model_validate
+
+    def counting_validate(obj, *args, **kwargs):
+        validated.append(obj["id"])
+        return model_validate(obj, *args, **kwargs)
+
+    monkeypatch.setattr(OutNode, "model_validate", counting_validate)
+    runner = JobRunner(Config.from_function_list([add_normal]))
+    runner.run(load_nodes())
+    assert sorted(validated) == sorted(load_nodes())
+    nodes = load_nodes()
+    nodes["node_1"]["inputData"]["a"]["a"] = 2
+    validated.clear()
+    assert runner.run(nodes)["node_4"].result == 19
+    assert validated == ["node_1"]
+    nodes["node_1"]["inputData"]["a"]["a"] = 3
+    validated.clear()
+    list(runner.run_stream(nodes))
+    assert validated == ["node_1"]
+    nodes["node_1"]["inputData"]["a"]["a"] = 4
+    validated.clear()
+    asyncio.run(runner.run_async(nodes))
+    assert validated == ["node_1"]
@@ -0,0 +1,71 @@
+import os
+import pytest
+from benchmarks.flows import connect, new_node
+from flowfunc.config import Config
+from flowfunc.jobrunner import JobRunner
+from flowfunc import sharedmem
+
+np = pytest.importorskip("numpy")
+
+
+def make_array(n: int) -> np.ndarray:
+    """Array of n ones"""
+    return np.ones(n)
+
+
+def scale_array(array: np.ndarray, factor: float) -> np.ndarray:
+    """Array multiplied by a factor"""
+    return array * factor
+
+
+def sum_array(array: np.ndarray) -> float:
+    """Sum of an array"""
+    return float(array.sum())
+
+
+def shared_blocks():
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+def test_share_and_materialize():
+    array = np.arange(100000, dtype=np.int64)
+    handle = sharedmem.share(array)
+    assert isinstance(handle, sharedmem.SharedArray)
+    assert (sharedmem.materialize(handle) == array).all()
+    handle.unlink()
+    small = np.arange(10)
+    assert sharedmem.share(small) is small
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="Needs /dev/shm")
+def test_arrays_shared_between_processes():
+    config = Config.from_function_list([make_array, scale_array, sum_array])
+    nodes = {
+        "node_1": new_node("node_1", make_array, n=100000),
+        "node_2": new_node("node_2", scale_array, factor=2.0),
+        "node_3": new_node("node_3", sum_array),
+        "node_4": new_node("node_4", sum_array),
+    }
+    connect(nodes, "node_1", "node_2", "array")
+    connect(nodes, "node_2", "node_3", "array")
+    connect(nodes, "node_1", "node_4", "array")
+    before = shared_blocks()
+    runner = JobRunner(config, executor="process", shared_memory=True, incremental=True)
+    try:
+        results = runner.run(nodes)
+        assert results["node_3"].result == 200000.0
+        assert results["node_4"].result == 100000.0
+        # The arrays of the intermediate nodes are not copied back
+        assert results["node_2"].result is None
+        # All the blocks are freed once their consumers have completed
+        assert shared_blocks() == before
+        # The arrays of the selected nodes are. The nodes whose arrays were
+        # dropped run again.
+        results = runner.run(nodes, ["node_2", "node_3"])
+        assert results["node_3"].result == 200000.0
+        assert isinstance(results["node_2"].result, np.ndarray)
+        assert (results["node_2"].result == 2.0).all()
+        assert results["node_1"].result is None
+        assert shared_blocks() == before
+    finally:
+        runner.shutdown()
@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from typing import Iterable, Iterator
+from benchmarks.flows import connect, new_node
+from flowfunc.config import Config
+from flowfunc.exceptions import ErrorInDependentNode
+from flowfunc.jobrunner import JobRunner
+from flowfunc.streams import NodeStream
+from tests.methods import (
+    async_sum_chunks,
+    count_up,
+    divide_numbers,
+    square_chunks,
+    sum_chunks,
+)
+
+
+def pipeline(n):
+    """count_up -> square_chunks -> sum_chunks and count_up -> async_sum_chunks"""
+    nodes = {
+        "node_1": new_node("node_1", count_up, n=n),
+        "node_2": new_node("node_2", square_chunks),
+        "node_3": new_node("node_3", sum_chunks),
+        "node_4": new_node("node_4", async_sum_chunks),
+    }
+    connect(nodes, "node_1", "node_2", "numbers")
+    connect(nodes, "node_2", "node_3", "numbers")
+    connect(nodes, "node_1", "node_4", "numbers")
+    return nodes
+
+
+config = Config.from_function_list(
+    [count_up, square_chunks, sum_chunks, async_sum_chunks, divide_numbers]
+)
+
+
+def test_generator_pipeline():
+    """Chunks flow through generator nodes to the consumers"""
+    results = JobRunner(config).run(pipeline(100))
+    assert results["node_3"].result == sum(i * i for i in range(100))
+    assert results["node_4"].result == sum(range(100))
+    assert isinstance(results["node_1"].result, NodeStream)
+    assert results["node_1"].result.count == 100
+    assert all([n.status == "finished" for n in results.values()])
+
+
+def test_stream_events():
+    events = list(JobRunner(config).run_stream(pipeline(3)))
+    statuses = [e.status for e in events if e.node_id == "node_1"]
+    assert statuses == ["started", "streaming", "finished"]
+
+
+def test_backpressure():
+    """The generator does not run far ahead of a slow consumer"""
+    produced = []
+    consumed = []
+
+    def produce(n: int) -> Iterator[int]:
+        for i in range(n):
+            produced.append(i)
+            yield i
+
+    def consume(numbers: Iterable[int]) -> int:
+        for number in numbers:
+            # Chunks which were produced but not consumed yet
+            consumed.append(len(produced) - number)
+            time.sleep(0.001)
+        return len(consumed)
+
+    nodes = {
+        "node_1": new_node("node_1", produce, n=50),
+        "node_2": new_node("node_2", consume),
+    }
+    connect(nodes, "node_1", "node_2", "numbers")
+    stream_config = Config.from_function_list([produce, consume])
+    results = JobRunner(stream_config, stream_buffer=2).run(nodes)
+    assert results["node_2"].result == 50
+    assert max(consumed) <= 4
+
+
+def test_failing_generator():
+    """Consumers of a failing generator fail"""
+
+    def produce(n: int) -> Iterator[int]:
+        yield 1
+        raise ValueError("broken")
+
+    nodes = {
+        "node_1": new_node("node_1", produce, n=2),
+        "node_2": new_node("node_2", sum_chunks),
+    }
+    connect(nodes, "node_1", "node_2", "numbers")
+    stream_config = Config.from_function_list([produce, sum_chunks])
+    results = JobRunner(stream_config).run(nodes)
+    assert results["node_1"].status == "failed"
+    assert isinstance(results["node_1"].error, ValueError)
+    assert results["node_2"].status == "failed"
+    assert isinstance(results["node_2"].error, ErrorInDependentNode)
+
+
+def test_consumer_failing_early():
+    """A consumer which fails before reading does not block the generator"""
+    nodes = pipeline(100)
+    nodes["node_5"] = new_node("node_5", divide_numbers, a=1, b=0)
+    nodes["node_4"] = new_node("node_4", sum_chunks)
+    connect(nodes, "node_1", "node_4", "numbers")
+    connect(nodes, "node_5", "node_4", "a")
+    results = asyncio.run(
+        asyncio.wait_for(JobRunner(config, method="async").run(nodes), 5)
+    )
+    assert results["node_4"].status == "failed"
+    assert results["node_3"].result == sum(i * i for i in range(100))
+
+
+def test_backpressure_before_consumer_starts():
+    """A consumer waiting for another node holds back the generator too"""
+    produced = []
+
+    def produce(n: int) -> Iterator[int]:
+        for i in range(n):
+            produced.append(i)
+            yield i
+
+    def wait(seconds: float) -> float:
+        time.sleep(seconds)
+        return seconds
+
+    def consume(numbers: Iterable[int], seconds: float) -> int:
+        # Chunks produced before the consumer started reading
+        started = len(produced)
+        sum(numbers)
+        return started
+
+    nodes = {
+        "node_1": new_node("node_1", produce, n=50),
+        "node_2": new_node("node_2", wait, seconds=0.1),
+        "node_3": new_node("node_3", consume),
+    }
+    connect(nodes, "node_1", "node_3", "numbers")
+    connect(nodes, "node_2", "node_3", "seconds")
+    stream_config = Config.from_function_list([produce, wait, consume])
+    results = JobRunner(stream_config, stream_buffer=2).run(nodes)
+    assert results["node_3"].status == "finished"
+    assert results["node_3"].result <= 3
+
+
+def test_consumer_depending_on_consumer():
+    """A consumer which can only start after another consumer of the same
+    stream has finished buffers the chunks instead of blocking the generator
+    """
+
+    def offset_sum(numbers: Iterable[int], offset: int) -> int:
+        return offset + sum(numbers)
+
+    nodes = {
+        "node_1": new_node("node_1", count_up, n=100),
+        "node_2": new_node("node_2", sum_chunks),
+        "node_3": new_node("node_3", offset_sum),
+    }
+    connect(nodes, "node_1", "node_2", "numbers")
+    connect(nodes, "node_1", "node_3", "numbers")
+    connect(nodes, "node_2", "node_3", "offset")
+    stream_config = Config.from_function_list([count_up, sum_chunks, offset_sum])
+    results = asyncio.run(
+        asyncio.wait_for(
+            JobRunner(stream_config, method="async", stream_buffer=2).run(nodes), 5
+        )
+    )
+    assert results["node_3"].result == 2 * sum(range(100))
+
+
+def test_generator_closed_when_stopped_early():
+    """The thread of a generator which waits for its consumers closes the
+    generator when the events of the flow stop being read"""
+    producing = threading.Event()
+    closed = threading.Event()
+
+    def produce(n: int) -> Iterator[int]:
+        try:
+            for i in range(n):
+                producing.set()
+                yield i
+        finally:
+            closed.set()
+
+    async def wait(seconds: float) -> float:
+        # Until the generator has started
+        while not producing.is_set():
+            await asyncio.sleep(seconds)
+        return seconds
+
+    def consume(numbers: Iterable[int], seconds: float) -> int:
+        return sum(numbers)
+
+    nodes = {
+        "node_1": new_node("node_1", produce, n=1000),
+        "node_2": new_node("node_2", wait, seconds=0.01),
+        "node_3": new_node("node_3", consume),
+    }
+    connect(nodes, "node_1", "node_3", "numbers")
+    connect(nodes, "node_2", "node_3", "seconds")
+    stream_config = Config.from_function_list([produce, wait, consume])
+    runner = JobRunner(stream_config, stream_buffer=2)
+    for event in runner.run_stream(nodes):
+        if event.node_id == "node_2" and event.status == "finished":
+            # The generator is waiting for node_3 to start reading
+            break
+    assert closed.wait(5)